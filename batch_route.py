@@ -0,0 +1,176 @@
+"""Headless batch routing: plan courier -> source -> destination jobs on a map
+
+Usage:
+    python batch_route.py MAP JOBS [--output OUT] [--paths] [--workers N]
+
+JOBS is JSON lines ({"id": ..., "courier": [y, x], "source": [y, x],
+"destination": [y, x]}) or a CSV file with the columns id, courier_y,
+courier_x, source_y, source_x, destination_y, destination_x. Results are
+written as one JSON line per job, in input order, as soon as they are ready.
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import sys
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from courier_router import CourierRouter, LANDMARK_COUNT, ROAD_COLOR_RANGE, SEARCH_MODES
+
+# Router owned by each worker process, rebuilt from shared memory
+_worker_router = None
+_worker_segments = []
+_worker_options = {}
+
+
+def read_jobs(path):
+    """Yield (job_id, courier, source, destination) from a JSONL or CSV file"""
+    stream = sys.stdin if path == "-" else open(path, newline="")
+    try:
+        if path.lower().endswith(".csv"):
+            for number, row in enumerate(csv.DictReader(stream)):
+                yield (
+                    row.get("id") or number,
+                    (int(row["courier_y"]), int(row["courier_x"])),
+                    (int(row["source_y"]), int(row["source_x"])),
+                    (int(row["destination_y"]), int(row["destination_x"])),
+                )
+        else:
+            for number, line in enumerate(stream):
+                if not line.strip():
+                    continue
+                job = json.loads(line)
+                yield (
+                    job.get("id", number),
+                    tuple(job["courier"]),
+                    tuple(job["source"]),
+                    tuple(job["destination"]),
+                )
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def share_arrays(arrays):
+    """Copy named arrays into shared memory; returns (segments, spec) for attach_arrays"""
+    segments = []
+    spec = {}
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        segment = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=segment.buf)[...] = array
+        segments.append(segment)
+        spec[name] = (segment.name, array.shape, array.dtype.str)
+    return segments, spec
+
+
+def attach_arrays(spec):
+    """Map arrays published by share_arrays without copying; returns (segments, arrays)"""
+    segments = []
+    arrays = {}
+    for name, (segment_name, shape, dtype) in spec.items():
+        segment = shared_memory.SharedMemory(name=segment_name)
+        segments.append(segment)
+        arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=segment.buf)
+    return segments, arrays
+
+
+def init_worker(spec, options):
+    """Pool initializer: attach the shared road model once per process"""
+    global _worker_router, _worker_segments, _worker_options
+    _worker_segments, arrays = attach_arrays(spec)
+    _worker_router = CourierRouter.from_arrays(arrays)
+    _worker_options = options
+
+
+def route_job(job):
+    """Plan one job with the worker's router and return its result record"""
+    return plan_job(_worker_router, job, **_worker_options)
+
+
+def plan_job(router, job, mode="A*", use_landmarks=True, include_paths=False):
+    """Route courier -> source -> destination and summarise the two legs"""
+    job_id, courier, source, destination = job
+    pickup = router.find_path(courier, source, mode, use_landmarks)
+    delivery = router.find_path(source, destination, mode, use_landmarks)
+
+    # Identical endpoints are a valid empty leg, anything else empty is unreachable
+    pickup_ok = bool(pickup) or tuple(courier) == tuple(source)
+    delivery_ok = bool(delivery) or tuple(source) == tuple(destination)
+
+    result = {
+        "id": job_id,
+        "pickup_length": len(pickup) if pickup_ok else None,
+        "delivery_length": len(delivery) if delivery_ok else None,
+    }
+    result["total_length"] = (
+        result["pickup_length"] + result["delivery_length"] if pickup_ok and delivery_ok else None
+    )
+    if include_paths:
+        result["pickup_path"] = [[int(y), int(x)] for y, x in pickup]
+        result["delivery_path"] = [[int(y), int(x)] for y, x in delivery]
+    return result
+
+
+def run_batch(router, jobs, output, workers=1, chunksize=16, **options):
+    """Plan jobs on router, writing one JSON line per job to output in input order"""
+    if workers <= 1:
+        results = (plan_job(router, job, **options) for job in jobs)
+        for result in results:
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+        return
+
+    segments, spec = share_arrays(router.to_arrays())
+    try:
+        with multiprocessing.Pool(
+            workers, initializer=init_worker,
+            initargs=(spec, options)
+        ) as pool:
+            for result in pool.imap(route_job, jobs, chunksize):
+                output.write(json.dumps(result) + "\n")
+                output.flush()
+    finally:
+        for segment in segments:
+            segment.close()
+            segment.unlink()
+
+
+def main(argv=None):
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Plan courier deliveries on a map without the GUI")
+    parser.add_argument("map", help="map image (PNG/JPEG)")
+    parser.add_argument("jobs", help="JSON lines or CSV file of jobs, or - for JSON lines on stdin")
+    parser.add_argument("-o", "--output", help="output JSON lines file (default: stdout)")
+    parser.add_argument("--paths", action="store_true", help="include the full pixel paths")
+    parser.add_argument("-w", "--workers", type=int, default=multiprocessing.cpu_count(),
+                        help="worker processes (1 plans in this process)")
+    parser.add_argument("--chunksize", type=int, default=16, help="jobs sent to a worker at a time")
+    parser.add_argument("--mode", choices=SEARCH_MODES, default=SEARCH_MODES[0], help="search mode")
+    parser.add_argument("--no-landmarks", action="store_true", help="disable the ALT heuristic")
+    parser.add_argument("--road-color", type=int, nargs=6, metavar=("R0", "G0", "B0", "R1", "G1", "B1"),
+                        help="inclusive road colour range")
+    args = parser.parse_args(argv)
+
+    color_range = ROAD_COLOR_RANGE
+    if args.road_color:
+        color_range = (tuple(args.road_color[:3]), tuple(args.road_color[3:]))
+    landmark_count = 0 if args.no_landmarks else LANDMARK_COUNT
+    router = CourierRouter.from_image(args.map, color_range, landmark_count)
+
+    output = open(args.output, "w") if args.output else sys.stdout
+    try:
+        run_batch(
+            router, read_jobs(args.jobs), output,
+            workers=args.workers, chunksize=args.chunksize,
+            mode=args.mode, use_landmarks=not args.no_landmarks, include_paths=args.paths,
+        )
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
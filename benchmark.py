@@ -0,0 +1,319 @@
+"""Headless benchmarks on seeded synthetic city maps
+
+Usage:
+    python benchmark.py [--sizes 1000x700 1500x1000] [--topologies grid organic plazas fragmented]
+                        [--modes A* JPS ...] [--queries N] [--seed S] [--output OUT]
+
+Maps and query sets are generated from --seed, so two runs (or two
+commits) measure exactly the same work. The result is one JSON document:
+per map, load timings and peak memory, position picking latency, and per
+search mode p50/p99 latency, nodes expanded and peak memory.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+from courier_router import CourierRouter, LANDMARK_COUNT, ROAD_COLOR_RANGE, SEARCH_MODES, road_mask_from_array
+from route_cache import RouteCache
+
+ROAD_RGB = (120, 120, 120)   # Inside ROAD_COLOR_RANGE
+GROUND_RGB = (70, 140, 70)   # Outside it
+TOPOLOGIES = ("grid", "organic", "plazas", "fragmented")
+
+# Lazily built structures each mode needs, warmed up before timing
+MODE_PREPARE = {"Road Graph": "road_graph", "HPA*": "cluster_graph", "JPS": "jump_points", "Weighted": "weighted_search"}
+
+
+def grid_city(rng, rows, cols, block=(40, 80), width=(3, 6), missing=0.1):
+    """Streets on a jittered grid, with a share of street segments removed for detours"""
+    mask = np.zeros((rows, cols), dtype=bool)
+    ys = np.cumsum(rng.integers(*block, size=rows // block[0] + 1))
+    xs = np.cumsum(rng.integers(*block, size=cols // block[0] + 1))
+    ys = ys[ys < rows - width[1]]
+    xs = xs[xs < cols - width[1]]
+    for y in ys:
+        mask[y:y + rng.integers(*width), :] = True
+    for x in xs:
+        mask[:, x:x + rng.integers(*width)] = True
+
+    # Knock out whole segments between neighbouring intersections
+    edges_y = np.concatenate([[0], ys + width[1], [rows]])
+    edges_x = np.concatenate([[0], xs + width[1], [cols]])
+    for y in ys:
+        for left, right in zip(edges_x[:-1], edges_x[1:]):
+            if rng.random() < missing:
+                mask[y:y + width[1], left:right - width[1]] = False
+    for x in xs:
+        for top, bottom in zip(edges_y[:-1], edges_y[1:]):
+            if rng.random() < missing:
+                mask[top:bottom - width[1], x:x + width[1]] = False
+    return mask
+
+
+def organic_streets(rng, rows, cols, walkers=None, steps=3000):
+    """Winding streets traced by random walkers with slowly drifting headings"""
+    mask = np.zeros((rows, cols), dtype=bool)
+    walkers = walkers or max(4, rows * cols // 40000)
+    for _ in range(walkers):
+        heading = rng.uniform(0, 2 * np.pi) + np.cumsum(rng.normal(0, 0.08, steps))
+        ys = np.clip(rng.uniform(0, rows) + np.cumsum(np.sin(heading)), 0, rows - 1)
+        xs = np.clip(rng.uniform(0, cols) + np.cumsum(np.cos(heading)), 0, cols - 1)
+        ys = ys.astype(np.int64)
+        xs = xs.astype(np.int64)
+        for dy in (-1, 0, 1):
+            for dx in (-1, 0, 1):
+                mask[np.clip(ys + dy, 0, rows - 1), np.clip(xs + dx, 0, cols - 1)] = True
+    return mask
+
+
+def wide_plazas(rng, rows, cols, plazas=None):
+    """A sparse street grid with large open squares, where searches spread widely"""
+    mask = grid_city(rng, rows, cols, block=(90, 160), width=(4, 7), missing=0.05)
+    plazas = plazas or max(3, rows * cols // 150000)
+    for _ in range(plazas):
+        height = rng.integers(60, 200)
+        width = rng.integers(60, 200)
+        top = rng.integers(0, max(1, rows - height))
+        left = rng.integers(0, max(1, cols - width))
+        mask[top:top + height, left:left + width] = True
+    return mask
+
+
+def fragmented(rng, rows, cols, rivers=None, islands=None):
+    """A street grid split by rivers with few bridges, plus isolated road fragments"""
+    mask = grid_city(rng, rows, cols, missing=0.2)
+    rivers = rivers or max(2, (rows + cols) // 500)
+    for _ in range(rivers):
+        thickness = rng.integers(8, 20)
+        bridges = rng.integers(0, 3)
+        if rng.random() < 0.5:
+            y = rng.integers(0, rows - thickness)
+            keep = mask[y:y + thickness, :].copy()
+            mask[y:y + thickness, :] = False
+            for x in rng.integers(0, cols, size=bridges):
+                mask[y:y + thickness, x:x + 5] = keep[:, x:x + 5].any(axis=0)
+        else:
+            x = rng.integers(0, cols - thickness)
+            keep = mask[:, x:x + thickness].copy()
+            mask[:, x:x + thickness] = False
+            for y in rng.integers(0, rows, size=bridges):
+                mask[y:y + 5, x:x + thickness] = keep[y:y + 5, :].any(axis=1)[:, None]
+
+    islands = islands or rows * cols // 20000
+    for y, x in zip(rng.integers(0, rows - 8, size=islands), rng.integers(0, cols - 8, size=islands)):
+        mask[y:y + rng.integers(1, 8), x:x + rng.integers(1, 8)] = True
+    return mask
+
+
+GENERATORS = {"grid": grid_city, "organic": organic_streets, "plazas": wide_plazas, "fragmented": fragmented}
+
+
+def synthetic_map(topology, width, height, seed):
+    """RGB array of a seeded synthetic map"""
+    rng = np.random.default_rng([seed, width, height, TOPOLOGIES.index(topology)])
+    mask = GENERATORS[topology](rng, height, width)
+    image = np.empty((height, width, 3), dtype=np.uint8)
+    image[:] = GROUND_RGB
+    image[mask] = ROAD_RGB
+    return image
+
+
+def make_queries(grid_search, count, seed):
+    """count (start, goal) pairs of distinct road pixels in the same component, size-weighted"""
+    rng = np.random.default_rng(seed)
+    roads = np.flatnonzero(grid_search.road_mask)
+    labels = grid_search.flat_labels
+    queries = []
+    while len(queries) < count and len(roads) > 1:
+        start = int(roads[rng.integers(len(roads))])
+        label = labels[start]
+        if grid_search.component_sizes[label] < 2:
+            continue
+        members = roads[labels[roads] == label] if grid_search.component_sizes[label] * 64 < len(roads) else None
+        while True:
+            goal = int(members[rng.integers(len(members))]) if members is not None else int(roads[rng.integers(len(roads))])
+            if goal != start and labels[goal] == label:
+                break
+        queries.append((divmod(start, grid_search.cols), divmod(goal, grid_search.cols)))
+    return queries
+
+
+def summarize(seconds):
+    """p50/p99/mean of a list of durations, in milliseconds"""
+    if not seconds:
+        return {"p50_ms": None, "p99_ms": None, "mean_ms": None}
+    milliseconds = np.asarray(seconds) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(milliseconds, 50)), 3),
+        "p99_ms": round(float(np.percentile(milliseconds, 99)), 3),
+        "mean_ms": round(float(milliseconds.mean()), 3),
+    }
+
+
+def peak_memory(work):
+    """Run work() under tracemalloc; returns (result, peak MiB allocated while it ran)"""
+    tracemalloc.start()
+    try:
+        result = work()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, round(peak / 2 ** 20, 2)
+
+
+def timed(work):
+    """Run work(); returns (result, seconds)"""
+    started = time.perf_counter()
+    result = work()
+    return result, time.perf_counter() - started
+
+
+def bench_load(map_array, directory, landmark_count):
+    """Map-loading timings: classify, build in memory, compile to disk and reopen"""
+    image_path = os.path.join(directory, "map.png")
+    Image.fromarray(map_array).save(image_path)
+
+    _, classify = timed(lambda: road_mask_from_array(map_array, ROAD_COLOR_RANGE))
+    router, build = timed(lambda: CourierRouter.from_array(map_array, None, ROAD_COLOR_RANGE, landmark_count))
+    _, compile_seconds = timed(lambda: CourierRouter.from_image(image_path, ROAD_COLOR_RANGE, landmark_count))
+    _, reopen = timed(lambda: CourierRouter.from_image(image_path, ROAD_COLOR_RANGE, landmark_count))
+    _, peak = peak_memory(lambda: CourierRouter.from_array(map_array, None, ROAD_COLOR_RANGE, landmark_count))
+    return router, {
+        "classify_ms": round(classify * 1000, 3),
+        "build_ms": round(build * 1000, 3),
+        "compile_ms": round(compile_seconds * 1000, 3),
+        "reopen_ms": round(reopen * 1000, 3),
+        "build_peak_mb": peak,
+    }
+
+
+def bench_positions(router, count, seed):
+    """Latency of picking courier, source and destination the way "Random Positions" does"""
+    random.seed(seed)
+    grid_search = router.grid_search
+    durations = []
+    for _ in range(count):
+        started = time.perf_counter()
+        component = grid_search.random_component(min_size=3)
+        if component is not None:
+            for _ in range(3):
+                grid_search.random_road_pixel(component)
+        durations.append(time.perf_counter() - started)
+    return summarize(durations)
+
+
+def bench_mode(router, queries, mode, use_landmarks, measure_memory=True):
+    """Latency, nodes expanded and peak memory for one search mode over a query set"""
+    router.route_cache = RouteCache()
+    prepare = 0.0
+    if mode in MODE_PREPARE:
+        _, prepare = timed(lambda: getattr(router, MODE_PREPARE[mode]))
+
+    durations = []
+    expanded = []
+    lengths = []
+    for start, goal in queries:
+        router.route_cache.clear()
+        path, seconds = timed(lambda: router.find_path(start, goal, mode, use_landmarks))
+        durations.append(seconds)
+        expanded.append(router.expanded)
+        lengths.append(len(path))
+
+    result = {
+        "prepare_ms": round(prepare * 1000, 3),
+        **summarize(durations),
+        "expanded_p50": int(np.percentile(expanded, 50)) if expanded else None,
+        "expanded_mean": round(float(np.mean(expanded)), 1) if expanded else None,
+        "found": sum(1 for length in lengths if length),
+        "path_length_total": int(sum(lengths)),
+    }
+    if measure_memory:
+        def run_all():
+            for start, goal in queries:
+                router.route_cache.clear()
+                router.find_path(start, goal, mode, use_landmarks)
+        _, result["search_peak_mb"] = peak_memory(run_all)
+    return result
+
+
+def run_benchmarks(sizes, topologies, modes, query_count, seed, use_landmarks=True,
+                   measure_memory=True, log=sys.stderr):
+    """Benchmark every (size, topology) map; returns the JSON-ready report"""
+    landmark_count = LANDMARK_COUNT if use_landmarks else 0
+    report = {
+        "seed": seed,
+        "queries": query_count,
+        "use_landmarks": use_landmarks,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "maps": [],
+    }
+    for width, height in sizes:
+        for topology in topologies:
+            log.write(f"{topology} {width}x{height}\n")
+            map_array = synthetic_map(topology, width, height, seed)
+            with tempfile.TemporaryDirectory() as directory:
+                router, load = bench_load(map_array, directory, landmark_count)
+
+            grid_search = router.grid_search
+            queries = make_queries(grid_search, query_count, seed)
+            entry = {
+                "topology": topology,
+                "width": width,
+                "height": height,
+                "road_pixels": grid_search.road_count,
+                "components": len(grid_search.component_sizes) - 1,
+                "load": load,
+                "pick_positions": bench_positions(router, 200, seed),
+                "modes": {},
+            }
+            for mode in modes:
+                log.write(f"  {mode}\n")
+                entry["modes"][mode] = bench_mode(router, queries, mode, use_landmarks, measure_memory)
+            report["maps"].append(entry)
+    return report
+
+
+def parse_size(text):
+    """WIDTHxHEIGHT -> (width, height)"""
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+def main(argv=None):
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Benchmark routing and map loading on synthetic maps")
+    parser.add_argument("--sizes", nargs="+", type=parse_size, default=[(1000, 700), (1500, 1000)],
+                        metavar="WxH", help="map sizes (default: the GUI's smallest and largest in-memory maps)")
+    parser.add_argument("--topologies", nargs="+", choices=TOPOLOGIES, default=list(TOPOLOGIES))
+    parser.add_argument("--modes", nargs="+", choices=SEARCH_MODES, default=list(SEARCH_MODES))
+    parser.add_argument("-n", "--queries", type=int, default=40, help="queries per map")
+    parser.add_argument("--seed", type=int, default=0, help="seed for maps and queries")
+    parser.add_argument("--no-landmarks", action="store_true", help="disable the ALT heuristic")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc passes")
+    parser.add_argument("-o", "--output", help="output JSON file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(
+        args.sizes, args.topologies, args.modes, args.queries, args.seed,
+        use_landmarks=not args.no_landmarks, measure_memory=not args.no_memory,
+    )
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+import heapq
+import numpy as np
+
+from grid_search import CANCEL_INTERVAL, UNVISITED, SearchCancelled
+from instrumentation import stats
+
+
+class BidirectionalSearch:
+    """Bidirectional A* over the road mask that meets in the middle
+
+    Both directions share the average potential p = (h_goal - h_start) / 2,
+    forwards +p and backwards -p, so reduced step costs are non-negative
+    either way and this is bidirectional Dijkstra on the reduced graph.
+    Keys are doubled to stay integral: the search stops once the two open
+    tops sum to at least twice the best meeting length found, which is
+    then a shortest path. Each iteration expands the smaller open list.
+    """
+
+    def __init__(self, grid_search):
+        self.grid_search = grid_search
+        self.expanded = 0   # Pixels closed by the latest search, both directions
+        self.open_peak = 0  # Largest combined open list of that search
+
+    def heuristic_field(self, target, landmarks=None):
+        """Manhattan distance to target, tightened with ALT bounds when landmarks are given"""
+        grid_search = self.grid_search
+        goal_y, goal_x = divmod(target, grid_search.cols)
+        dy = np.abs(np.arange(grid_search.rows, dtype=np.int32) - goal_y)
+        dx = np.abs(np.arange(grid_search.cols, dtype=np.int32) - goal_x)
+        field = (dy[:, None] + dx[None, :]).ravel()
+        if landmarks is not None:
+            field = landmarks.heuristic_field(target, field)
+        return field
+
+    def search(self, start, goal, landmarks=None, cancel=None):
+        """Return the (y, x) path from start (exclusive) to goal (inclusive), or []"""
+        self.expanded = 0
+        self.open_peak = 0
+        grid_search = self.grid_search
+        if not grid_search.connected(start, goal):
+            return []
+        source = grid_search.to_index(start)
+        target = grid_search.to_index(goal)
+        if source == target:
+            return []
+
+        cols = grid_search.cols
+        size = grid_search.size
+        last_col = cols - 1
+        last_row_start = size - cols
+        passable = grid_search.passable
+
+        # Doubled forward potential; the backward search uses its negation
+        potential = memoryview(self.heuristic_field(target, landmarks) - self.heuristic_field(source, landmarks))
+
+        forward_g_array = np.full(size, UNVISITED, dtype=np.int32)
+        backward_g_array = np.full(size, UNVISITED, dtype=np.int32)
+        forward_parent_array = np.full(size, -1, dtype=np.int32)
+        backward_parent_array = np.full(size, -1, dtype=np.int32)
+        forward_g = memoryview(forward_g_array)
+        backward_g = memoryview(backward_g_array)
+        forward_parent = memoryview(forward_parent_array)
+        backward_parent = memoryview(backward_parent_array)
+        forward_closed = bytearray(size)
+        backward_closed = bytearray(size)
+
+        forward_g[source] = 0
+        backward_g[target] = 0
+        forward_open = [potential[source] * size + source]
+        backward_open = [-potential[target] * size + target]
+        best = UNVISITED
+        meet = -1
+        expanded = 0
+        open_peak = 0
+        track_peak = stats.enabled
+        sign = 0
+
+        heappop = heapq.heappop
+        heappush = heapq.heappush
+
+        # Entries of already closed pixels can only make a top smaller,
+        # which delays the stop but never ends the search early
+        while forward_open and backward_open:
+            if forward_open[0] // size + backward_open[0] // size >= 2 * best:
+                break
+            if track_peak and len(forward_open) + len(backward_open) > open_peak:
+                open_peak = len(forward_open) + len(backward_open)
+
+            # Expand the smaller side, rebinding the locals only when it changes
+            forward = len(forward_open) <= len(backward_open)
+            if forward != (sign == 1):
+                if forward:
+                    open_set, g_score, other_g, came_from, closed, sign = (
+                        forward_open, forward_g, backward_g, forward_parent, forward_closed, 1
+                    )
+                else:
+                    open_set, g_score, other_g, came_from, closed, sign = (
+                        backward_open, backward_g, forward_g, backward_parent, backward_closed, -1
+                    )
+            current = heappop(open_set) % size
+            if closed[current]:
+                continue
+            closed[current] = 1
+
+            expanded += 1
+            if cancel is not None and not expanded % CANCEL_INTERVAL and cancel.cancelled:
+                raise SearchCancelled()
+
+            cx = current % cols
+            tentative_g = g_score[current] + 1
+            doubled_g = 2 * tentative_g
+
+            # Neighbors in the same order as GridSearch (right, down, left, up).
+            # Pixels the other side never reached hold UNVISITED, so they can
+            # never beat best and need no separate check
+            if cx < last_col:
+                neighbor = current + 1
+                if passable[neighbor] and tentative_g < g_score[neighbor]:
+                    g_score[neighbor] = tentative_g
+                    came_from[neighbor] = current
+                    heappush(open_set, (doubled_g + sign * potential[neighbor]) * size + neighbor)
+                    if tentative_g + other_g[neighbor] < best:
+                        best = tentative_g + other_g[neighbor]
+                        meet = neighbor
+
+            if current < last_row_start:
+                neighbor = current + cols
+                if passable[neighbor] and tentative_g < g_score[neighbor]:
+                    g_score[neighbor] = tentative_g
+                    came_from[neighbor] = current
+                    heappush(open_set, (doubled_g + sign * potential[neighbor]) * size + neighbor)
+                    if tentative_g + other_g[neighbor] < best:
+                        best = tentative_g + other_g[neighbor]
+                        meet = neighbor
+
+            if cx > 0:
+                neighbor = current - 1
+                if passable[neighbor] and tentative_g < g_score[neighbor]:
+                    g_score[neighbor] = tentative_g
+                    came_from[neighbor] = current
+                    heappush(open_set, (doubled_g + sign * potential[neighbor]) * size + neighbor)
+                    if tentative_g + other_g[neighbor] < best:
+                        best = tentative_g + other_g[neighbor]
+                        meet = neighbor
+
+            if current >= cols:
+                neighbor = current - cols
+                if passable[neighbor] and tentative_g < g_score[neighbor]:
+                    g_score[neighbor] = tentative_g
+                    came_from[neighbor] = current
+                    heappush(open_set, (doubled_g + sign * potential[neighbor]) * size + neighbor)
+                    if tentative_g + other_g[neighbor] < best:
+                        best = tentative_g + other_g[neighbor]
+                        meet = neighbor
+
+        self.expanded = expanded
+        self.open_peak = open_peak
+        if meet < 0:
+            return []
+        return self.splice(forward_parent, backward_parent, source, target, meet)
+
+    def splice(self, forward_parent, backward_parent, source, target, meet):
+        """Join the forward parents back to source and the backward parents on to target"""
+        cols = self.grid_search.cols
+        path = []
+        current = meet
+        while current != source:
+            path.append(divmod(current, cols))
+            current = forward_parent[current]
+        path.reverse()
+        current = meet
+        while current != target:
+            current = backward_parent[current]
+            path.append(divmod(current, cols))
+        return path
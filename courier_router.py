@@ -0,0 +1,386 @@
+import time
+import numpy as np
+from PIL import Image
+
+from bidirectional import BidirectionalSearch
+from flow_field import FlowFields
+from grid_search import GridSearch
+from hpa import ClusterGraph
+from instrumentation import stats
+from jps import JumpPointSearch
+from line_of_sight import line_is_clear, line_path, smooth_path
+from landmarks import LandmarkTable
+from map_cache import CompiledMap
+from road_graph import RoadGraph
+from route_cache import RouteCache
+from tiled_map import TiledMap
+from traffic import TrafficModel
+from weighted_search import WeightedSearch
+
+# Defaults shared by the simulator and the batch tools
+ROAD_COLOR_RANGE = ((90, 90, 90), (150, 150, 150))
+LANDMARK_COUNT = 8
+SEARCH_MODES = ("A*", "Road Graph", "HPA*", "JPS", "Weighted", "Flow Field", "Bidirectional")
+
+# Step costs for road colour bands, as ((min_rgb, max_rgb), cost) with cost
+# 1-255; the first matching band wins and other road pixels cost 1. Example:
+# ((((90, 90, 90), (110, 110, 110)), 1), (((111, 111, 111), (150, 150, 150)), 3))
+TERRAIN_COSTS = ()
+
+
+def road_mask_from_array(map_array, color_range=ROAD_COLOR_RANGE):
+    """Return boolean mask of pixels whose RGB lies inside color_range"""
+    min_rgb, max_rgb = color_range
+
+    # Vectorized operation for better performance
+    return (
+        (map_array[:, :, 0] >= min_rgb[0]) & (map_array[:, :, 0] <= max_rgb[0]) &
+        (map_array[:, :, 1] >= min_rgb[1]) & (map_array[:, :, 1] <= max_rgb[1]) &
+        (map_array[:, :, 2] >= min_rgb[2]) & (map_array[:, :, 2] <= max_rgb[2])
+    )
+
+
+def cost_raster_from_array(map_array, color_range=ROAD_COLOR_RANGE, terrain_costs=TERRAIN_COSTS):
+    """Return the uint8 step cost of every pixel: 0 off road, else its terrain band's cost"""
+    road = road_mask_from_array(map_array, color_range)
+    costs = road.astype(np.uint8)
+    unassigned = road.copy()
+    for band, cost in terrain_costs:
+        matched = unassigned & road_mask_from_array(map_array, band)
+        costs[matched] = cost
+        unassigned &= ~matched
+    return costs
+
+
+class CourierRouter:
+    """GUI-free road model and pathfinding for one map"""
+
+    def __init__(self, grid_search, landmarks=None, route_cache=None, costs=None):
+        self.grid_search = grid_search
+        self.landmarks = landmarks
+        self.route_cache = route_cache if route_cache is not None else RouteCache()
+        self.costs = costs  # uint8 step-cost raster, None when every road pixel costs 1
+        self._weighted_search = None
+        self._traffic = None
+        self.expanded = 0   # Nodes the latest find_path searched; 0 for cache hits and straight lines
+        self.open_peak = 0  # Largest open list of that search
+        self._road_graph = None
+        self._cluster_graph = None
+        self._jump_points = None
+        self._flow_fields = None
+        self._bidirectional = None
+        self.closed = set()  # Road pixels closed at runtime, as flat indices
+
+    @classmethod
+    def from_array(cls, map_array, image_path=None, color_range=ROAD_COLOR_RANGE,
+                   landmark_count=LANDMARK_COUNT, route_cache=None, terrain_costs=TERRAIN_COSTS):
+        """Build a router from an RGB array; landmarks are cached next to image_path"""
+        costs = None
+        with stats.timer("mask", width=map_array.shape[1], height=map_array.shape[0]):
+            if terrain_costs:
+                costs = cost_raster_from_array(map_array, color_range, terrain_costs)
+                road_mask = costs > 0
+            else:
+                road_mask = road_mask_from_array(map_array, color_range)
+        grid_search = GridSearch(road_mask)
+        landmarks = None
+        if landmark_count:
+            with stats.timer("landmarks", count=landmark_count):
+                if image_path is None:
+                    landmarks = LandmarkTable.build(grid_search, landmark_count)
+                else:
+                    landmarks = LandmarkTable.load_or_build(image_path, grid_search, landmark_count)
+        return cls(grid_search, landmarks, route_cache, costs)
+
+    @classmethod
+    def from_image(cls, image_path, color_range=ROAD_COLOR_RANGE, landmark_count=LANDMARK_COUNT,
+                   route_cache=None, terrain_costs=TERRAIN_COSTS):
+        """Build a router for a map image, reusing its compiled map when one is valid
+
+        Only a cache miss decodes the image; the result is then compiled to disk.
+        """
+        arrays = CompiledMap.load(image_path, color_range, terrain_costs, landmark_count)
+        if arrays is not None and (landmark_count == 0 or "distances" in arrays):
+            if not landmark_count:
+                arrays = {name: array for name, array in arrays.items() if name not in ("landmarks", "distances")}
+            stats.count("compiled map hits")
+            return cls.from_arrays(arrays, route_cache)
+
+        stats.count("compiled map misses")
+        with Image.open(image_path) as img:
+            map_array = np.array(img.convert("RGB"))
+        router = cls.from_array(map_array, None, color_range, landmark_count, route_cache, terrain_costs)
+        CompiledMap.save(image_path, color_range, router.to_arrays(), terrain_costs, landmark_count)
+        return router
+
+    @classmethod
+    def from_tiled(cls, image_path, color_range=ROAD_COLOR_RANGE, route_cache=None, cache_tiles=1024):
+        """Build a router over an out-of-core tiled mask, compiling it on first use
+
+        Tiled maps have no landmarks or road graph; every mode searches the tiles.
+        """
+        return cls(TiledMap.load_or_compile(image_path, color_range, cache_tiles), None, route_cache)
+
+    @classmethod
+    def from_arrays(cls, arrays, route_cache=None):
+        """Rebuild a router around arrays from to_arrays; only the search bytes are copied"""
+        grid_search = GridSearch(arrays["road_mask"], (arrays["labels"], arrays["component_sizes"]))
+        landmarks = None
+        if "distances" in arrays:
+            landmarks = LandmarkTable(arrays["landmarks"], arrays["distances"], grid_search.fingerprint)
+        return cls(grid_search, landmarks, route_cache, arrays.get("costs"))
+
+    def to_arrays(self):
+        """Arrays needed to rebuild this router in another process or from disk"""
+        arrays = {
+            "road_mask": self.grid_search.road_mask,
+            "labels": self.grid_search.labels,
+            "component_sizes": self.grid_search.component_sizes,
+        }
+        if self.landmarks is not None:
+            arrays["landmarks"] = self.landmarks.landmarks
+            arrays["distances"] = self.landmarks.distances
+        if self.costs is not None:
+            arrays["costs"] = self.costs
+        return arrays
+
+    def close(self):
+        """Release the tile file of a tiled road model; in-memory models hold none"""
+        if self.tiled:
+            self.grid_search.close()
+
+    @property
+    def tiled(self):
+        """True when the road model is a TiledMap rather than in-memory arrays"""
+        return isinstance(self.grid_search, TiledMap)
+
+    @property
+    def road_graph(self):
+        """Skeleton graph for the "Road Graph" mode, built on first use"""
+        if self._road_graph is None:
+            self._road_graph = RoadGraph(self.grid_search)
+        return self._road_graph
+
+    @property
+    def cluster_graph(self):
+        """Cluster abstraction for the "HPA*" mode, built on first use"""
+        if self._cluster_graph is None:
+            self._cluster_graph = ClusterGraph(self.grid_search)
+        return self._cluster_graph
+
+    @property
+    def weighted_search(self):
+        """Bucket-queue search over the step-cost raster for the "Weighted" mode"""
+        if self._weighted_search is None:
+            self._weighted_search = WeightedSearch(self.grid_search, self.costs)
+        return self._weighted_search
+
+    @property
+    def traffic(self):
+        """Time-dependent speed profiles, or None until some congestion slows a road
+
+        Without congestion travel time follows path length (and terrain
+        costs) alone, so callers can skip the timed machinery entirely.
+        """
+        if self._traffic is None or not self._traffic.congested:
+            return None
+        return self._traffic
+
+    @property
+    def jump_points(self):
+        """Jump tables for the "JPS" mode, built on first use"""
+        if self._jump_points is None:
+            self._jump_points = JumpPointSearch(self.grid_search)
+        return self._jump_points
+
+    @property
+    def flow_fields(self):
+        """Per-destination distance fields for the "Flow Field" mode"""
+        if self._flow_fields is None:
+            self._flow_fields = FlowFields(self.grid_search)
+        return self._flow_fields
+
+    @property
+    def bidirectional(self):
+        """Meet-in-the-middle A* for the "Bidirectional" mode"""
+        if self._bidirectional is None:
+            self._bidirectional = BidirectionalSearch(self.grid_search)
+        return self._bidirectional
+
+    def set_closed(self, indices, closed=True, refresh=True):
+        """Close road pixels, or reopen closed ones; returns the flat indices that changed
+
+        Only pixels that were road can be closed, so distances never drop
+        below the original map's and the landmark bounds stay admissible.
+        Route cache keys follow the mask fingerprint, which changes with
+        every call, so stale routes are never served. With refresh=False
+        the relabel waits for refresh(), so a brush stroke pays for it once.
+        """
+        if self.tiled:
+            raise ValueError("Road closures need a map that fits in memory")
+
+        grid_search = self.grid_search
+        indices = np.unique(np.asarray(indices, dtype=np.int64))
+        if closed:
+            changed = indices[grid_search.road_mask.ravel()[indices]]
+            self.closed.update(changed.tolist())
+        else:
+            changed = np.array([index for index in indices.tolist() if index in self.closed], dtype=np.int64)
+            self.closed.difference_update(changed.tolist())
+        if not len(changed):
+            return changed
+
+        grid_search.set_passable(changed, not closed, refresh)
+        self._road_graph = None
+        self._jump_points = None
+        if self._cluster_graph is not None:
+            ys, xs = np.divmod(changed, grid_search.cols)
+            self._cluster_graph.invalidate(int(ys.min()), int(xs.min()), int(ys.max()) + 1, int(xs.max()) + 1)
+        return changed
+
+    def refresh(self):
+        """Relabel and fully re-fingerprint the mask after set_closed(..., refresh=False)"""
+        self.grid_search.refresh()
+
+    def set_congestion(self, top, left, bottom, right, start, end, speed):
+        """Set the speed (percent of free flow) of a pixel rectangle during simulated [start, end)
+
+        Only cached routes the change can affect are dropped.
+        """
+        if self.tiled:
+            raise ValueError("Traffic needs a map that fits in memory")
+        if self._traffic is None:
+            self._traffic = TrafficModel(self.grid_search, self.costs)
+        for key in self._traffic.set_congestion(top, left, bottom, right, start, end, speed):
+            self.route_cache.discard(key)
+        self._traffic.forget(self.route_cache.__contains__)
+
+    def find_path(self, start, goal, mode="A*", use_landmarks=True, smooth=False, departure=None, cancel=None):
+        """Find a path with the given search mode, using the route cache
+
+        smooth string-pulls staircases into straight lines of equal length.
+        With a departure time (simulated seconds) on a congested map, a
+        route that congestion would slow is replaced by the earliest-arrival
+        route; otherwise the mode's route is already the fastest and
+        departure is ignored. Travel times count terrain costs, so on a
+        costed map the timed candidate is the unsmoothed "Weighted" route.
+        A set cancel token stops the search with SearchCancelled.
+        """
+        start = (int(start[0]), int(start[1]))
+        goal = (int(goal[0]), int(goal[1]))
+        traffic = self.traffic
+        if departure is None or traffic is None:
+            return self.mode_path(start, goal, mode, use_landmarks, smooth, cancel)
+
+        if self.costs is not None:
+            mode, smooth = "Weighted", False
+        path = self.mode_path(start, goal, mode, use_landmarks, smooth, cancel)
+        if traffic.delays(path, departure):
+            path = self.timed_path(start, goal, int(departure), cancel)
+        return path
+
+    def route_key(self, start, goal, mode, use_landmarks, smooth):
+        """Route cache key of an untimed mode_path query"""
+        start = (int(start[0]), int(start[1]))
+        goal = (int(goal[0]), int(goal[1]))
+        return (self.grid_search.fingerprint, mode, use_landmarks, smooth, start, goal)
+
+    def mode_path(self, start, goal, mode, use_landmarks, smooth, cancel=None):
+        """Untimed path from the selected search mode, using the route cache"""
+        key = self.route_key(start, goal, mode, use_landmarks, smooth)
+        self.expanded = 0
+        self.open_peak = 0
+        path = self.route_cache.get(key)
+        if path is not None:
+            stats.count("route cache hits")
+            return path
+        stats.count("route cache misses")
+
+        started = time.perf_counter()
+        if mode == "Road Graph" and not self.tiled:
+            engine = self.road_graph
+            path = engine.search(start, goal, self.landmarks if use_landmarks else None, cancel)
+        elif mode == "HPA*" and not self.tiled:
+            engine = self.cluster_graph
+            path = engine.search(start, goal, cancel)
+        elif mode == "JPS" and not self.tiled:
+            engine = self.jump_points
+            path = engine.search(start, goal, cancel)
+        elif mode == "Weighted" and not self.tiled:
+            engine = self.weighted_search
+            path = engine.search(start, goal, cancel)
+        elif mode == "Flow Field" and not self.tiled:
+            engine = self.flow_fields
+            path = engine.search(start, goal, cancel)
+        elif mode == "Bidirectional" and not self.tiled:
+            engine = self.bidirectional
+            path = engine.search(start, goal, self.landmarks if use_landmarks else None, cancel)
+        else:
+            engine = self
+            path = self.a_star(start, goal, use_landmarks, cancel)
+        self.expanded = engine.expanded
+        self.open_peak = engine.open_peak
+
+        if path and smooth:
+            path = smooth_path(self.grid_search, start, path)
+        if path:
+            self.route_cache.put(key, path)
+        stats.record(
+            f"find_path {mode}", time.perf_counter() - started,
+            expanded=self.expanded, open_peak=self.open_peak, length=len(path),
+        )
+        return path
+
+    def timed_path(self, start, goal, departure, cancel=None):
+        """Earliest-arrival path leaving at departure, using the route cache
+
+        Not smoothed, since straightening could move it into slower clusters.
+        """
+        key = (self.grid_search.fingerprint, "Traffic", departure, start, goal)
+        self.expanded = 0
+        self.open_peak = 0
+        path = self.route_cache.get(key)
+        if path is not None:
+            stats.count("route cache hits")
+            return path
+        stats.count("route cache misses")
+
+        started = time.perf_counter()
+        path = self._traffic.search(start, goal, departure, cancel)
+        self.expanded = self._traffic.expanded
+        self.open_peak = self._traffic.open_peak
+        if path:
+            self.route_cache.put(key, path)
+            self._traffic.track(key, start, path, departure)
+        stats.record(
+            "find_path Traffic", time.perf_counter() - started,
+            expanded=self.expanded, open_peak=self.open_peak, length=len(path),
+        )
+        return path
+
+    def a_star(self, start, goal, use_landmarks=True, cancel=None):
+        """Extremely optimized A* pathfinding algorithm"""
+        if start == goal:
+            return []
+
+        if not (self.grid_search.is_road(start) and self.grid_search.is_road(goal)):
+            return []
+
+        # A clear straight line is already a shortest path (faster than A*)
+        if self.check_straight_line(start, goal):
+            return self.bresenham_line(start, goal)
+
+        # Otherwise use the array-backed A* engine
+        landmarks = self.landmarks if use_landmarks else None
+        path = self.grid_search.search(start, goal, landmarks, cancel)
+        self.expanded = self.grid_search.expanded
+        self.open_peak = self.grid_search.open_peak
+        return path
+
+    def check_straight_line(self, start, goal):
+        """Check that every pixel on the straight line between two points is road"""
+        return line_is_clear(self.grid_search, start, goal)
+
+    def bresenham_line(self, start, goal):
+        """Straight 4-connected line from start (exclusive) to goal (inclusive)"""
+        return line_path(start, goal)
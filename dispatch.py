@@ -0,0 +1,164 @@
+import time
+import numpy as np
+
+DISPATCH_METHODS = ("greedy", "hungarian")
+
+
+def hungarian(cost):
+    """Minimum-cost assignment for a rows <= cols cost matrix; returns the column per row
+
+    Shortest augmenting path form of the Hungarian algorithm, O(rows^2 * cols).
+    """
+    rows, cols = cost.shape
+    cost = np.asarray(cost, dtype=np.float64)
+    row_potential = np.zeros(rows + 1)
+    col_potential = np.zeros(cols + 1)
+    col_match = np.zeros(cols + 1, dtype=np.int64)   # 1-based row matched to each column
+    way = np.zeros(cols + 1, dtype=np.int64)
+
+    for row in range(1, rows + 1):
+        col_match[0] = row
+        free_col = 0
+        min_slack = np.full(cols + 1, np.inf)
+        used = np.zeros(cols + 1, dtype=bool)
+        while True:
+            used[free_col] = True
+            current_row = col_match[free_col]
+            slack = cost[current_row - 1] - row_potential[current_row] - col_potential[1:]
+            open_cols = ~used[1:]
+            improve = open_cols & (slack < min_slack[1:])
+            min_slack[1:][improve] = slack[improve]
+            way[1:][improve] = free_col
+
+            candidates = np.where(open_cols, min_slack[1:], np.inf)
+            next_col = int(np.argmin(candidates)) + 1
+            delta = candidates[next_col - 1]
+
+            matched = np.flatnonzero(used)
+            row_potential[col_match[matched]] += delta
+            col_potential[matched] -= delta
+            min_slack[1:][open_cols] -= delta
+            free_col = next_col
+            if col_match[free_col] == 0:
+                break
+
+        # Flip the augmenting path
+        while free_col:
+            previous = way[free_col]
+            col_match[free_col] = col_match[previous]
+            free_col = previous
+
+    assignment = np.full(rows, -1, dtype=np.int64)
+    for col in range(1, cols + 1):
+        if col_match[col]:
+            assignment[col_match[col] - 1] = col - 1
+    return assignment
+
+
+class Dispatcher:
+    """Match idle couriers to pending pickups using road distances from BFS waves"""
+
+    def __init__(self, grid_search, method="greedy"):
+        if method not in DISPATCH_METHODS:
+            raise ValueError(f"Unknown dispatch method: {method}")
+        self.grid_search = grid_search
+        self.method = method
+
+    def assign(self, couriers, sources):
+        """Assign couriers to job sources, each used at most once
+
+        couriers and sources are flat pixel indices. Returns a dict with
+        "pairs" as (courier_number, source_number, distance) sorted by
+        distance, plus "total_length", "latency" in seconds and "sweeps",
+        the number of BFS waves run.
+        """
+        started = time.perf_counter()
+        couriers = np.asarray(couriers, dtype=np.int64)
+        sources = np.asarray(sources, dtype=np.int64)
+        if not len(couriers) or not len(sources):
+            pairs, sweeps = [], 0
+        elif self.method == "hungarian":
+            pairs, sweeps = self.assign_optimal(couriers, sources)
+        else:
+            pairs, sweeps = self.assign_greedy(couriers, sources)
+
+        pairs.sort(key=lambda pair: pair[2])
+        return {
+            "pairs": pairs,
+            "total_length": sum(distance for _, _, distance in pairs),
+            "latency": time.perf_counter() - started,
+            "sweeps": sweeps,
+        }
+
+    def assign_greedy(self, couriers, sources):
+        """Repeated multi-source waves: each round pairs points with their nearest partner
+
+        Every round runs one wave from the smaller side, which labels each
+        pixel with its nearest seed. Seeds then take their closest claimant;
+        points that lost their seed to a closer one try again next round.
+        """
+        free_couriers = np.arange(len(couriers))
+        free_sources = np.arange(len(sources))
+        pairs = []
+        sweeps = 0
+
+        while len(free_couriers) and len(free_sources):
+            seeds_are_sources = len(free_sources) <= len(free_couriers)
+            seeds = free_sources if seeds_are_sources else free_couriers
+            targets = free_couriers if seeds_are_sources else free_sources
+            seed_pixels = (sources if seeds_are_sources else couriers)[seeds]
+            target_pixels = (couriers if seeds_are_sources else sources)[targets]
+
+            distance, owner = self.grid_search.distance_field(seed_pixels, target_pixels, with_owner=True)
+            sweeps += 1
+            reach = distance[target_pixels]
+            reached = np.flatnonzero(reach >= 0)
+            if not len(reached):
+                break
+
+            taken = set()
+            matched_seeds = []
+            matched_targets = []
+            for target in reached[np.argsort(reach[reached], kind="stable")].tolist():
+                seed = int(owner[target_pixels[target]])
+                if seed in taken:
+                    continue
+                taken.add(seed)
+                matched_seeds.append(seed)
+                matched_targets.append(target)
+                courier, source = (targets[target], seeds[seed]) if seeds_are_sources else (seeds[seed], targets[target])
+                pairs.append((int(courier), int(source), int(reach[target])))
+
+            seed_left = np.ones(len(seeds), dtype=bool)
+            seed_left[matched_seeds] = False
+            target_left = np.ones(len(targets), dtype=bool)
+            target_left[matched_targets] = False
+            if seeds_are_sources:
+                free_sources, free_couriers = seeds[seed_left], targets[target_left]
+            else:
+                free_couriers, free_sources = seeds[seed_left], targets[target_left]
+
+        return pairs, sweeps
+
+    def assign_optimal(self, couriers, sources):
+        """Hungarian matching on the full courier x source road-distance matrix
+
+        Needs one wave per point on the smaller side, so it suits small batches.
+        """
+        transpose = len(couriers) > len(sources)
+        rows, cols = (sources, couriers) if transpose else (couriers, sources)
+
+        unreachable = float(self.grid_search.size)
+        cost = np.full((len(rows), len(cols)), unreachable)
+        for row, pixel in enumerate(rows.tolist()):
+            distance = self.grid_search.distance_field([pixel], cols)
+            reach = distance[cols]
+            cost[row, reach >= 0] = reach[reach >= 0]
+
+        pairs = []
+        for row, col in enumerate(hungarian(cost).tolist()):
+            if col < 0 or cost[row, col] >= unreachable:
+                continue
+            courier, source = (col, row) if transpose else (row, col)
+            pairs.append((courier, source, int(cost[row, col])))
+        return pairs, len(rows)
@@ -0,0 +1,168 @@
+import heapq
+import numpy as np
+
+from grid_search import UNVISITED
+
+
+class DStarLite:
+    """D* Lite on the 4-connected road grid for one goal
+
+    Distances are kept backwards from the goal, so when roads close or
+    reopen only the vertices whose distances actually change are repaired,
+    and the courier can replan from wherever it is without starting over.
+    """
+
+    def __init__(self, grid_search, start, goal):
+        self.grid_search = grid_search
+        self.cols = grid_search.cols
+        self.size = grid_search.size
+        self.goal = grid_search.to_index(goal)
+        self.start = grid_search.to_index(start)
+        self.offset = 0  # km: heuristic drift as the start moves
+        self.open_set = []
+        self.expanded = 0
+
+        # A full BFS field from the goal is exactly the state D* Lite would
+        # converge to, with every vertex consistent and nothing queued
+        distance = grid_search.distance_field([self.goal])
+        self.g_array = np.where(distance >= 0, distance, UNVISITED).astype(np.int32)
+        self.rhs_array = self.g_array.copy()
+        self.key_array = np.full(self.size, -1, dtype=np.int64)  # Live heap key per vertex
+        self.g = memoryview(self.g_array)
+        self.rhs = memoryview(self.rhs_array)
+        self.queued = memoryview(self.key_array)
+        self.set_start(self.start)
+
+    def set_start(self, start):
+        """Move the search start, refreshing the Manhattan heuristic field"""
+        start_y, start_x = divmod(start, self.cols)
+        rows = self.size // self.cols
+        dy = np.abs(np.arange(rows, dtype=np.int32) - start_y)
+        dx = np.abs(np.arange(self.cols, dtype=np.int32) - start_x)
+        self.heuristic_array = (dy[:, None] + dx[None, :]).ravel()
+        self.h = memoryview(self.heuristic_array)
+        self.start = start
+
+    def key(self, index):
+        """Pack D* Lite's (k1, k2) key into one int that orders the same way"""
+        best = min(self.g[index], self.rhs[index])
+        return (best + self.h[index] + self.offset) * self.size + best
+
+    def top(self):
+        """Smallest live (key, index), dropping stale entries, or None"""
+        open_set = self.open_set
+        queued = self.queued
+        while open_set:
+            key, index = open_set[0]
+            if queued[index] == key:
+                return key, index
+            heapq.heappop(open_set)
+        return None
+
+    def neighbours(self, index):
+        """Passable 4-neighbours of a flat index"""
+        cols = self.cols
+        passable = self.grid_search.passable
+        x = index % cols
+        result = []
+        if x < cols - 1 and passable[index + 1]:
+            result.append(index + 1)
+        if index + cols < self.size and passable[index + cols]:
+            result.append(index + cols)
+        if x > 0 and passable[index - 1]:
+            result.append(index - 1)
+        if index >= cols and passable[index - cols]:
+            result.append(index - cols)
+        return result
+
+    def update_vertex(self, index):
+        """Recompute rhs from the neighbours and requeue if inconsistent"""
+        g = self.g
+        if index != self.goal:
+            best = UNVISITED
+            if self.grid_search.passable[index]:
+                for neighbour in self.neighbours(index):
+                    if g[neighbour] < best:
+                        best = g[neighbour]
+                best = min(best + 1, UNVISITED)
+            self.rhs[index] = best
+        if g[index] != self.rhs[index]:
+            key = self.key(index)
+            self.queued[index] = key
+            heapq.heappush(self.open_set, (key, index))
+        else:
+            self.queued[index] = -1
+
+    def compute(self):
+        """Expand vertices until the start's distance is settled"""
+        g = self.g
+        rhs = self.rhs
+        queued = self.queued
+        open_set = self.open_set
+        goal = self.goal
+        start = self.start
+        neighbours = self.neighbours
+        update_vertex = self.update_vertex
+        while True:
+            top = self.top()
+            if top is None:
+                break
+            key, index = top
+            if key >= self.key(start) and rhs[start] == g[start]:
+                break
+
+            self.expanded += 1
+            new_key = self.key(index)
+            if key < new_key:
+                queued[index] = new_key
+                heapq.heapreplace(open_set, (new_key, index))
+            elif g[index] > rhs[index]:
+                g[index] = rhs[index]
+                heapq.heappop(open_set)
+                queued[index] = -1
+                through = g[index] + 1
+                for neighbour in neighbours(index):
+                    if neighbour != goal and through < rhs[neighbour]:
+                        rhs[neighbour] = through
+                        update_vertex(neighbour)
+            else:
+                g[index] = UNVISITED
+                update_vertex(index)
+                for neighbour in neighbours(index):
+                    update_vertex(neighbour)
+
+    def update(self, changed, position):
+        """Repair distances after the pixels in changed opened or closed; courier now at position"""
+        start = self.grid_search.to_index(position)
+        self.offset += int(self.h[start])
+        self.set_start(start)
+
+        passable = self.grid_search.passable
+        cols = self.cols
+        for index in changed:
+            index = int(index)
+            if not passable[index]:
+                self.g[index] = UNVISITED
+            self.update_vertex(index)
+            x = index % cols
+            for neighbour, valid in (
+                (index + 1, x < cols - 1), (index + cols, index + cols < self.size),
+                (index - 1, x > 0), (index - cols, index >= cols),
+            ):
+                if valid and passable[neighbour]:
+                    self.update_vertex(neighbour)
+        self.compute()
+
+    def path(self, position):
+        """Descend the distance field from position as (y, x) steps; [] unless it reaches the goal"""
+        current = self.grid_search.to_index(position)
+        g = self.g
+        if g[current] >= UNVISITED:
+            return []
+        path = []
+        while current != self.goal and len(path) < self.size:
+            current = min(self.neighbours(current), key=lambda neighbour: g[neighbour], default=None)
+            if current is None or g[current] >= UNVISITED:
+                return []
+            path.append(divmod(current, self.cols))
+        return path if current == self.goal else []
@@ -0,0 +1,197 @@
+from collections import deque
+import numpy as np
+
+from dispatch import Dispatcher
+
+# Courier states
+IDLE = 0
+TO_PICKUP = 1
+TO_DROPOFF = 2
+WAITING = 3  # Assigned a leg whose route has not been planned yet
+
+
+class Fleet:
+    """Tick-based simulation of many couriers and a queue of pickup/drop-off jobs
+
+    Every courier's route lives in one shared pool of flat pixel indices;
+    per-courier arrays hold the route's offset, length and current step,
+    so a tick advances the whole fleet with a few vector operations.
+    """
+
+    def __init__(self, router, positions, mode="A*", use_landmarks=True, max_plans_per_tick=4,
+                 dispatch_method="greedy", dispatch_interval=10):
+        self.router = router
+        self.grid_search = router.grid_search
+        self.cols = self.grid_search.cols
+        self.mode = mode
+        self.use_landmarks = use_landmarks
+        self.max_plans_per_tick = max_plans_per_tick
+        self.dispatcher = Dispatcher(self.grid_search, dispatch_method)
+        self.dispatch_interval = dispatch_interval  # Ticks between batched dispatch rounds
+
+        count = len(positions)
+        self.position = np.array([self.grid_search.to_index(position) for position in positions], dtype=np.int64)
+        self.state = np.zeros(count, dtype=np.int8)
+        self.job = np.full(count, -1, dtype=np.int32)
+        self.path_start = np.zeros(count, dtype=np.int64)
+        self.path_length = np.zeros(count, dtype=np.int64)
+        self.path_step = np.zeros(count, dtype=np.int64)
+
+        self.path_pool = np.empty(max(1024, count * 64), dtype=np.int64)
+        self.pool_used = 0
+
+        self.jobs = []          # (source, destination) per job id
+        self.pending = deque()  # job ids waiting for a courier
+        self.planning = deque() # (courier, goal, state) legs waiting for a route
+        self.delivered = 0
+        self.failed = 0
+        self.tick_count = 0
+
+        # Dispatch statistics
+        self.dispatch_needed = True
+        self.dispatch_tick = -dispatch_interval
+        self.last_dispatch = None
+        self.dispatch_time = 0.0
+        self.pickup_length = 0
+
+    def __len__(self):
+        return len(self.position)
+
+    def add_job(self, source, destination):
+        """Queue a pickup at source and a drop-off at destination; returns the job id"""
+        job = len(self.jobs)
+        self.jobs.append((tuple(source), tuple(destination)))
+        self.pending.append(job)
+        self.dispatch_needed = True
+        return job
+
+    def finished(self):
+        """True when every job has been delivered or dropped"""
+        return not self.pending and not self.planning and not (self.state != IDLE).any()
+
+    def positions(self):
+        """Current courier positions as an (N, 2) array of (y, x)"""
+        return np.stack(np.divmod(self.position, self.cols), axis=1)
+
+    def tick(self, steps=1):
+        """Advance moving couriers by steps pixels, then handle arrivals, dispatch and planning"""
+        self.tick_count += 1
+        moving = (self.state == TO_PICKUP) | (self.state == TO_DROPOFF)
+        if moving.any():
+            last = self.path_length - 1
+            self.path_step[moving] = np.minimum(self.path_step[moving] + steps, last[moving])
+            self.position[moving] = self.path_pool[self.path_start[moving] + self.path_step[moving]]
+
+        arrived = np.flatnonzero(moving & (self.path_step >= self.path_length - 1))
+        for courier in arrived.tolist():
+            if self.state[courier] == TO_DROPOFF:
+                self.release(courier)
+                self.delivered += 1
+            else:
+                # Picked up: queue the route on to the drop-off
+                _, destination = self.jobs[self.job[courier]]
+                self.state[courier] = WAITING
+                self.planning.append((courier, destination, TO_DROPOFF))
+
+        if self.dispatch_needed and self.tick_count - self.dispatch_tick >= self.dispatch_interval:
+            self.dispatch()
+
+        for _ in range(min(self.max_plans_per_tick, len(self.planning))):
+            courier, goal, state = self.planning.popleft()
+            if not self.send(courier, goal, state):
+                self.release(courier)
+                self.failed += 1
+
+    def release(self, courier):
+        """Return a courier to the idle pool"""
+        self.state[courier] = IDLE
+        self.job[courier] = -1
+        self.dispatch_needed = True
+
+    def dispatch(self):
+        """Match pending jobs to idle couriers by road distance to the pickup"""
+        self.dispatch_needed = False
+        self.dispatch_tick = self.tick_count
+        idle = np.flatnonzero(self.state == IDLE)
+        if not self.pending or not len(idle):
+            return
+
+        # Jobs nobody can ever reach are dropped instead of waiting forever
+        labels = self.grid_search.flat_labels
+        courier_components = set(labels[self.position].tolist())
+        jobs = []
+        for job in self.pending:
+            source, destination = self.jobs[job]
+            component = self.grid_search.component_of(source)
+            if component == 0 or component != self.grid_search.component_of(destination) \
+                    or component not in courier_components:
+                self.failed += 1
+            else:
+                jobs.append(job)
+
+        sources = [self.grid_search.to_index(self.jobs[job][0]) for job in jobs]
+        result = self.dispatcher.assign(self.position[idle], sources)
+        self.last_dispatch = result
+        self.dispatch_time += result["latency"]
+
+        assigned = set()
+        for courier_number, source_number, distance in result["pairs"]:
+            courier = int(idle[courier_number])
+            job = jobs[source_number]
+            assigned.add(job)
+            self.job[courier] = job
+            self.state[courier] = WAITING
+            self.planning.append((courier, self.jobs[job][0], TO_PICKUP))
+            self.pickup_length += distance
+
+        self.pending = deque(job for job in jobs if job not in assigned)
+
+    def send(self, courier, goal, state):
+        """Plan a route from the courier's position to goal and start following it"""
+        start = divmod(int(self.position[courier]), self.cols)
+        if start == tuple(goal):
+            path = []
+        else:
+            path = self.router.find_path(start, goal, self.mode, self.use_landmarks)
+            if not path:
+                return False
+
+        # Routes are stored with the starting pixel first so length >= 1
+        route = np.empty(len(path) + 1, dtype=np.int64)
+        route[0] = self.position[courier]
+        if path:
+            coordinates = np.asarray(path, dtype=np.int64)
+            route[1:] = coordinates[:, 0] * self.cols + coordinates[:, 1]
+
+        offset = self.reserve(len(route))
+        self.path_pool[offset:offset + len(route)] = route
+        self.path_start[courier] = offset
+        self.path_length[courier] = len(route)
+        self.path_step[courier] = 0
+        self.state[courier] = state
+        return True
+
+    def reserve(self, length):
+        """Return an offset in the path pool with room for length pixels"""
+        if self.pool_used + length > len(self.path_pool):
+            moving = np.flatnonzero((self.state == TO_PICKUP) | (self.state == TO_DROPOFF))
+            live = int(self.path_length[moving].sum())
+            capacity = len(self.path_pool)
+            while capacity < 2 * (live + length):
+                capacity *= 2
+
+            # Copy live routes to the front of a fresh pool, dropping finished ones
+            pool = np.empty(capacity, dtype=np.int64)
+            used = 0
+            for courier in moving.tolist():
+                start = self.path_start[courier]
+                size = self.path_length[courier]
+                pool[used:used + size] = self.path_pool[start:start + size]
+                self.path_start[courier] = used
+                used += size
+            self.path_pool = pool
+            self.pool_used = used
+
+        offset = self.pool_used
+        self.pool_used += length
+        return offset
@@ -0,0 +1,103 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+
+from grid_search import SearchCancelled
+from instrumentation import stats
+
+# Distance fields kept per router; each costs 4 bytes per map pixel
+FLOW_FIELD_CACHE = 8
+
+
+class FlowFields:
+    """Shared-destination routing by descending cached BFS distance fields
+
+    The first query to a goal runs one vectorised breadth-first wave from
+    it over the whole road component (GridSearch.distance_field); every
+    later query to the same goal just walks downhill from its start, in
+    O(path length). Fields are dropped whenever the road mask changes.
+    Paths are shortest in steps, so like A* they ignore terrain costs.
+    """
+
+    def __init__(self, grid_search, max_fields=FLOW_FIELD_CACHE):
+        self.grid_search = grid_search
+        self.max_fields = max_fields
+        self.fields = OrderedDict()  # goal flat index -> int32 distance field, least recently used first
+        self.fingerprint = grid_search.fingerprint
+        self.lock = threading.Lock()
+        self.expanded = 0   # Pixels the wave reached when the latest search built a field, else 0
+        self.open_peak = 0  # Widest wavefront of that build
+
+    def __len__(self):
+        return len(self.fields)
+
+    def field(self, target):
+        """Distance field to a flat target index, from the cache or a fresh wave; -1 off the road"""
+        grid_search = self.grid_search
+        with self.lock:
+            fingerprint = grid_search.fingerprint
+            if self.fingerprint != fingerprint:
+                self.fields.clear()
+                self.fingerprint = fingerprint
+            distance = self.fields.get(target)
+            if distance is not None:
+                self.fields.move_to_end(target)
+                return distance
+
+        distance = grid_search.distance_field([target])
+        reached = distance[distance >= 0]
+        self.expanded = len(reached)
+        self.open_peak = int(np.bincount(reached).max()) if stats.enabled else 0
+
+        # A field whose mask was edited during the wave is used once, never cached
+        with self.lock:
+            if self.fingerprint == fingerprint == grid_search.fingerprint:
+                self.fields[target] = distance
+                while len(self.fields) > self.max_fields:
+                    self.fields.popitem(last=False)
+        return distance
+
+    def search(self, start, goal, cancel=None):
+        """Return the (y, x) path from start (exclusive) to goal (inclusive), or []
+
+        cancel is checked once before a field is built; the wave itself
+        runs as a handful of numpy calls.
+        """
+        self.expanded = 0
+        self.open_peak = 0
+        grid_search = self.grid_search
+        if not grid_search.connected(start, goal):
+            return []
+        source = grid_search.to_index(start)
+        target = grid_search.to_index(goal)
+        if source == target:
+            return []
+        if target not in self.fields and cancel is not None and cancel.cancelled:
+            raise SearchCancelled()
+        return self.descend(self.field(target), source)
+
+    def descend(self, distance, source):
+        """Walk downhill from source to the field's zero, neighbours in the search order; [] if stuck"""
+        cols = self.grid_search.cols
+        size = self.grid_search.size
+        last_col = cols - 1
+        last_row_start = size - cols
+        field = memoryview(distance)
+        current = source
+        steps = field[current]
+        path = []
+        while steps > 0:
+            steps -= 1
+            cx = current % cols
+            if cx < last_col and field[current + 1] == steps:
+                current += 1
+            elif current < last_row_start and field[current + cols] == steps:
+                current += cols
+            elif cx > 0 and field[current - 1] == steps:
+                current -= 1
+            elif current >= cols and field[current - cols] == steps:
+                current -= cols
+            else:
+                return []
+            path.append(divmod(current, cols))
+        return path
@@ -0,0 +1,378 @@
+import hashlib
+import heapq
+import itertools
+import random
+import numpy as np
+
+from instrumentation import stats
+
+# Sentinel g-cost for pixels the search has not reached yet
+UNVISITED = np.iinfo(np.int32).max
+
+# Searches given a cancel token check it once per this many expansions
+CANCEL_INTERVAL = 4096
+
+# Process-wide stamps for masks edited without a refresh, so their
+# fingerprints never repeat even across GridSearch objects sharing a cache
+_edit_stamps = itertools.count(1)
+
+
+class SearchCancelled(Exception):
+    """Raised from inside a search whose cancel token was set"""
+
+
+def label_components(road_mask):
+    """Label 4-connected road components; returns (labels, sizes) with 0 as background"""
+    rows, cols = road_mask.shape
+    mask = np.ascontiguousarray(road_mask, dtype=bool)
+
+    # Horizontal runs of road pixels, in row-major order
+    padded = np.zeros((rows, cols + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    edges = np.diff(padded, axis=1)
+    run_rows, run_starts = np.nonzero(edges == 1)
+    run_ends = np.nonzero(edges == -1)[1]
+    run_count = len(run_starts)
+
+    labels = np.zeros(rows * cols, dtype=np.int32)
+    if run_count == 0:
+        return labels.reshape(rows, cols), np.zeros(1, dtype=np.int64)
+
+    # Stamp each pixel with the id of the run it belongs to
+    labels[mask.ravel()] = np.repeat(np.arange(run_count, dtype=np.int32), run_ends - run_starts)
+    run_image = labels.reshape(rows, cols)
+
+    # Runs touching vertically are in the same component; each contiguous
+    # stretch of contact is one (upper, lower) run pair, so keep its first pixel
+    touching = mask[:-1] & mask[1:]
+    contact = touching.copy()
+    contact[:, 1:] &= ~touching[:, :-1]
+    upper = run_image[:-1][contact].astype(np.int64)
+    lower = run_image[1:][contact].astype(np.int64)
+
+    parent = merge_labels(np.arange(run_count, dtype=np.int64), upper, lower)
+
+    # Compact component ids to 1..K
+    roots, run_component = np.unique(parent, return_inverse=True)
+    run_component = run_component.astype(np.int32) + 1
+    labels[mask.ravel()] = np.repeat(run_component, run_ends - run_starts)
+    sizes = np.bincount(labels, minlength=len(roots) + 1)
+    sizes[0] = 0
+    return labels.reshape(rows, cols), sizes
+
+
+def merge_labels(parent, first, second):
+    """Union each (first[i], second[i]) pair; returns parent with every label pointing at its root
+
+    Union by minimum label with pointer jumping until nothing changes.
+    """
+    while True:
+        root_first = parent[first]
+        root_second = parent[second]
+        merged = np.minimum(root_first, root_second)
+        previous = parent.copy()
+        np.minimum.at(parent, root_first, merged)
+        np.minimum.at(parent, root_second, merged)
+        while True:
+            jumped = parent[parent]
+            if np.array_equal(jumped, parent):
+                break
+            parent = jumped
+        if np.array_equal(parent, previous):
+            return parent
+
+
+class GridSearch:
+    """A* over a boolean road mask using flat arrays indexed by y*cols+x"""
+
+    def __init__(self, road_mask, components=None):
+        self.rows, self.cols = road_mask.shape
+        self.size = self.rows * self.cols
+        self.expanded = 0   # Pixels closed by the latest search
+        self.open_peak = 0  # Largest open list the latest search held, measured while stats are on
+
+        # One byte per pixel, shared by the search loop (indexing bytes is
+        # cheaper than numpy scalars) and a read-only 2D view for vector ops
+        self.passable = bytearray(np.ascontiguousarray(road_mask, dtype=bool).tobytes())
+        self.road_mask = np.frombuffer(self.passable, dtype=bool).reshape(self.rows, self.cols)
+        self.road_count = int(np.count_nonzero(self.road_mask))
+
+        # Identifies this road mask for caches that outlive the object
+        self.fingerprint = self.mask_fingerprint()
+
+        # Component labels use the same 4-connectivity as the search, so two
+        # pixels are reachable from each other iff their labels match.
+        # Callers that already hold (labels, sizes) can pass them in.
+        if components is None:
+            components = label_components(self.road_mask)
+        self.labels, self.component_sizes = components
+        self.flat_labels = self.labels.ravel()
+
+    def mask_fingerprint(self):
+        """SHA-1 of the current road mask and its shape"""
+        hasher = hashlib.sha1(self.passable)
+        hasher.update(f"{self.rows}x{self.cols}".encode())
+        return hasher.hexdigest()
+
+    def set_passable(self, indices, passable, refresh=True):
+        """Open or close flat pixel indices, then refresh counts, labels and the fingerprint
+
+        The edit goes into a copy that replaces the mask, so a search on
+        another thread keeps reading the mask it started with. With
+        refresh=False a burst of edits can share one refresh(); until then
+        labels and the road count are stale, and the fingerprint is the
+        last full one plus a fresh stamp, so caches still see every edit.
+        """
+        mask = bytearray(self.passable)
+        np.frombuffer(mask, dtype=bool)[indices] = passable
+        self.passable = mask
+        self.road_mask = np.frombuffer(mask, dtype=bool).reshape(self.rows, self.cols)
+        if refresh:
+            self.refresh()
+        else:
+            self.fingerprint = f"{self.fingerprint.partition('+')[0]}+{next(_edit_stamps)}"
+
+    def refresh(self):
+        """Recount, relabel and re-fingerprint the road mask after it changed"""
+        self.road_count = int(np.count_nonzero(self.road_mask))
+        self.labels, self.component_sizes = label_components(self.road_mask)
+        self.flat_labels = self.labels.ravel()
+        self.fingerprint = self.mask_fingerprint()
+
+    def to_index(self, position):
+        """Convert (y, x) to a flat index"""
+        return int(position[0]) * self.cols + int(position[1])
+
+    def to_position(self, index):
+        """Convert a flat index back to (y, x)"""
+        return divmod(index, self.cols)
+
+    def is_road(self, position):
+        """Check whether (y, x) lies on a passable pixel"""
+        y, x = int(position[0]), int(position[1])
+        if not (0 <= y < self.rows and 0 <= x < self.cols):
+            return False
+        return bool(self.passable[y * self.cols + x])
+
+    def roads_at(self, ys, xs):
+        """Vectorised is_road for arrays of in-bounds coordinates"""
+        return self.road_mask[ys, xs]
+
+    def component_of(self, position):
+        """Return the component label of (y, x), 0 when it is not road"""
+        if not self.is_road(position):
+            return 0
+        return int(self.flat_labels[self.to_index(position)])
+
+    def connected(self, start, goal):
+        """Check in O(1) whether a path exists between two pixels"""
+        component = self.component_of(start)
+        return component != 0 and component == self.component_of(goal)
+
+    def random_road_pixel(self, component=None):
+        """Return a uniformly random road pixel as (y, x), or None if there is none
+
+        When component is given, only pixels with that label are sampled.
+        """
+        count = self.road_count if component is None else int(self.component_sizes[component])
+        if not count:
+            return None
+
+        # Small components are sampled from their explicit pixel indices,
+        # anything else by rejection sampling on flat indices
+        if count * 64 < self.size:
+            if component is None:
+                indices = np.flatnonzero(self.road_mask)
+            else:
+                indices = np.flatnonzero(self.flat_labels == component)
+            return divmod(int(indices[random.randrange(count)]), self.cols)
+
+        passable = self.passable
+        flat_labels = self.flat_labels
+        size = self.size
+        while True:
+            index = random.randrange(size)
+            if passable[index] and (component is None or flat_labels[index] == component):
+                return divmod(index, self.cols)
+
+    def random_component(self, min_size=1):
+        """Return a random component label weighted by size, or None if none is big enough"""
+        sizes = self.component_sizes.astype(np.float64)
+        sizes[sizes < min_size] = 0
+        total = sizes.sum()
+        if total == 0:
+            return None
+        return int(np.searchsorted(np.cumsum(sizes), random.random() * total, side="right"))
+
+    def chebyshev_field(self, target):
+        """Return the Chebyshev distance from every pixel to a flat target index"""
+        goal_y, goal_x = divmod(target, self.cols)
+        dy = np.abs(np.arange(self.rows, dtype=np.int32) - goal_y)
+        dx = np.abs(np.arange(self.cols, dtype=np.int32) - goal_x)
+        return np.maximum(dy[:, None], dx[None, :]).ravel()
+
+    def distance_field(self, sources, targets=None, with_owner=False):
+        """Breadth-first road distance from a list of flat indices; -1 where unreachable
+
+        With targets, the wave stops as soon as every target is reached or
+        the wave dies out. With with_owner, also returns for each pixel the
+        position in sources of the seed that reached it first.
+        """
+        cols = self.cols
+        size = self.size
+        passable = self.road_mask.ravel()
+        distance = np.full(size, -1, dtype=np.int32)
+        owner = np.full(size, -1, dtype=np.int32) if with_owner else None
+        stamp = np.zeros(size, dtype=np.int64)
+
+        sources = np.asarray(sources, dtype=np.int64).ravel()
+        seeds = np.flatnonzero(passable[sources])
+        frontier = sources[seeds]
+        frontier_owner = seeds.astype(np.int32)
+        distance[frontier] = 0
+        if with_owner:
+            owner[frontier] = frontier_owner
+        if targets is not None:
+            targets = np.asarray(targets, dtype=np.int64).ravel()
+        level = 0
+
+        # Whole wavefronts are advanced per iteration instead of single pixels
+        while len(frontier):
+            if targets is not None and (distance[targets] >= 0).all():
+                break
+            level += 1
+            x = frontier % cols
+            moves = (
+                (x < cols - 1, 1),
+                (frontier < size - cols, cols),
+                (x > 0, -1),
+                (frontier >= cols, -cols),
+            )
+            candidates = np.concatenate([frontier[valid] + step for valid, step in moves])
+            keep = passable[candidates] & (distance[candidates] < 0)
+            candidates = candidates[keep]
+
+            # Drop duplicates in O(n): exactly one write per pixel survives in stamp
+            order = np.arange(len(candidates))
+            stamp[candidates] = order
+            unique = stamp[candidates] == order
+            frontier = candidates[unique]
+            distance[frontier] = level
+            if with_owner:
+                candidate_owner = np.concatenate([frontier_owner[valid] for valid, _ in moves])
+                frontier_owner = candidate_owner[keep][unique]
+                owner[frontier] = frontier_owner
+
+        if with_owner:
+            return distance, owner
+        return distance
+
+    def search(self, start, goal, landmarks=None, cancel=None):
+        """Return the (y, x) path from start (exclusive) to goal (inclusive), or []
+
+        Pass a LandmarkTable as landmarks to tighten the Chebyshev heuristic
+        with ALT lower bounds. A cancel token (anything with a cancelled
+        attribute) is polled while searching and raises SearchCancelled.
+        """
+        self.expanded = 0
+        self.open_peak = 0
+        if not (self.is_road(start) and self.is_road(goal)):
+            return []
+
+        source = self.to_index(start)
+        target = self.to_index(goal)
+        if source == target or self.flat_labels[source] != self.flat_labels[target]:
+            return []
+
+        cols = self.cols
+        size = self.size
+        last_col = cols - 1
+        last_row_start = size - cols
+        passable = self.passable
+
+        heuristic = self.chebyshev_field(target)
+        if landmarks is not None:
+            heuristic = landmarks.heuristic_field(target, heuristic)
+        h = memoryview(heuristic)
+
+        # Per-search state - heap keys pack (f, index) so ties break on (y, x).
+        # A cheaper route to a queued pixel pushes it again and the stale
+        # entry is skipped when popped, so the first pop of target is optimal
+        g_array = np.full(size, UNVISITED, dtype=np.int32)
+        parent_array = np.full(size, -1, dtype=np.int32)
+        g_score = memoryview(g_array)
+        came_from = memoryview(parent_array)
+        closed = bytearray(size)
+
+        open_set = [h[source] * size + source]
+        g_score[source] = 0
+        expanded = 0
+        open_peak = 0
+        track_peak = stats.enabled  # The open-list peak is only measured for the stats panel
+
+        heappop = heapq.heappop
+        heappush = heapq.heappush
+
+        while open_set:
+            if track_peak and len(open_set) > open_peak:
+                open_peak = len(open_set)
+            current = heappop(open_set) % size
+            if closed[current]:
+                continue
+            closed[current] = 1
+
+            if current == target:
+                self.expanded = expanded
+                self.open_peak = open_peak
+                return self.reconstruct_path(came_from, source, target)
+
+            expanded += 1
+            if cancel is not None and not expanded % CANCEL_INTERVAL and cancel.cancelled:
+                raise SearchCancelled()
+
+            cx = current % cols
+            tentative_g = g_score[current] + 1
+
+            # Neighbors in the same order as before (right, down, left, up)
+            if cx < last_col:
+                neighbor = current + 1
+                if passable[neighbor] and tentative_g < g_score[neighbor]:
+                    came_from[neighbor] = current
+                    g_score[neighbor] = tentative_g
+                    heappush(open_set, (tentative_g + h[neighbor]) * size + neighbor)
+
+            if current < last_row_start:
+                neighbor = current + cols
+                if passable[neighbor] and tentative_g < g_score[neighbor]:
+                    came_from[neighbor] = current
+                    g_score[neighbor] = tentative_g
+                    heappush(open_set, (tentative_g + h[neighbor]) * size + neighbor)
+
+            if cx > 0:
+                neighbor = current - 1
+                if passable[neighbor] and tentative_g < g_score[neighbor]:
+                    came_from[neighbor] = current
+                    g_score[neighbor] = tentative_g
+                    heappush(open_set, (tentative_g + h[neighbor]) * size + neighbor)
+
+            if current >= cols:
+                neighbor = current - cols
+                if passable[neighbor] and tentative_g < g_score[neighbor]:
+                    came_from[neighbor] = current
+                    g_score[neighbor] = tentative_g
+                    heappush(open_set, (tentative_g + h[neighbor]) * size + neighbor)
+
+        self.expanded = expanded
+        self.open_peak = open_peak
+        return []
+
+    def reconstruct_path(self, came_from, source, target):
+        """Walk the parent array back from target and return the (y, x) path"""
+        cols = self.cols
+        path = []
+        current = target
+        while current != source:
+            path.append(divmod(current, cols))
+            current = came_from[current]
+        path.reverse()
+        return path
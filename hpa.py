@@ -0,0 +1,349 @@
+import heapq
+import threading
+import numpy as np
+
+from grid_search import UNVISITED
+from instrumentation import stats
+
+CLUSTER_SIZE = 32
+ENTRANCE_WIDTH = 6  # Border openings wider than this get an entrance at each end
+
+
+def window_distances(windows, seeds):
+    """BFS distances inside many small windows at once
+
+    windows is an (N, h, w) boolean stack and seeds an (N, 2) array of
+    (y, x) starts, one per window. Returns (N, h, w) int32 distances with
+    -1 where a window's wave never reached.
+    """
+    count = len(windows)
+    distance = np.full(windows.shape, -1, dtype=np.int32)
+    frontier = np.zeros(windows.shape, dtype=bool)
+    frontier[np.arange(count), seeds[:, 0], seeds[:, 1]] = True
+    frontier &= windows
+    distance[frontier] = 0
+    reached = frontier.copy()
+    level = 0
+
+    while frontier.any():
+        level += 1
+        grown = np.zeros_like(frontier)
+        grown[:, :, 1:] |= frontier[:, :, :-1]
+        grown[:, :, :-1] |= frontier[:, :, 1:]
+        grown[:, 1:, :] |= frontier[:, :-1, :]
+        grown[:, :-1, :] |= frontier[:, 1:, :]
+        frontier = grown & windows & ~reached
+        reached |= frontier
+        distance[frontier] = level
+    return distance
+
+
+class ClusterGraph:
+    """HPA* abstraction: square clusters joined by entrances on their shared borders
+
+    Entrances and the road distances between entrances of the same cluster
+    are computed when the graph is built. A query searches this small graph
+    first and then refines each hop with the pixel-level search. Closures
+    mark clusters dirty from the GUI thread while queries rebuild on
+    planning threads, so dirty is swapped under lock and rebuilding and
+    routing over the abstract graph take build_lock.
+    """
+
+    def __init__(self, grid_search, cluster_size=CLUSTER_SIZE):
+        self.grid_search = grid_search
+        self.cluster_size = cluster_size
+        self.expanded = 0   # Abstract nodes, or pixels on fallback, closed by the latest search
+        self.open_peak = 0  # Largest open list of that search
+        self.cluster_rows = -(-grid_search.rows // cluster_size)
+        self.cluster_cols = -(-grid_search.cols // cluster_size)
+
+        self.borders = {}   # (cluster, cluster) -> [(pixel, pixel)] crossing that border
+        self.crossings = {} # pixel -> pixels across a border, each one step away
+        self.entrances = {} # cluster -> entrance pixels inside it
+        self.intra = {}     # cluster -> {pixel: [(pixel, distance)]}
+
+        # Every cluster starts dirty, so the first rebuild builds everything
+        self.dirty = set(range(self.cluster_rows * self.cluster_cols))
+        self.lock = threading.Lock()
+        self.build_lock = threading.Lock()
+        self.rebuild()
+
+    def cluster_of(self, index):
+        """Cluster number holding a flat pixel index"""
+        y, x = divmod(index, self.grid_search.cols)
+        return (y // self.cluster_size) * self.cluster_cols + x // self.cluster_size
+
+    def cluster_bounds(self, cluster):
+        """(top, left, bottom, right) pixel bounds of a cluster, bottom/right exclusive"""
+        cluster_y, cluster_x = divmod(cluster, self.cluster_cols)
+        top = cluster_y * self.cluster_size
+        left = cluster_x * self.cluster_size
+        return (
+            top, left,
+            min(top + self.cluster_size, self.grid_search.rows),
+            min(left + self.cluster_size, self.grid_search.cols),
+        )
+
+    def neighbours(self, cluster):
+        """Clusters sharing a border with cluster"""
+        cluster_y, cluster_x = divmod(cluster, self.cluster_cols)
+        result = []
+        if cluster_x + 1 < self.cluster_cols:
+            result.append(cluster + 1)
+        if cluster_y + 1 < self.cluster_rows:
+            result.append(cluster + self.cluster_cols)
+        if cluster_x > 0:
+            result.append(cluster - 1)
+        if cluster_y > 0:
+            result.append(cluster - self.cluster_cols)
+        return result
+
+    def invalidate(self, top, left, bottom, right):
+        """Mark clusters overlapping a changed pixel rectangle for rebuilding on the next query"""
+        size = self.cluster_size
+        clusters = [
+            cluster_y * self.cluster_cols + cluster_x
+            for cluster_y in range(max(0, top // size), min(self.cluster_rows, (bottom - 1) // size + 1))
+            for cluster_x in range(max(0, left // size), min(self.cluster_cols, (right - 1) // size + 1))
+        ]
+        with self.lock:
+            self.dirty.update(clusters)
+
+    def rebuild(self):
+        """Recompute entrances on dirty clusters' borders and intra distances around them"""
+        with self.lock:
+            dirty, self.dirty = self.dirty, set()
+        if not dirty:
+            return
+
+        pairs = set()
+        for cluster in dirty:
+            for neighbour in self.neighbours(cluster):
+                pairs.add((min(cluster, neighbour), max(cluster, neighbour)))
+
+        # A corner pixel can cross two borders, so only this border's links are dropped
+        for pair in pairs:
+            for pixel, other in self.borders.pop(pair, []):
+                for here, there in ((pixel, other), (other, pixel)):
+                    self.crossings[here].remove(there)
+                    if not self.crossings[here]:
+                        del self.crossings[here]
+        for pair in pairs:
+            self.borders[pair] = self.find_entrances(*pair)
+            for pixel, other in self.borders[pair]:
+                self.crossings.setdefault(pixel, []).append(other)
+                self.crossings.setdefault(other, []).append(pixel)
+
+        # A border change moves entrances on both sides, so neighbours are redone too
+        affected = set(dirty)
+        for first, second in pairs:
+            affected.update((first, second))
+        for cluster in affected:
+            entrances = set()
+            for neighbour in self.neighbours(cluster):
+                for crossing in self.borders.get((min(cluster, neighbour), max(cluster, neighbour)), []):
+                    entrances.update(pixel for pixel in crossing if self.cluster_of(pixel) == cluster)
+            self.entrances[cluster] = sorted(entrances)
+        self.build_intra(sorted(affected))
+
+    def find_entrances(self, first, second):
+        """Entrance pixel pairs on the border between two neighbouring clusters"""
+        mask = self.grid_search.road_mask
+        top, left, bottom, right = self.cluster_bounds(first)
+        cols = self.grid_search.cols
+        # Same cluster row means side by side; a single cluster column makes
+        # vertical neighbours differ by one as well
+        if first // self.cluster_cols == second // self.cluster_cols:
+            inside = mask[top:bottom, right - 1]
+            outside = mask[top:bottom, right]
+            positions = [(y * cols + right - 1, y * cols + right) for y in range(top, bottom)]
+        else:
+            inside = mask[bottom - 1, left:right]
+            outside = mask[bottom, left:right]
+            positions = [((bottom - 1) * cols + x, bottom * cols + x) for x in range(left, right)]
+
+        # Each run of open border pixels becomes one or two entrances
+        open_border = np.concatenate([[False], inside & outside, [False]])
+        edges = np.diff(open_border.astype(np.int8))
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1)
+        entrances = []
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            if end - start > ENTRANCE_WIDTH:
+                entrances += [positions[start], positions[end - 1]]
+            else:
+                entrances.append(positions[(start + end - 1) // 2])
+        return entrances
+
+    def build_intra(self, clusters):
+        """Road distances between entrances of each cluster, one batched wave per entrance"""
+        windows, seeds, owners = [], [], []
+        for cluster in clusters:
+            self.intra[cluster] = {pixel: [] for pixel in self.entrances[cluster]}
+            for pixel in self.entrances[cluster]:
+                owners.append((cluster, pixel))
+        if not owners:
+            return
+
+        for cluster, pixel in owners:
+            window, seed = self.window(cluster, pixel)
+            windows.append(window)
+            seeds.append(seed)
+        distance = window_distances(np.stack(windows), np.array(seeds))
+
+        for number, (cluster, pixel) in enumerate(owners):
+            top, left, _, _ = self.cluster_bounds(cluster)
+            for other in self.entrances[cluster]:
+                if other == pixel:
+                    continue
+                y, x = divmod(other, self.grid_search.cols)
+                steps = int(distance[number, y - top, x - left])
+                if steps >= 0:
+                    self.intra[cluster][pixel].append((other, steps))
+
+    def window(self, cluster, pixel):
+        """Cluster mask padded to the full cluster size, and pixel's (y, x) inside it"""
+        top, left, bottom, right = self.cluster_bounds(cluster)
+        window = np.zeros((self.cluster_size, self.cluster_size), dtype=bool)
+        window[:bottom - top, :right - left] = self.grid_search.road_mask[top:bottom, left:right]
+        y, x = divmod(pixel, self.grid_search.cols)
+        return window, (y - top, x - left)
+
+    def local_distances(self, pixel):
+        """Distances from pixel to each entrance of its own cluster"""
+        cluster = self.cluster_of(pixel)
+        window, seed = self.window(cluster, pixel)
+        distance = window_distances(window[None], np.array([seed]))[0]
+        top, left, _, _ = self.cluster_bounds(cluster)
+        result = []
+        for entrance in self.entrances[cluster]:
+            y, x = divmod(entrance, self.grid_search.cols)
+            steps = int(distance[y - top, x - left])
+            if steps >= 0:
+                result.append((entrance, steps))
+        return result
+
+    def search(self, start, goal, cancel=None):
+        """Return the (y, x) path from start (exclusive) to goal (inclusive), or []
+
+        Nearby endpoints, and any query the abstract graph cannot answer,
+        use the pixel-level search directly; cancel is passed on to it.
+        """
+        self.expanded = 0
+        self.open_peak = 0
+        grid_search = self.grid_search
+        if not grid_search.connected(start, goal):
+            return []
+
+        source = grid_search.to_index(start)
+        target = grid_search.to_index(goal)
+        start_cluster = self.cluster_of(source)
+        goal_cluster = self.cluster_of(target)
+        path = None
+        if start_cluster != goal_cluster and goal_cluster not in self.neighbours(start_cluster):
+            with self.build_lock:
+                self.rebuild()
+                route = self.abstract_route(source, target)
+                if route is not None:
+                    path = self.refine(route)
+        if path is None:
+            path = grid_search.search(start, goal, cancel=cancel)
+            self.expanded = grid_search.expanded
+            self.open_peak = grid_search.open_peak
+        return path
+
+    def refine(self, route):
+        """Expand an abstract route to pixels
+
+        Every hop that is not a border crossing stays inside one cluster, so
+        all of them are refined with a single batched wave from the hop ends
+        and a walk down each distance field.
+        """
+        cols = self.grid_search.cols
+        hops = [
+            (previous, current) for previous, current in zip(route, route[1:])
+            if current not in self.crossings.get(previous, ())
+        ]
+        fields = {}
+        if hops:
+            windows, seeds = [], []
+            for _, current in hops:
+                window, seed = self.window(self.cluster_of(current), current)
+                windows.append(window)
+                seeds.append(seed)
+            distance = window_distances(np.stack(windows), np.array(seeds))
+            fields = {hop: distance[number] for number, hop in enumerate(hops)}
+
+        path = []
+        for previous, current in zip(route, route[1:]):
+            if (previous, current) not in fields:
+                path.append(divmod(current, cols))
+                continue
+            field = fields[(previous, current)]
+            top, left, _, _ = self.cluster_bounds(self.cluster_of(current))
+            y, x = divmod(previous, cols)
+            y -= top
+            x -= left
+            steps = field[y, x]
+            while steps > 0:
+                # Step to any neighbour one closer, in the search's neighbour order
+                for ny, nx in ((y, x + 1), (y + 1, x), (y, x - 1), (y - 1, x)):
+                    if 0 <= ny < self.cluster_size and 0 <= nx < self.cluster_size and field[ny, nx] == steps - 1:
+                        y, x = ny, nx
+                        break
+                steps -= 1
+                path.append((y + top, x + left))
+        return path
+
+    def abstract_route(self, source, target):
+        """A* over entrances with source and goal linked into their clusters; None if no route"""
+        cols = self.grid_search.cols
+        size = self.grid_search.size
+        goal_y, goal_x = divmod(target, cols)
+        to_goal = {entrance: steps for entrance, steps in self.local_distances(target)}
+        goal_cluster = self.cluster_of(target)
+
+        def heuristic(index):
+            y, x = divmod(index, cols)
+            return abs(y - goal_y) + abs(x - goal_x)
+
+        g_score = {source: 0}
+        came_from = {}
+        closed = set()
+        open_set = [heuristic(source) * size + source]
+        open_peak = 0
+        track_peak = stats.enabled
+
+        while open_set:
+            if track_peak and len(open_set) > open_peak:
+                open_peak = len(open_set)
+            current = heapq.heappop(open_set) % size
+            if current in closed:
+                continue
+            if current == target:
+                self.expanded = len(closed)
+                self.open_peak = open_peak
+                route = [target]
+                while route[-1] != source:
+                    route.append(came_from[route[-1]])
+                route.reverse()
+                return route
+            closed.add(current)
+
+            # A source that is itself an entrance also crosses its own border
+            if current == source:
+                edges = self.local_distances(source)
+            else:
+                edges = self.intra[self.cluster_of(current)][current]
+            edges = edges + [(other, 1) for other in self.crossings.get(current, ())]
+            if self.cluster_of(current) == goal_cluster and current in to_goal:
+                edges = edges + [(target, to_goal[current])]
+
+            for neighbour, cost in edges:
+                tentative_g = g_score[current] + cost
+                if tentative_g < g_score.get(neighbour, UNVISITED):
+                    g_score[neighbour] = tentative_g
+                    came_from[neighbour] = current
+                    heapq.heappush(open_set, (tentative_g + heuristic(neighbour)) * size + neighbour)
+
+        return None
@@ -0,0 +1,135 @@
+import json
+import threading
+import time
+from collections import deque
+
+EVENT_HISTORY = 4096  # Events buffered for dump(); older ones are dropped
+
+
+class Timer:
+    """Context manager recording its block's wall time under a name"""
+
+    def __init__(self, stats, name, fields):
+        self.stats = stats
+        self.name = name
+        self.fields = fields
+        self.started = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, kind, value, traceback):
+        if kind is None:
+            self.stats.record(self.name, time.perf_counter() - self.started, **self.fields)
+        return False
+
+
+class NullTimer:
+    """Shared stand-in for Timer while instrumentation is off"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, kind, value, traceback):
+        return False
+
+
+NULL_TIMER = NullTimer()
+
+
+class Instrumentation:
+    """Counters and timers around the simulator's hot paths
+
+    Every entry point returns straight away while enabled is false, so
+    call sites stay in place at the cost of an attribute check. Records
+    are aggregated per name (count, total, max, last fields) and buffered
+    as events for dump(). Searches run on planning threads, so updates
+    take a lock; search processes keep their own, disabled, instance.
+    """
+
+    def __init__(self, enabled=False, history=EVENT_HISTORY):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.timers = {}  # name -> [count, total seconds, max seconds, last fields]
+        self.events = deque(maxlen=history)
+
+    def count(self, name, amount=1):
+        """Add amount to a counter"""
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def timer(self, name, **fields):
+        """Context manager that records the block's duration with fields"""
+        if not self.enabled:
+            return NULL_TIMER
+        return Timer(self, name, fields)
+
+    def record(self, name, seconds, event=True, **fields):
+        """Record one timed occurrence; event=False only updates the aggregate"""
+        if not self.enabled:
+            return
+        with self.lock:
+            timer = self.timers.get(name)
+            if timer is None:
+                timer = self.timers[name] = [0, 0.0, 0.0, fields]
+            timer[0] += 1
+            timer[1] += seconds
+            timer[2] = max(timer[2], seconds)
+            timer[3] = fields
+            if event:
+                self.events.append({"time": time.time(), "name": name, "ms": round(seconds * 1000, 3), **fields})
+
+    def reset(self):
+        """Forget every counter, timer and buffered event"""
+        with self.lock:
+            self.counters = {}
+            self.timers = {}
+            self.events.clear()
+
+    def snapshot(self):
+        """Counters and per-name timer summaries as a JSON-ready dict"""
+        with self.lock:
+            timers = {
+                name: {
+                    "count": count,
+                    "total_ms": round(total * 1000, 3),
+                    "mean_ms": round(total * 1000 / count, 3),
+                    "max_ms": round(peak * 1000, 3),
+                    "last": dict(fields),
+                }
+                for name, (count, total, peak, fields) in self.timers.items()
+            }
+            return {"time": time.time(), "counters": dict(self.counters), "timers": timers}
+
+    def dump(self, path):
+        """Append buffered events and then a snapshot to a JSON lines file; returns lines written"""
+        with self.lock:
+            events = list(self.events)
+            self.events.clear()
+        snapshot = self.snapshot()
+        with open(path, "a") as log:
+            for event in events:
+                log.write(json.dumps(event) + "\n")
+            log.write(json.dumps({"name": "snapshot", **snapshot}) + "\n")
+        return len(events) + 1
+
+    def summary_lines(self):
+        """One text line per timer, then the counters, for the stats panel"""
+        snapshot = self.snapshot()
+        lines = []
+        for name, timer in sorted(snapshot["timers"].items()):
+            line = f"{name}: {timer['count']}x, avg {timer['mean_ms']:.2f} ms, max {timer['max_ms']:.2f} ms"
+            if timer["last"]:
+                line += " | last " + ", ".join(f"{key} {value}" for key, value in timer["last"].items())
+            lines.append(line)
+        if snapshot["counters"]:
+            lines.append(", ".join(f"{name}: {value}" for name, value in sorted(snapshot["counters"].items())))
+        return lines
+
+
+# Shared by the router, the GUI and anything else that wants to report
+stats = Instrumentation()
@@ -0,0 +1,223 @@
+import heapq
+import numpy as np
+
+from grid_search import CANCEL_INTERVAL, UNVISITED, SearchCancelled
+from instrumentation import stats
+
+# Jump directions as (dy, dx)
+RIGHT = (0, 1)
+DOWN = (1, 0)
+LEFT = (0, -1)
+UP = (-1, 0)
+
+
+def scan_next(marks, axis, reverse=False):
+    """For every cell, the nearest index at or after it along axis where marks is True
+
+    With reverse, the nearest index at or before it. Missing hits give the
+    length of the axis (or -1 when reversed).
+    """
+    length = marks.shape[axis]
+    shape = [1, 1]
+    shape[axis] = length
+    positions = np.arange(length, dtype=np.int32).reshape(shape)
+    if reverse:
+        return np.maximum.accumulate(np.where(marks, positions, -1), axis=axis)
+    flipped = np.flip(np.where(marks, positions, length), axis=axis)
+    return np.flip(np.minimum.accumulate(flipped, axis=axis), axis=axis)
+
+
+class JumpPointSearch:
+    """Jump Point Search for the 4-connected uniform-cost road grid
+
+    Canonical paths move vertically and branch sideways, so a vertical jump
+    stops where a horizontal scan would find something, and a horizontal
+    jump stops only at the goal or a forced turn past a corner. Run ends,
+    forced turns and side hits are precomputed as row/column scans of the
+    road mask, which makes every jump a few array lookups.
+    """
+
+    def __init__(self, grid_search):
+        self.grid_search = grid_search
+        self.expanded = 0   # Jump points closed by the latest search
+        self.open_peak = 0  # Largest open list the latest search held
+        mask = np.asarray(grid_search.road_mask, dtype=bool)
+        rows, cols = mask.shape
+        padded = np.zeros((rows + 2, cols + 2), dtype=bool)
+        padded[1:-1, 1:-1] = mask
+        center = padded[1:-1, 1:-1]
+        up = padded[:-2, 1:-1]
+        down = padded[2:, 1:-1]
+        up_left = padded[:-2, :-2]
+        up_right = padded[:-2, 2:]
+        down_left = padded[2:, :-2]
+        down_right = padded[2:, 2:]
+
+        # Last road cell of each run in every direction
+        blocked = ~mask
+        self.end_right = scan_next(blocked, 1) - 1
+        self.end_left = scan_next(blocked, 1, reverse=True) + 1
+        self.end_down = scan_next(blocked, 0) - 1
+        self.end_up = scan_next(blocked, 0, reverse=True) + 1
+
+        # Moving right (left) a cell is forced when a vertical neighbour opens
+        # up just past a wall, so the turn cannot be taken one cell earlier
+        self.forced_up_right = center & up & ~up_left
+        self.forced_down_right = center & down & ~down_left
+        self.forced_up_left = center & up & ~up_right
+        self.forced_down_left = center & down & ~down_right
+        self.next_forced_right = scan_next(self.forced_up_right | self.forced_down_right, 1)
+        self.next_forced_left = scan_next(self.forced_up_left | self.forced_down_left, 1, reverse=True)
+
+        # Cells whose horizontal scan reaches a forced turn inside its run
+        side = np.zeros_like(mask)
+        side[:, :-1] |= mask[:, 1:] & (self.next_forced_right[:, 1:] <= self.end_right[:, 1:])
+        side[:, 1:] |= mask[:, :-1] & (self.next_forced_left[:, :-1] >= self.end_left[:, :-1])
+        self.next_side_down = scan_next(side, 0)
+        self.next_side_up = scan_next(side, 0, reverse=True)
+
+        self.mask = mask
+        self.rows = rows
+        self.cols = cols
+
+    def jump(self, y, x, direction, goal):
+        """Return the next jump point from (y, x) in direction, or None"""
+        dy, dx = direction
+        goal_y, goal_x = goal
+        mask = self.mask
+        if dx:
+            nx = x + dx
+            if not (0 <= nx < self.cols and mask[y, nx]):
+                return None
+            if dx > 0:
+                end = self.end_right[y, nx]
+                forced = self.next_forced_right[y, nx]
+                hit = forced if forced <= end else None
+                if goal_y == y and nx <= goal_x <= end and (hit is None or goal_x < hit):
+                    hit = goal_x
+            else:
+                end = self.end_left[y, nx]
+                forced = self.next_forced_left[y, nx]
+                hit = forced if forced >= end else None
+                if goal_y == y and end <= goal_x <= nx and (hit is None or goal_x > hit):
+                    hit = goal_x
+            return None if hit is None else (y, int(hit))
+
+        ny = y + dy
+        if not (0 <= ny < self.rows and mask[ny, x]):
+            return None
+        if dy > 0:
+            end = self.end_down[ny, x]
+            side = self.next_side_down[ny, x]
+            hit = side if side <= end else None
+            goal_hit = ny <= goal_y <= end and (hit is None or goal_y < hit)
+        else:
+            end = self.end_up[ny, x]
+            side = self.next_side_up[ny, x]
+            hit = side if side >= end else None
+            goal_hit = end <= goal_y <= ny and (hit is None or goal_y > hit)
+
+        # The goal's row is a jump point when its run leads straight to the goal
+        if goal_hit and self.end_left[goal_y, x] <= goal_x <= self.end_right[goal_y, x]:
+            hit = goal_y
+        return None if hit is None else (int(hit), x)
+
+    def successors(self, y, x, direction):
+        """Directions worth jumping in from a jump point reached moving in direction"""
+        if direction is None:
+            return (RIGHT, DOWN, LEFT, UP)
+        dy, dx = direction
+        if dy:
+            return (direction, RIGHT, LEFT)
+
+        result = [direction]
+        if dx > 0:
+            if self.forced_up_right[y, x]:
+                result.append(UP)
+            if self.forced_down_right[y, x]:
+                result.append(DOWN)
+        else:
+            if self.forced_up_left[y, x]:
+                result.append(UP)
+            if self.forced_down_left[y, x]:
+                result.append(DOWN)
+        return result
+
+    def search(self, start, goal, cancel=None):
+        """Return the (y, x) path from start (exclusive) to goal (inclusive), or []"""
+        self.expanded = 0
+        self.open_peak = 0
+        grid_search = self.grid_search
+        if not grid_search.connected(start, goal):
+            return []
+        start = (int(start[0]), int(start[1]))
+        goal = (int(goal[0]), int(goal[1]))
+        if start == goal:
+            return []
+
+        cols = self.cols
+        size = grid_search.size
+        goal_y, goal_x = goal
+        source = start[0] * cols + start[1]
+        target = goal_y * cols + goal_x
+
+        g_score = {source: 0}
+        came_from = {}
+        arrived = {source: None}
+        closed = set()
+        open_set = [(abs(start[0] - goal_y) + abs(start[1] - goal_x)) * size + source]
+        open_peak = 0
+        track_peak = stats.enabled
+
+        while open_set:
+            if track_peak and len(open_set) > open_peak:
+                open_peak = len(open_set)
+            current = heapq.heappop(open_set) % size
+            if current in closed:
+                continue
+            if current == target:
+                self.expanded = len(closed)
+                self.open_peak = open_peak
+                return self.expand(came_from, source, target)
+            closed.add(current)
+            if cancel is not None and not len(closed) % CANCEL_INTERVAL and cancel.cancelled:
+                raise SearchCancelled()
+
+            y, x = divmod(current, cols)
+            for direction in self.successors(y, x, arrived[current]):
+                point = self.jump(y, x, direction, goal)
+                if point is None:
+                    continue
+                jump_y, jump_x = point
+                neighbor = jump_y * cols + jump_x
+                tentative_g = g_score[current] + abs(jump_y - y) + abs(jump_x - x)
+                if tentative_g < g_score.get(neighbor, UNVISITED):
+                    g_score[neighbor] = tentative_g
+                    came_from[neighbor] = current
+                    arrived[neighbor] = direction
+                    f_score = tentative_g + abs(jump_y - goal_y) + abs(jump_x - goal_x)
+                    heapq.heappush(open_set, f_score * size + neighbor)
+
+        self.expanded = len(closed)
+        self.open_peak = open_peak
+        return []
+
+    def expand(self, came_from, source, target):
+        """Fill the straight runs between jump points back into a contiguous pixel path"""
+        cols = self.cols
+        points = [target]
+        while points[-1] != source:
+            points.append(came_from[points[-1]])
+        points.reverse()
+
+        path = []
+        for previous, current in zip(points, points[1:]):
+            y, x = divmod(previous, cols)
+            end_y, end_x = divmod(current, cols)
+            if y == end_y:
+                step = 1 if end_x > x else -1
+                path += [(y, column) for column in range(x + step, end_x + step, step)]
+            else:
+                step = 1 if end_y > y else -1
+                path += [(row, x) for row in range(y + step, end_y + step, step)]
+        return path
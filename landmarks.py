@@ -0,0 +1,118 @@
+import numpy as np
+
+# Bump when the on-disk layout changes so stale caches are rebuilt
+CACHE_VERSION = 1
+
+
+class LandmarkTable:
+    """Road distances from a few landmark pixels, used for the ALT heuristic"""
+
+    def __init__(self, landmarks, distances, mask_digest):
+        self.landmarks = np.asarray(landmarks, dtype=np.int64)
+        self.distances = distances
+        self.mask_digest = mask_digest
+        self.unreachable = np.iinfo(distances.dtype).max
+
+    @staticmethod
+    def cache_path(image_path):
+        """Landmark cache file stored next to the map image"""
+        return f"{image_path}.landmarks.npz"
+
+    @classmethod
+    def build(cls, grid_search, count=8, min_fraction=0.05):
+        """Pick landmarks by farthest-point selection and BFS from each one
+
+        Only components holding at least min_fraction of the road get
+        landmarks; searches inside smaller ones fall back to Chebyshev.
+        """
+        # The largest component always qualifies, however fragmented the map
+        sizes = grid_search.component_sizes
+        threshold = max(1, min(sizes.max(), grid_search.road_count * min_fraction))
+        eligible_components = np.flatnonzero(sizes >= threshold)
+        eligible = np.isin(grid_search.flat_labels, eligible_components)
+
+        # Pixels not yet reached by any landmark score highest, so every
+        # eligible component is seeded before any gets a second landmark
+        score = np.where(eligible, np.iinfo(np.int64).max, -1)
+        landmarks = []
+        fields = []
+
+        for _ in range(count):
+            candidate = int(np.argmax(score))
+            if score[candidate] <= 0:
+                break
+            field = grid_search.distance_field([candidate])
+            reached = field >= 0
+            score[reached] = np.minimum(score[reached], field[reached])
+            landmarks.append(candidate)
+            fields.append(field)
+
+        max_distance = max((int(field.max()) for field in fields), default=0)
+        dtype = np.uint16 if max_distance < np.iinfo(np.uint16).max else np.uint32
+        distances = np.full((len(fields), grid_search.size), np.iinfo(dtype).max, dtype=dtype)
+        for row, field in zip(distances, fields):
+            reached = field >= 0
+            row[reached] = field[reached]
+
+        return cls(landmarks, distances, grid_search.fingerprint)
+
+    @classmethod
+    def load(cls, path, grid_search):
+        """Load cached tables, or return None if missing or built for another mask"""
+        try:
+            with np.load(path) as data:
+                if int(data["version"]) != CACHE_VERSION:
+                    return None
+                mask_digest = str(data["mask_digest"])
+                if mask_digest != grid_search.fingerprint:
+                    return None
+                return cls(data["landmarks"], data["distances"], mask_digest)
+        except (OSError, KeyError, ValueError):
+            return None
+
+    @classmethod
+    def load_or_build(cls, image_path, grid_search, count=8):
+        """Reuse the cache next to image_path when valid, otherwise build and save it"""
+        path = cls.cache_path(image_path)
+        table = cls.load(path, grid_search)
+        if table is None:
+            table = cls.build(grid_search, count)
+            table.save(path)
+        return table
+
+    def save(self, path):
+        """Write the tables to disk; a read-only location just skips caching"""
+        try:
+            with open(path, "wb") as cache_file:
+                np.savez(
+                    cache_file,
+                    version=CACHE_VERSION,
+                    mask_digest=self.mask_digest,
+                    landmarks=self.landmarks,
+                    distances=self.distances,
+                )
+        except OSError:
+            pass
+
+    def lower_bound(self, source, target):
+        """ALT lower bound on the road distance between two flat indices"""
+        column = self.distances[:, [source, target]].astype(np.int64)
+        reachable = (column != self.unreachable).all(axis=1)
+        if not reachable.any():
+            return 0
+        return int(np.abs(column[reachable, 0] - column[reachable, 1]).max())
+
+    def heuristic_field(self, target, base=None):
+        """Return max(base, ALT lower bound) to a flat target index as int32
+
+        For landmark L the triangle inequality gives |d(L, t) - d(L, n)| <= d(n, t).
+        Landmarks that cannot reach the target contribute nothing.
+        """
+        field = np.zeros(self.distances.shape[1], dtype=np.int32) if base is None else base
+        for row in self.distances:
+            to_target = int(row[target])
+            if to_target == self.unreachable:
+                continue
+            bound = np.abs(row.astype(np.int32) - to_target)
+            np.maximum(field, bound, out=field)
+        return field
@@ -0,0 +1,80 @@
+import numpy as np
+
+
+def line_pixels(start, goal):
+    """4-connected line from start (exclusive) to goal (inclusive) as (ys, xs) arrays
+
+    Bresenham's ordering of x and y steps, but every step moves along one
+    axis only, matching the search's neighbours. The line has Manhattan
+    length, so a clear line is also a shortest path.
+    """
+    y0, x0 = int(start[0]), int(start[1])
+    y1, x1 = int(goal[0]), int(goal[1])
+    dy = abs(y1 - y0)
+    dx = abs(x1 - x0)
+
+    # Each axis steps at the midpoints of its equal slices of the line;
+    # merging the two schedules gives the order of the moves
+    x_times = (np.arange(dx) + 0.5) / max(dx, 1)
+    y_times = (np.arange(dy) + 0.5) / max(dy, 1)
+    order = np.argsort(np.concatenate([x_times, y_times]), kind="stable")
+    x_steps = order < dx
+    xs = x0 + np.sign(x1 - x0) * np.cumsum(x_steps)
+    ys = y0 + np.sign(y1 - y0) * np.cumsum(~x_steps)
+    return ys, xs
+
+
+def line_is_clear(grid_search, start, goal):
+    """Check every pixel of the line from start to goal with one vectorised gather"""
+    ys, xs = line_pixels(start, goal)
+    if not len(ys):
+        return True
+    return bool(grid_search.roads_at(ys, xs).all())
+
+
+def line_path(start, goal):
+    """The line from start to goal as a list of (y, x) tuples"""
+    ys, xs = line_pixels(start, goal)
+    return list(zip(ys.tolist(), xs.tolist()))
+
+
+def smooth_path(grid_search, start, path):
+    """String-pull a path: replace staircases with clear straight lines of the same length
+
+    Only stretches where both coordinates move monotonically are pulled, so
+    the path length never changes; each stretch is cut at the farthest
+    point with a clear line, found by binary search.
+    """
+    if len(path) < 3:
+        return path
+    points = np.asarray([start] + list(path), dtype=np.int64)
+
+    # A monotone stretch ends where either axis changes direction
+    steps = np.diff(points, axis=0)
+    turn = np.zeros(len(points), dtype=bool)
+    for axis in (0, 1):
+        moving = np.flatnonzero(steps[:, axis])
+        signs = steps[moving, axis]
+        changes = moving[1:][signs[1:] != signs[:-1]]
+        turn[changes] = True
+    turn[-1] = True
+    stretch_end = np.flatnonzero(turn)
+
+    result = []
+    anchor = 0
+    last = len(points) - 1
+    while anchor < last:
+        limit = int(stretch_end[np.searchsorted(stretch_end, anchor, side="right")])
+        low, high = anchor + 1, limit
+        while low < high:
+            middle = (low + high + 1) // 2
+            if line_is_clear(grid_search, points[anchor], points[middle]):
+                low = middle
+            else:
+                high = middle - 1
+        if low == anchor + 1:
+            result.append((int(points[low][0]), int(points[low][1])))
+        else:
+            result += line_path(points[anchor], points[low])
+        anchor = low
+    return result
@@ -2,12 +2,24 @@ import tkinter as tk
 from tkinter import filedialog, messagebox
 from PIL import Image, ImageTk
 import numpy as np
-import heapq
 import random
 import math
+from queue import Empty, Queue
 import threading
-from queue import Queue
 import time
+import traceback
+
+from courier_router import CourierRouter, LANDMARK_COUNT, ROAD_COLOR_RANGE, SEARCH_MODES, TERRAIN_COSTS
+from dstar_lite import DStarLite
+from fleet import Fleet, TO_DROPOFF
+from grid_search import SearchCancelled
+from instrumentation import stats
+from planning import CancelToken, PlanningExecutor
+from route_cache import RouteCache
+from route_planner import RoutePlanner
+from tiled_map import open_map_image
+from traffic import FREE_FLOW_SPEED
+from trajectory import Trajectory, courier_outlines
 
 class SmartCourierSimulator:
     def __init__(self, master):
@@ -24,16 +36,59 @@ class SmartCourierSimulator:
         }
         
         # Colors
-        self.ROAD_COLOR_RANGE = ((90, 90, 90), (150, 150, 150))
+        self.ROAD_COLOR_RANGE = ROAD_COLOR_RANGE
+        self.TERRAIN_COSTS = TERRAIN_COSTS  # Road colour bands that are slower to cross
         self.SOURCE_COLOR = "#4CAF50"  # Green flag (source)
         self.DESTINATION_COLOR = "#F44336"  # Red flag (destination)
         self.COURIER_COLOR = "#2196F3"  # Blue courier
+        self.CARRYING_COLOR = "#FF9800"  # Orange fleet courier with a parcel
         self.PATH_COLOR = "#9C27B0"  # Purple path
+        self.CLOSURE_COLOR = (33, 33, 33, 200)  # Translucent dark grey closed road
         
         # Sizes
         self.COURIER_SIZE = 20
         self.FLAG_SIZE = 12
         self.PATH_WIDTH = 3
+        self.PATH_TOLERANCE = 1.0  # Canvas pixels a drawn path may cut corners by
+        self.COURIER_OUTLINES = courier_outlines(self.COURIER_SIZE)  # Triangle offsets per whole degree
+        self.FLEET_COURIER_SIZE = 4
+        self.CLOSURE_BRUSH = 4  # Closure brush radius in map pixels
+        
+        # Maps
+        self.MIN_MAP_SIZE = (1000, 700)
+        self.IN_MEMORY_MAP_SIZE = (1500, 1000)  # Anything larger is loaded as tiles
+        self.TILE_CACHE_SIZE = 1024  # Tiles kept in memory for large maps
+        
+        # Fleet
+        self.FLEET_TICK_RATE = 30  # Simulation ticks per second
+        self.FLEET_JOBS_PER_COURIER = 3
+        self.DISPATCH_METHOD = "greedy"  # Or "hungarian" for optimal matching of small fleets
+        
+        # Multi-stop routes
+        self.ROUTE_TIME_LIMIT = 1.0  # Seconds of local search after insertion
+        
+        # Search
+        self.LANDMARK_COUNT = LANDMARK_COUNT  # Landmarks for the ALT heuristic
+        self.SEARCH_MODES = SEARCH_MODES
+        self.ROUTE_CACHE_LENGTH = 500_000  # Total path pixels kept in the route cache
+        self.SMOOTH_PATHS = True  # Straighten staircases without making routes longer
+        
+        # Rendering
+        self.RENDER_FPS = 60  # Frame cap, independent of the simulation step rate
+        
+        # Instrumentation
+        self.STATS_LOG = "courier_stats.jsonl"  # "Dump Stats" appends JSON lines here
+        
+        # Planning
+        self.PLANNING_WORKERS = 2    # Background threads for searches; the fleet ticks on its own thread
+        self.PLANNING_PROCESSES = 0  # Search processes that sidestep the GIL; 0 searches on threads
+        
+        # Traffic
+        self.TRAFFIC_START = 8 * 3600  # Simulated clock at launch, seconds after midnight
+        # Congestion zones applied on map load, none by default. Each is
+        # ((top, left, bottom, right) as map fractions, (from_hour, to_hour), % of free-flow speed),
+        # e.g. ((0.3, 0.3, 0.7, 0.7), (7, 10), 35) for a morning rush in the centre
+        self.TRAFFIC_ZONES = ()
         
         # Initialize UI
         self.setup_ui()
@@ -41,16 +96,25 @@ class SmartCourierSimulator:
         # Game state
         self.reset_state()
         
-        # Thread-safe queue for GUI updates
+        # Routes survive map reloads; keys include the road mask fingerprint
+        self.route_cache = RouteCache(self.ROUTE_CACHE_LENGTH)
+        
+        # Thread-safe queue for GUI updates; planning results only arrive through it
         self.gui_queue = Queue()
+        self.executor = PlanningExecutor(self.PLANNING_WORKERS, self.PLANNING_PROCESSES)
         
         # Performance tracking
         self.last_frame_time = time.time()
         self.frame_count = 0
         self.fps = 0
         
-        # Start checking the queue
-        self.check_queue()
+        # Courier canvas items are created once and then only moved
+        self.courier_items = None
+        self.parcel_shown = False
+        self.courier_dirty = False
+        
+        # Start the render loop
+        self.render_frame()
     
     def setup_ui(self):
         """Initialize UI components"""
@@ -70,7 +134,7 @@ class SmartCourierSimulator:
         self.random_btn = tk.Button(
             self.control_frame,
             text="Random Positions",
-            command=lambda: threading.Thread(target=self.place_flags_threaded, daemon=True).start(),
+            command=self.place_flags,
             bg="#795548", fg="white"
         )
         self.random_btn.pack(side=tk.LEFT, padx=5)
@@ -78,7 +142,7 @@ class SmartCourierSimulator:
         self.start_btn = tk.Button(
             self.control_frame,
             text="Start Delivery",
-            command=lambda: threading.Thread(target=self.start_delivery_threaded, daemon=True).start(),
+            command=self.start_delivery,
             bg="#4CAF50", fg="white"
         )
         self.start_btn.pack(side=tk.LEFT, padx=5)
@@ -91,19 +155,84 @@ class SmartCourierSimulator:
         )
         self.stop_btn.pack(side=tk.LEFT, padx=5)
         
+        # Fleet Control
+        self.fleet_size = tk.Spinbox(self.control_frame, from_=1, to=500, width=4)
+        self.fleet_size.delete(0, tk.END)
+        self.fleet_size.insert(0, "50")
+        self.fleet_size.pack(side=tk.LEFT, padx=(20, 5))
+        
+        self.fleet_btn = tk.Button(
+            self.control_frame,
+            text="Start Fleet",
+            command=lambda: self.run_fleet(self.fleet_size.get()),
+            bg="#3F51B5", fg="white"
+        )
+        self.fleet_btn.pack(side=tk.LEFT, padx=5)
+        
+        # Multi-Stop Control
+        self.parcel_count = tk.Spinbox(self.control_frame, from_=1, to=100, width=4)
+        self.parcel_count.delete(0, tk.END)
+        self.parcel_count.insert(0, "10")
+        self.parcel_count.pack(side=tk.LEFT, padx=(20, 5))
+        
+        self.route_btn = tk.Button(
+            self.control_frame,
+            text="Multi-Stop",
+            command=lambda: self.run_route(self.parcel_count.get()),
+            bg="#009688", fg="white"
+        )
+        self.route_btn.pack(side=tk.LEFT, padx=5)
+        
         # Speed Control
         self.speed_label = tk.Label(self.control_frame, text="Speed:", bg="#f0f0f0")
         self.speed_label.pack(side=tk.LEFT, padx=(20, 5))
         
+        self.speed = 10  # Slider value, mirrored for the fleet's planning thread
         self.speed_scale = tk.Scale(
             self.control_frame,
             from_=1, to=30,
             orient=tk.HORIZONTAL,
-            bg="#f0f0f0"
+            bg="#f0f0f0",
+            command=lambda value: setattr(self, "speed", int(value))
         )
         self.speed_scale.set(10)  # Default to medium speed
         self.speed_scale.pack(side=tk.LEFT)
         
+        # Heuristic Control
+        self.use_landmarks = tk.BooleanVar(value=True)
+        self.landmarks_check = tk.Checkbutton(
+            self.control_frame,
+            text="ALT Heuristic",
+            variable=self.use_landmarks,
+            bg="#f0f0f0"
+        )
+        self.landmarks_check.pack(side=tk.LEFT, padx=(20, 5))
+        
+        # Search Mode
+        self.search_mode = tk.StringVar(value=self.SEARCH_MODES[0])
+        self.mode_menu = tk.OptionMenu(self.control_frame, self.search_mode, *self.SEARCH_MODES)
+        self.mode_menu.config(bg="#f0f0f0")
+        self.mode_menu.pack(side=tk.LEFT, padx=5)
+        
+        # Instrumentation Control
+        self.show_stats = tk.BooleanVar(value=False)
+        self.stats_check = tk.Checkbutton(
+            self.control_frame,
+            text="Stats",
+            variable=self.show_stats,
+            command=self.toggle_stats,
+            bg="#f0f0f0"
+        )
+        self.stats_check.pack(side=tk.LEFT, padx=(20, 5))
+        
+        self.dump_btn = tk.Button(
+            self.control_frame,
+            text="Dump Stats",
+            command=self.dump_stats,
+            bg="#9E9E9E", fg="white"
+        )
+        self.dump_btn.pack(side=tk.LEFT, padx=5)
+        
         # Status Bar
         self.status_frame = tk.Frame(self.master, bg="#333", height=30)
         self.status_frame.pack(fill=tk.X)
@@ -116,6 +245,17 @@ class SmartCourierSimulator:
         )
         self.status_label.pack(side=tk.LEFT, padx=10)
         
+        # Stats panel, packed below the status bar while "Stats" is ticked
+        self.stats_label = tk.Label(
+            self.master,
+            text="",
+            justify=tk.LEFT,
+            anchor="w",
+            font=("Courier", 9),
+            fg="#ddd",
+            bg="#222"
+        )
+        
         # Main Canvas
         self.canvas = tk.Canvas(
             self.master,
@@ -124,26 +264,68 @@ class SmartCourierSimulator:
             bg="#333"
         )
         self.canvas.pack(pady=(0, 10))
+        
+        # Click or drag on the map to close roads, starting on a closure reopens
+        self.canvas.bind("<Button-1>", self.on_canvas_press)
+        self.canvas.bind("<B1-Motion>", self.on_canvas_drag)
+        self.canvas.bind("<ButtonRelease-1>", self.on_canvas_release)
     
     def check_queue(self):
-        """Check for GUI updates from threads and calculate FPS"""
-        try:
-            while True:
+        """Run GUI updates queued by threads; returns how many ran
+        
+        A failing update is reported and skipped so the ones behind it still run.
+        """
+        count = 0
+        while True:
+            try:
                 task = self.gui_queue.get_nowait()
+            except Empty:
+                return count
+            try:
                 task()
-        except:
-            pass
+            except Exception as e:
+                traceback.print_exc()
+                self.update_status(f"GUI update failed: {str(e)}")
+            count += 1
+    
+    def render_frame(self):
+        """Capped-rate render loop: apply queued updates, then redraw only what changed
         
+        Frames where nothing changed draw nothing and do not count towards FPS.
+        """
+        frame_start = time.time()
+        drawn = self.check_queue() > 0
+        
+        if self.courier_dirty:
+            self.courier_dirty = False
+            if self.draw_courier():
+                self.courier_dirty = True
+            drawn = True
+            
+        if self.fleet_frame is not None:
+            self.draw_fleet()
+            drawn = True
+            
         # Calculate FPS
-        self.frame_count += 1
         current_time = time.time()
+        if drawn:
+            self.frame_count += 1
+            stats.record("frame", current_time - frame_start, event=False)
         if current_time - self.last_frame_time >= 1.0:
             self.fps = self.frame_count
             self.frame_count = 0
             self.last_frame_time = current_time
             self.update_fps()
+            if self.show_stats.get():
+                self.update_stats_panel()
             
-        self.master.after(10, self.check_queue)
+        elapsed = int((current_time - frame_start) * 1000)
+        self.master.after(max(1, 1000 // self.RENDER_FPS - elapsed), self.render_frame)
+    
+    def clear_canvas(self):
+        """Delete every canvas item, forgetting the reusable courier items"""
+        self.canvas.delete("all")
+        self.courier_items = None
     
     def update_fps(self):
         """Update FPS display in status bar"""
@@ -152,46 +334,87 @@ class SmartCourierSimulator:
             current_text = current_text.split("| FPS:")[0].strip()
         self.status_label.config(text=f"{current_text} | FPS: {self.fps}")
     
+    def toggle_stats(self):
+        """Turn instrumentation and its panel on or off"""
+        stats.enabled = self.show_stats.get()
+        if stats.enabled:
+            self.stats_label.pack(fill=tk.X, before=self.canvas)
+            self.update_stats_panel()
+        else:
+            self.stats_label.pack_forget()
+    
+    def update_stats_panel(self):
+        """Refresh the stats panel, once a second from the render loop"""
+        cache = self.route_cache.stats()
+        lines = stats.summary_lines() or ["No samples yet"]
+        lines.append(
+            f"route cache: {cache['hits']} hits, {cache['misses']} misses ({cache['hit_rate']:.0%}), "
+            f"{cache['routes']} routes, {cache['total_length']} px"
+        )
+        self.stats_label.config(text="\n".join(lines))
+    
+    def dump_stats(self):
+        """Append recorded events and a summary to the stats log"""
+        try:
+            count = stats.dump(self.STATS_LOG)
+        except OSError as e:
+            messagebox.showerror("Error", f"Failed to write stats: {str(e)}")
+            return
+        self.update_status(f"Wrote {count} stats lines to {self.STATS_LOG}")
+    
     def reset_state(self):
         """Reset game state"""
         self.image = None
         self.image_tk = None
         self.image_path = None
-        self.map_array = None
         self.original_size = None
         
         self.source = None
         self.destination = None
         self.courier = None
-        self.courier_angle = 90  # Start facing right
-        self.target_angle = 90   # For smooth rotation
+        self.target_angle = 90   # Start facing right; smooth_angle turns towards it
         self.has_package = False
         self.path = []
         self.delivery_in_progress = False
-        self.road_pixels = []
-        self.road_set = set()
+        self.router = None
         self.animation_id = None
-        self.rotation_id = None
         self.current_step = 0
-        self.prev_pos = None
-        self.interp_pos = None
+        self.trajectory = None  # Canvas positions and headings along self.path
+        self.courier_xy = None  # Canvas position of self.courier
+        self.interp_pos = None  # Canvas position the courier is drawn at
+        self.clock = self.TRAFFIC_START  # Simulated seconds after midnight
+        self.leg_time = self.clock       # Simulated time the courier reached path[current_step]
         self.interp_factor = 0.3  # Smoother movement interpolation
         self.smooth_angle = 90    # For extra smooth rotation
+        self.leg_goal = None        # Goal of the leg being animated, for replanning
+        self.replanner = None       # D* Lite state for the current leg, seeded on its first closure
+        self.replanner_job = None   # Background job seeding that state
+        self.pending_closures = []  # Changed pixels the current leg has not seen yet
+        self.closure_mode = None    # True closes, False reopens, None outside a stroke
+        self.closure_tk = None
+        self.fleet = None
+        self.fleet_cancel = None  # Stops the fleet's ticker thread
+        self.fleet_items = []
+        self.fleet_colors = []
+        self.fleet_frame = None
+        self.load_job = None  # Background job building the next map's router
     
     def stop_delivery(self):
-        """Stop the current delivery"""
+        """Stop the current delivery, cancelling any search still in flight"""
+        self.executor.cancel_all()
         if self.animation_id:
             self.master.after_cancel(self.animation_id)
             self.animation_id = None
-        if self.rotation_id:
-            self.master.after_cancel(self.rotation_id)
-            self.rotation_id = None
+        if self.fleet_cancel is not None:
+            self.fleet_cancel.cancel()
+            self.fleet_cancel = None
         self.delivery_in_progress = False
+        self.fleet = None
         self.gui_queue.put(lambda: self.update_status("Delivery stopped"))
     
     def load_map(self):
         """Load and validate map image"""
-        if self.delivery_in_progress:
+        if self.delivery_in_progress or self.load_job is not None:
             return
             
         file_path = filedialog.askopenfilename(
@@ -203,134 +426,188 @@ class SmartCourierSimulator:
             return
             
         try:
-            img = Image.open(file_path).convert("RGB")
+            # Opening is lazy, so the size check never decodes a large map
+            img = open_map_image(file_path)
             width, height = img.size
+            min_width, min_height = self.MIN_MAP_SIZE
             
-            if not (1000 <= width <= 1500) or not (700 <= height <= 1000):
+            if width < min_width or height < min_height:
+                img.close()
                 messagebox.showerror(
                     "Invalid Map Size",
-                    f"Map must be 1000-1500px wide and 700-1000px tall.\n"
+                    f"Map must be at least {min_width}px wide and {min_height}px tall.\n"
                     f"Your map is {width}x{height}px."
                 )
                 return
                 
-            self.image_path = file_path
-            self.original_size = (width, height)
-            self.map_array = np.array(img)
-            
-            img.thumbnail((900, 700), Image.LANCZOS)
-            self.image = img
-            self.image_tk = ImageTk.PhotoImage(self.image)
-            
-            self.road_pixels = self.get_road_pixels()
-            self.road_set = set(self.road_pixels)
-            
-            if len(self.road_pixels) < 10:
-                messagebox.showwarning(
-                    "Few Road Pixels",
-                    f"Only found {len(self.road_pixels)} road pixels.\n"
-                    "The map may not have enough navigable area."
-                )
-            
-            self.gui_queue.put(lambda: self.canvas.delete("all"))
-            self.gui_queue.put(lambda: self.canvas.config(width=self.image.width, height=self.image.height))
-            self.gui_queue.put(lambda: self.canvas.create_image(0, 0, anchor=tk.NW, image=self.image_tk))
-            
-            self.gui_queue.put(lambda: self.update_status(f"Map loaded: {width}x{height} | Road pixels: {len(self.road_pixels)}"))
-            
+            img.close()
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load image: {str(e)}")
+            if self.router is not None:
+                self.router.close()
             self.reset_state()
+            return
+        
+        # Building the road model decodes or compiles the map, which takes
+        # minutes for a large city map, so it runs on a planning thread
+        self.update_status(f"Loading {width}x{height} map...")
+        load_start = time.perf_counter()
+        job = self.executor.submit(self.build_router, file_path, width, height)
+        job.add_done_callback(
+            lambda job: self.gui_queue.put(lambda: self.finish_load(job, file_path, width, height, load_start))
+        )
+        self.load_job = job
     
-    def get_road_pixels(self):
-        """Return list of road pixel coordinates (y, x)"""
-        if self.map_array is None:
-            return []
-            
-        min_rgb, max_rgb = self.ROAD_COLOR_RANGE
+    def build_router(self, file_path, width, height, cancel=None):
+        """Planning job: (router, display image) for the map at file_path"""
+        max_width, max_height = self.IN_MEMORY_MAP_SIZE
+        if width <= max_width and height <= max_height:
+            # The road model is compiled next to the image on first load and
+            # memory-mapped afterwards, so only the display copy is decoded here
+            with open_map_image(file_path) as img:
+                image = img.convert("RGB")
+            image.thumbnail((900, 700), Image.LANCZOS)
+            router = CourierRouter.from_image(
+                file_path, self.ROAD_COLOR_RANGE, self.LANDMARK_COUNT, self.route_cache,
+                self.TERRAIN_COSTS,
+            )
+            return router, image
+        
+        # Large maps are classified tile by tile once; the canvas shows
+        # the overview stored with the tiles
+        router = CourierRouter.from_tiled(
+            file_path, self.ROAD_COLOR_RANGE, self.route_cache, self.TILE_CACHE_SIZE
+        )
+        return router, router.grid_search.overview
+    
+    def finish_load(self, job, file_path, width, height, load_start):
+        """Swap in the router a load job built, closing the one it replaces"""
+        if job is not self.load_job:
+            return
+        self.load_job = None
+        if job.cancelled():
+            self.update_status("Map load cancelled")
+            return
+        try:
+            router, image = job.result()
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to load image: {str(e)}")
+            self.update_status("Map load failed")
+            return
         
-        # Vectorized operation for better performance
-        road_mask = (
-            (self.map_array[:,:,0] >= min_rgb[0]) & (self.map_array[:,:,0] <= max_rgb[0]) &
-            (self.map_array[:,:,1] >= min_rgb[1]) & (self.map_array[:,:,1] <= max_rgb[1]) &
-            (self.map_array[:,:,2] >= min_rgb[2]) & (self.map_array[:,:,2] <= max_rgb[2])
+        # Searches still running on the old router would read a closed tile file
+        self.executor.cancel_all()
+        if self.router is not None:
+            self.router.close()
+        self.router = router
+        self.apply_traffic_zones()
+        self.image_path = file_path
+        self.original_size = (width, height)
+        self.image = image
+        self.image_tk = ImageTk.PhotoImage(self.image)
+        road_count = self.router.grid_search.road_count
+        stats.record(
+            "map_load", time.perf_counter() - load_start,
+            width=width, height=height, tiled=self.router.tiled, road_pixels=road_count,
         )
         
-        return list(zip(*np.where(road_mask)))
+        if road_count < 10:
+            messagebox.showwarning(
+                "Few Road Pixels",
+                f"Only found {road_count} road pixels.\n"
+                "The map may not have enough navigable area."
+            )
+        
+        self.clear_canvas()
+        self.canvas.config(width=self.image.width, height=self.image.height)
+        self.canvas.create_image(0, 0, anchor=tk.NW, image=self.image_tk)
+        self.update_status(f"Map loaded: {width}x{height} | Road pixels: {road_count}")
     
-    def place_flags_threaded(self):
-        """Threaded version of place_flags"""
+    def place_flags(self):
+        """Pick random courier, source and destination positions in the background"""
         if self.delivery_in_progress:
             return
             
-        if not self.road_pixels:
-            self.gui_queue.put(lambda: messagebox.showerror("Error", "No valid road pixels found in the map"))
+        if self.router is None or not self.router.grid_search.road_count:
+            messagebox.showerror("Error", "No valid road pixels found in the map")
+            return
+            
+        self.executor.cancel_all()
+        self.run_job(self.executor.submit(self.pick_positions, self.router), self.show_positions)
+    
+    def pick_positions(self, router, cancel=None):
+        """Planning job: (courier, source, destination) on one road component, or None
+        
+        All three points come from one connected component, so every leg
+        of the delivery is guaranteed to have a path without searching.
+        """
+        started = time.perf_counter()
+        grid_search = router.grid_search
+        component = grid_search.random_component(min_size=3)
+        if component is None:
+            return None
+            
+        source = grid_search.random_road_pixel(component)
+        destination = grid_search.random_road_pixel(component)
+        attempts = 2
+        while destination == source:
+            destination = grid_search.random_road_pixel(component)
+            attempts += 1
+            
+        courier = grid_search.random_road_pixel(component)
+        attempts += 1
+        while courier == source or courier == destination:
+            courier = grid_search.random_road_pixel(component)
+            attempts += 1
+        stats.record("placement", time.perf_counter() - started, attempts=attempts)
+        return courier, source, destination
+    
+    def show_positions(self, positions):
+        """Place picked positions on a fresh canvas and warm the route cache"""
+        if self.delivery_in_progress:
+            return
+            
+        if positions is None:
+            messagebox.showerror(
+                "Position Error",
+                "Couldn't find a connected road area large enough for courier, source and destination."
+            )
             return
             
-        self.gui_queue.put(lambda: self.canvas.delete("all"))
+        self.gui_queue.put(self.clear_canvas)
         if self.image_tk:
             self.gui_queue.put(lambda: self.canvas.create_image(0, 0, anchor=tk.NW, image=self.image_tk))
+        if self.router.closed:
+            self.gui_queue.put(self.draw_closures)
         
         if self.animation_id:
             self.master.after_cancel(self.animation_id)
             self.animation_id = None
-        if self.rotation_id:
-            self.master.after_cancel(self.rotation_id)
-            self.rotation_id = None
-        
-        max_attempts = 10
-        valid_positions_found = False
-        
-        for attempt in range(max_attempts):
-            self.source = random.choice(self.road_pixels)
-            self.destination = random.choice(self.road_pixels)
-            while self.destination == self.source:
-                self.destination = random.choice(self.road_pixels)
-                
-            self.courier = random.choice(self.road_pixels)
-            while self.courier == self.source or self.courier == self.destination:
-                self.courier = random.choice(self.road_pixels)
-                
-            self.courier_angle = random.choice(list(self.DIRECTIONS.keys()))
-            self.target_angle = self.courier_angle
-            self.smooth_angle = self.courier_angle
-            self.has_package = False
-            self.current_step = 0
-            self.prev_pos = None
-            self.interp_pos = None
             
-            path_to_source = self.optimized_a_star(self.courier, self.source)
-            if not path_to_source:
-                continue
-                
-            path_to_dest = self.optimized_a_star(self.source, self.destination)
-            if path_to_dest:
-                valid_positions_found = True
-                break
-                
-        if not valid_positions_found:
-            self.gui_queue.put(lambda: messagebox.showerror(
-                "Position Error",
-                "Couldn't find valid positions with connecting paths after 10 attempts."
-            ))
-            return
+        self.courier, self.source, self.destination = positions
+        self.target_angle = random.choice(list(self.DIRECTIONS.keys()))
+        self.smooth_angle = self.target_angle
+        self.has_package = False
+        self.current_step = 0
+        self.courier_xy = self.canvas_position(self.courier)
+        self.interp_pos = None
             
         self.gui_queue.put(lambda: self.draw_flag(self.source, self.SOURCE_COLOR, "source"))
         self.gui_queue.put(lambda: self.draw_flag(self.destination, self.DESTINATION_COLOR, "destination"))
-        self.gui_queue.put(lambda: self.draw_courier())
+        self.courier_dirty = True
         
         self.gui_queue.put(lambda: self.update_status("Positions placed | Ready to deliver"))
+        
+        # Seed the route cache with both legs so neither starts with a search
+        self.plan_path(self.courier, self.source)
+        self.plan_path(self.source, self.destination)
     
     def draw_flag(self, position, color, tag):
         """Draw a flag marker at specified position"""
         if self.image is None:
             return
             
-        orig_y, orig_x = position
-        scale_x = self.image.width / self.original_size[0]
-        scale_y = self.image.height / self.original_size[1]
-        x = orig_x * scale_x
-        y = orig_y * scale_y
+        x, y = self.canvas_position(position)
         
         self.canvas.create_oval(
             x - self.FLAG_SIZE, y - self.FLAG_SIZE,
@@ -345,169 +622,159 @@ class SmartCourierSimulator:
         )
     
     def draw_courier(self):
-        """Draw the courier with smooth interpolation and optimized rendering"""
-        if self.image is None or self.courier is None:
-            return
-            
-        # Calculate interpolated position for smooth movement
-        if self.prev_pos and self.interp_pos is None:
-            self.interp_pos = self.prev_pos
+        """Move the courier's canvas items one interpolation step; True until it has settled"""
+        if self.image is None or self.courier_xy is None:
+            return False
             
-        if self.interp_pos:
-            # Smooth interpolation
-            orig_y = self.interp_pos[0] + (self.courier[0] - self.interp_pos[0]) * self.interp_factor
-            orig_x = self.interp_pos[1] + (self.courier[1] - self.interp_pos[1]) * self.interp_factor
-            self.interp_pos = (orig_y, orig_x)
+        # Ease the drawn position towards the courier's canvas position
+        target_x, target_y = self.courier_xy
+        if self.interp_pos is None:
+            x, y = target_x, target_y
         else:
-            orig_y, orig_x = self.courier
-        
-        scale_x = self.image.width / self.original_size[0]
-        scale_y = self.image.height / self.original_size[1]
-        x = orig_x * scale_x
-        y = orig_y * scale_y
-        
-        self.canvas.delete("courier")
+            x = self.interp_pos[0] + (target_x - self.interp_pos[0]) * self.interp_factor
+            y = self.interp_pos[1] + (target_y - self.interp_pos[1]) * self.interp_factor
+        self.interp_pos = (x, y)
         
         # Smooth angle transition
         angle_diff = (self.target_angle - self.smooth_angle + 180) % 360 - 180
         self.smooth_angle = (self.smooth_angle + angle_diff * 0.2) % 360
         
-        # Pre-calculate triangle points for maximum speed
-        angle_rad = math.radians(self.smooth_angle)
+        # Triangle points from the per-degree outline table instead of trig
+        front_x, front_y, left_x, left_y, right_x, right_y = self.COURIER_OUTLINES[int(self.smooth_angle + 0.5) % 360]
         size = self.COURIER_SIZE
-        points = [
-            x + size * math.cos(angle_rad),  # Front point
-            y - size * math.sin(angle_rad),
-            x + size * 0.7 * math.cos(angle_rad + math.pi * 0.8),  # Rear left
-            y - size * 0.7 * math.sin(angle_rad + math.pi * 0.8),
-            x + size * 0.7 * math.cos(angle_rad - math.pi * 0.8),  # Rear right
-            y - size * 0.7 * math.sin(angle_rad - math.pi * 0.8)
-        ]
-        
-        self.canvas.create_polygon(
-            points,
-            fill=self.COURIER_COLOR,
-            outline="white",
-            width=2,
-            tags="courier"
-        )
+        points = [x + front_x, y + front_y, x + left_x, y + left_y, x + right_x, y + right_y]
         
-        if self.has_package:
-            self.canvas.create_text(
-                x, y - size - 15,
-                text="📦", font=("Arial", 14), tags="courier"
+        if self.courier_items is None:
+            self.courier_items = (
+                self.canvas.create_polygon(
+                    points,
+                    fill=self.COURIER_COLOR,
+                    outline="white",
+                    width=2,
+                    tags="courier"
+                ),
+                self.canvas.create_text(
+                    x, y - size - 15,
+                    text="📦", font=("Arial", 14), state="hidden", tags="courier"
+                ),
             )
+            self.parcel_shown = False
+            
+        body, parcel = self.courier_items
+        self.canvas.coords(body, *points)
+        self.canvas.coords(parcel, x, y - size - 15)
+        if self.has_package != self.parcel_shown:
+            self.canvas.itemconfig(parcel, state="normal" if self.has_package else "hidden")
+            self.parcel_shown = self.has_package
+            
+        # Keep drawing until the interpolation and rotation catch up
+        return abs(target_x - x) + abs(target_y - y) > 0.1 or abs(angle_diff) > 0.5
     
-    def draw_path(self, path):
-        """Visualize the path on the canvas with optimized rendering"""
-        if not path or len(path) < 2:
+    def draw_path(self, trajectory):
+        """Draw a route's simplified polyline, a few points instead of one per pixel"""
+        if trajectory is None or len(trajectory) < 2:
             return
             
         self.canvas.delete("path")
-        
-        scale_x = self.image.width / self.original_size[0]
-        scale_y = self.image.height / self.original_size[1]
-        
-        # Pre-calculate all points for faster line drawing
-        points = []
-        for y, x in path:
-            points.append(x * scale_x)
-            points.append(y * scale_y)
-        
         self.canvas.create_line(
-            *points,
+            *trajectory.polyline,
             fill=self.PATH_COLOR,
             width=self.PATH_WIDTH,
             tags="path"
         )
+        self.canvas.tag_raise("courier")
     
-    def start_delivery_threaded(self):
-        """Threaded version of start_delivery with optimized pathfinding"""
+    def start_delivery(self):
+        """Plan the next leg in the background; it is animated when the path arrives"""
         if self.delivery_in_progress:
             return
             
-        if (self.map_array is None or 
+        if (self.router is None or 
             self.source is None or 
             self.destination is None or 
             self.courier is None):
-            self.gui_queue.put(lambda: messagebox.showerror("Error", "Please load map and place positions first"))
+            messagebox.showerror("Error", "Please load map and place positions first")
             return
             
         self.delivery_in_progress = True
+        self.update_status(f"Starting delivery at {self.clock_text()}...")
+        self.plan_leg("destination" if self.has_package else "source")
+    
+    def plan_leg(self, target):
+        """Search for the courier's path to the source or destination off the GUI thread"""
+        goal = self.source if target == "source" else self.destination
+        self.run_job(self.plan_path(self.courier, goal), lambda path: self.start_leg(target, path))
+    
+    def start_leg(self, target, path):
+        """Animate a planned leg; an empty path ends the delivery"""
+        if not self.delivery_in_progress:
+            return
+            
+        if not path:
+            messagebox.showerror("Error", f"No path found to {target}")
+            self.delivery_in_progress = False
+            return
+            
+        self.set_path(path)
+        self.interp_pos = self.courier_xy
+        self.begin_leg(self.source if target == "source" else self.destination)
+        self.draw_path(self.trajectory)
+        self.ultra_fast_animate(target)
+    
+    def set_path(self, path):
+        """Start following path, precomputing its canvas positions, headings and polyline once"""
+        self.path = path
         self.current_step = 0
-        self.prev_pos = self.courier
-        self.interp_pos = self.courier
-        self.gui_queue.put(lambda: self.update_status("Starting delivery..."))
-        
-        if not self.has_package:
-            # Going to pick up package
-            self.path = self.optimized_a_star(self.courier, self.source)
-            if not self.path:
-                self.gui_queue.put(lambda: messagebox.showerror("Error", "No path found to source"))
-                self.delivery_in_progress = False
-                return
-                
-            self.gui_queue.put(lambda: self.draw_path(self.path))
-            self.ultra_fast_animate("source")
-        else:
-            # Already has package, go to destination
-            self.path = self.optimized_a_star(self.courier, self.destination)
-            if not self.path:
-                self.gui_queue.put(lambda: messagebox.showerror("Error", "No path found to destination"))
-                self.delivery_in_progress = False
-                return
-                
-            self.gui_queue.put(lambda: self.draw_path(self.path))
-            self.ultra_fast_animate("destination")
+        self.trajectory = Trajectory(path, self.canvas_scale(), self.PATH_TOLERANCE)
     
     def ultra_fast_animate(self, target):
         """Optimized movement animation with smooth transitions"""
         if not self.delivery_in_progress:
             return
             
-        # Update position in chunks based on speed
         speed = self.speed_scale.get()
-        step_size = min(1 + speed // 5, len(self.path) - self.current_step - 1)
+        delay = max(0, int(30 / (speed ** 0.7)))
         
-        # Store previous position for interpolation
-        self.prev_pos = self.courier
+        if self.pending_closures and not self.replan():
+            # Hold still while D* Lite is seeded rather than walk into the closure
+            self.animation_id = self.master.after(delay, lambda: self.ultra_fast_animate(target))
+            return
+        if not self.delivery_in_progress:
+            return
+                
+        # Update position in chunks based on speed
+        step_size = min(1 + speed // 5, len(self.path) - self.current_step - 1)
         
-        # Move forward in the path
-        if self.current_step + step_size < len(self.path):
-            self.courier = self.path[self.current_step + step_size]
-            self.current_step += step_size
+        # Move forward in the path; the clock runs at the slider's free-flow pace
+        self.clock += step_size / FREE_FLOW_SPEED
+        traffic = self.router.traffic
+        if traffic is not None:
+            # Under congestion the courier covers only what the local speeds allow
+            self.current_step, self.leg_time = traffic.follow(
+                self.path, self.current_step, self.leg_time, self.clock
+            )
+            moved = self.current_step or len(self.path) == 1
         else:
-            self.courier = self.path[-1]
-            self.current_step = len(self.path) - 1
-        
-        # Update direction based on next few steps to prevent jitter at intersections
-        look_ahead = min(5, len(self.path) - self.current_step - 1)
-        if look_ahead > 0:
-            next_pos = self.path[self.current_step + look_ahead]
-            self.target_angle = self.get_direction_to(next_pos)
-        
-        # Update display
-        self.gui_queue.put(lambda: self.canvas.delete("courier"))
-        self.gui_queue.put(lambda: self.draw_courier())
+            self.current_step = min(self.current_step + step_size, len(self.path) - 1)
+            self.leg_time = self.clock
+            moved = True
+            
+        # Positions and headings were computed with the path, so a step only indexes
+        trajectory = self.trajectory
+        if moved:
+            self.courier = self.path[self.current_step]
+            self.courier_xy = tuple(trajectory.screen[self.current_step])
+        if self.current_step < len(trajectory.headings):
+            self.target_angle = trajectory.headings[self.current_step]
         
-        # Calculate delay - exponential scaling for speed
-        delay = max(0, int(30 / (speed ** 0.7)))
+        # The render loop picks the move up on its next frame
+        self.courier_dirty = True
         
         if self.current_step < len(self.path) - 1:
             self.animation_id = self.master.after(delay, lambda: self.ultra_fast_animate(target))
         else:
             self.handle_delivery_complete(target)
     
-    def get_direction_to(self, position):
-        """Optimized direction calculation with smoothing"""
-        dy = position[0] - self.courier[0]
-        dx = position[1] - self.courier[1]
-        
-        if dx == 0 and dy == 0:
-            return self.target_angle
-            
-        return math.degrees(math.atan2(-dy, dx)) % 360
-    
     def get_direction_to_target(self, target_pos):
         """Optimized facing direction calculation"""
         cy, cx = self.courier
@@ -520,108 +787,38 @@ class SmartCourierSimulator:
             
         return math.degrees(math.atan2(-dy, dx)) % 360
     
-    def optimized_a_star(self, start, goal):
-        """Extremely optimized A* pathfinding algorithm"""
-        if start == goal:
-            return []
-            
-        if abs(start[0] - goal[0]) + abs(start[1] - goal[1]) == 1:
-            return [goal]
-            
-        if not (start in self.road_set and goal in self.road_set):
-            return []
-            
-        # Check if we can use a straight line (faster than A*)
-        if self.check_straight_line(start, goal):
-            return self.bresenham_line(start, goal)
-            
-        # Otherwise use optimized A*
-        rows, cols = self.map_array.shape[:2]
-        open_set = []
-        heapq.heappush(open_set, (0, start))
-        came_from = {}
-        g_score = {start: 0}
-        f_score = {start: self.chebyshev_heuristic(start, goal)}
-        
-        open_set_hash = {start}
-        
-        while open_set:
-            _, current = heapq.heappop(open_set)
-            open_set_hash.remove(current)
-            
-            if current == goal:
-                path = []
-                while current in came_from:
-                    path.append(current)
-                    current = came_from[current]
-                path.reverse()
-                return path
-                
-            # Check neighbors in optimal order (right, down, left, up)
-            for dy, dx in [(0, 1), (1, 0), (0, -1), (-1, 0)]:
-                neighbor = (current[0] + dy, current[1] + dx)
-                
-                if 0 <= neighbor[0] < rows and 0 <= neighbor[1] < cols:
-                    if neighbor in self.road_set:
-                        tentative_g = g_score[current] + 1
-                        
-                        if neighbor not in g_score or tentative_g < g_score[neighbor]:
-                            came_from[neighbor] = current
-                            g_score[neighbor] = tentative_g
-                            f_score[neighbor] = tentative_g + self.chebyshev_heuristic(neighbor, goal)
-                            if neighbor not in open_set_hash:
-                                heapq.heappush(open_set, (f_score[neighbor], neighbor))
-                                open_set_hash.add(neighbor)
-        
-        return []
-    
-    def check_straight_line(self, start, goal):
-        """Check if a straight line path exists between two points"""
-        # Simple check - only works for perfectly straight lines
-        if start[0] == goal[0] or start[1] == goal[1]:
-            return True
-        return False
-    
-    def bresenham_line(self, start, goal):
-        """Bresenham's line algorithm for straight paths"""
-        x0, y0 = start[1], start[0]
-        x1, y1 = goal[1], goal[0]
-        points = []
-        
-        dx = abs(x1 - x0)
-        dy = abs(y1 - y0)
-        x, y = x0, y0
-        sx = -1 if x0 > x1 else 1
-        sy = -1 if y0 > y1 else 1
-        
-        if dx > dy:
-            err = dx / 2.0
-            while x != x1:
-                points.append((y, x))
-                err -= dy
-                if err < 0:
-                    y += sy
-                    err += dx
-                x += sx
-        else:
-            err = dy / 2.0
-            while y != y1:
-                points.append((y, x))
-                err -= dx
-                if err < 0:
-                    x += sx
-                    err += dy
-                y += sy
-        
-        points.append((y1, x1))
-        return points
-    
-    def chebyshev_heuristic(self, a, b):
-        """Optimized Chebyshev distance heuristic"""
-        return max(abs(a[0] - b[0]), abs(a[1] - b[1]))
+    def plan_path(self, start, goal):
+        """Submit find_path with the UI's current settings to the executor; returns the PlanningJob"""
+        return self.executor.submit_search(
+            self.router, start, goal, self.search_mode.get(), self.use_landmarks.get(),
+            self.SMOOTH_PATHS, self.clock
+        )
+    
+    def run_job(self, job, on_done):
+        """Hand a planning job's result to on_done on the GUI thread
+        
+        Results only come back through gui_queue, and cancelled jobs deliver nothing.
+        """
+        job.add_done_callback(lambda job: self.gui_queue.put(lambda: self.finish_job(job, on_done)))
+        return job
+    
+    def finish_job(self, job, on_done):
+        """Pass a finished job's result on unless it was cancelled"""
+        if job.cancelled():
+            return
+        try:
+            result = job.result()
+        except SearchCancelled:
+            return
+        except Exception as e:
+            self.delivery_in_progress = False
+            messagebox.showerror("Error", f"Planning failed: {str(e)}")
+            return
+        on_done(result)
     
     def handle_delivery_complete(self, target):
         """Handle completion of delivery stage"""
+        self.courier_dirty = True  # Facing and the parcel marker change below
         if target == "source":
             self.has_package = True
             self.gui_queue.put(lambda: self.update_status("Package picked up"))
@@ -630,17 +827,7 @@ class SmartCourierSimulator:
             self.target_angle = self.get_direction_to_target(self.source)
             
             # Start delivery to destination
-            self.path = self.optimized_a_star(self.courier, self.destination)
-            if not self.path:
-                self.gui_queue.put(lambda: messagebox.showerror("Error", "No path found to destination"))
-                self.delivery_in_progress = False
-                return
-                
-            self.current_step = 0
-            self.prev_pos = self.courier
-            self.interp_pos = self.courier
-            self.gui_queue.put(lambda: self.draw_path(self.path))
-            self.ultra_fast_animate("destination")
+            self.plan_leg("destination")
             
         elif target == "destination":
             # Face the destination when delivering
@@ -650,6 +837,378 @@ class SmartCourierSimulator:
             self.gui_queue.put(lambda: self.update_status("Delivery successful!"))
             self.gui_queue.put(lambda: messagebox.showinfo("Success", "Package delivered successfully!"))
             self.delivery_in_progress = False
+            
+        elif target == "route":
+            self.has_package = False
+            self.gui_queue.put(lambda: self.update_status("Route complete: all parcels delivered"))
+            self.delivery_in_progress = False
+    
+    def run_route(self, parcel_count):
+        """Carry several parcels on one route planned in the background from the courier's position"""
+        if self.delivery_in_progress:
+            return
+            
+        if self.router is None or self.courier is None:
+            messagebox.showerror("Error", "Please load map and place positions first")
+            return
+            
+        if self.router.tiled:
+            messagebox.showerror("Error", "Multi-stop routes need a map that fits in memory")
+            return
+            
+        try:
+            count = int(parcel_count)
+        except ValueError:
+            messagebox.showerror("Error", "Parcel count must be a whole number")
+            return
+            
+        # Every stop shares the courier's component, so every leg is reachable
+        grid_search = self.router.grid_search
+        component = grid_search.component_of(self.courier)
+        parcels = [
+            (grid_search.random_road_pixel(component), grid_search.random_road_pixel(component))
+            for _ in range(count)
+        ] if component else []
+        if not component or any(stop is None for parcel in parcels for stop in parcel):
+            self.update_status("No open road around the courier for a multi-stop route")
+            return
+            
+        self.delivery_in_progress = True
+        self.gui_queue.put(lambda: self.canvas.delete("path", "source", "destination", "fleet"))
+        for pickup, drop_off in parcels:
+            self.gui_queue.put(lambda position=pickup: self.draw_flag(position, self.SOURCE_COLOR, "source"))
+            self.gui_queue.put(lambda position=drop_off: self.draw_flag(position, self.DESTINATION_COLOR, "destination"))
+        self.gui_queue.put(lambda: self.update_status(f"Planning route for {count} parcels..."))
+        
+        planner = RoutePlanner(self.router, self.search_mode.get(), self.use_landmarks.get())
+        job = self.executor.submit(planner.plan, self.courier, parcels, self.ROUTE_TIME_LIMIT)
+        self.run_job(job, lambda plan: self.start_route(count, plan))
+    
+    def start_route(self, count, plan):
+        """Animate a planned multi-stop route"""
+        if not self.delivery_in_progress:
+            return
+            
+        if not plan["path"]:
+            self.update_status("Route complete: nothing to deliver")
+            self.delivery_in_progress = False
+            return
+            
+        self.set_path(plan["path"])
+        self.begin_leg(None)
+        self.interp_pos = self.courier_xy
+        self.draw_path(self.trajectory)
+        self.update_status(
+            f"Route: {count} parcels, {plan['length']}px | "
+            f"matrix {plan['matrix_time']:.2f}s, solve {plan['solve_time']:.2f}s"
+        )
+        self.ultra_fast_animate("route")
+    
+    def clock_text(self):
+        """Simulated time of day as HH:MM"""
+        minutes = int(self.clock // 60) % (24 * 60)
+        return f"{minutes // 60:02d}:{minutes % 60:02d}"
+    
+    def apply_traffic_zones(self):
+        """Load the configured congestion zones into the router's speed profiles"""
+        if self.router.tiled:
+            return
+        rows = self.router.grid_search.rows
+        cols = self.router.grid_search.cols
+        for (top, left, bottom, right), (from_hour, to_hour), speed in self.TRAFFIC_ZONES:
+            self.router.set_congestion(
+                int(top * rows), int(left * cols), int(bottom * rows), int(right * cols),
+                from_hour * 3600, to_hour * 3600, speed
+            )
+    
+    def begin_leg(self, goal):
+        """Start animating a new leg; None means the leg cannot be replanned
+        
+        D* Lite state is only seeded once a closure touches the leg.
+        """
+        self.leg_goal = goal
+        self.leg_time = self.clock
+        self.replanner = None
+        self.replanner_job = None
+        # Closures made while the leg was being planned stay pending, so the
+        # first frame replans around them
+    
+    def seed_replanner(self, grid_search, start, goal, cancel=None):
+        """Planning job: D* Lite state for a leg, from one distance wave off its goal"""
+        return DStarLite(grid_search, start, goal)
+    
+    def set_replanner(self, job):
+        """Take a finished seed for the current leg and apply the closures queued meanwhile
+        
+        A seed that failed or was cancelled is replaced by a fresh wave here.
+        """
+        if job is not self.replanner_job or not self.delivery_in_progress:
+            return
+        self.replanner_job = None
+        replanner = None
+        if not job.cancelled():
+            try:
+                replanner = job.result()
+            except Exception:
+                traceback.print_exc()
+        if replanner is None:
+            replanner = DStarLite(self.router.grid_search, self.courier, self.leg_goal)
+        self.replanner = replanner
+        # Between legs the next leg's first frame picks the closures up instead
+        if self.pending_closures and self.current_step < len(self.path) - 1:
+            self.replan()
+    
+    def replan(self):
+        """Repair the current leg around pending closures, starting from the courier
+        
+        Returns False while D* Lite is still being seeded; the closures stay
+        queued and set_replanner applies them when the seed arrives.
+        """
+        if self.leg_goal is None:
+            # Multi-stop routes are fixed, so only stop if the road ahead closed
+            self.pending_closures = []
+            grid_search = self.router.grid_search
+            if any(not grid_search.is_road(position) for position in self.path[self.current_step:]):
+                self.delivery_in_progress = False
+                self.gui_queue.put(lambda: self.update_status("Route blocked by a road closure"))
+            return True
+            
+        # Every change since the leg started is still pending, so a wave
+        # that already saw some of them is repaired all the same
+        if self.replanner is None:
+            if self.replanner_job is None:
+                job = self.executor.submit(
+                    self.seed_replanner, self.router.grid_search, self.courier, self.leg_goal
+                )
+                self.replanner_job = job
+                job.add_done_callback(lambda job: self.gui_queue.put(lambda: self.set_replanner(job)))
+            return False
+            
+        changed = self.pending_closures
+        self.pending_closures = []
+        self.replanner.update(changed, self.courier)
+        path = self.replanner.path(self.courier)
+        if not path:
+            self.delivery_in_progress = False
+            self.gui_queue.put(lambda: self.update_status("No open road to the target"))
+            return True
+            
+        self.set_path(path)
+        trajectory = self.trajectory
+        self.gui_queue.put(lambda: self.draw_path(trajectory))
+        self.gui_queue.put(lambda: self.update_status(f"Replanned around closure: {len(path)} steps left"))
+        return True
+    
+    def canvas_scale(self):
+        """(x, y) factors from map pixels to canvas pixels"""
+        return self.image.width / self.original_size[0], self.image.height / self.original_size[1]
+    
+    def canvas_position(self, position):
+        """Canvas (x, y) of a map (y, x)"""
+        scale_x, scale_y = self.canvas_scale()
+        return position[1] * scale_x, position[0] * scale_y
+    
+    def canvas_to_map(self, x, y):
+        """Map pixel (y, x) under a canvas point, or None outside the map"""
+        if self.image is None or self.router is None:
+            return None
+        map_y = int(y * self.original_size[1] / self.image.height)
+        map_x = int(x * self.original_size[0] / self.image.width)
+        if not (0 <= map_y < self.original_size[1] and 0 <= map_x < self.original_size[0]):
+            return None
+        return (map_y, map_x)
+    
+    def on_canvas_press(self, event):
+        """Start a closure stroke; it reopens roads when it starts on a closure"""
+        position = self.canvas_to_map(event.x, event.y)
+        if position is None or self.fleet is not None:
+            return
+            
+        if self.router.tiled:
+            self.update_status("Road closures need a map that fits in memory")
+            return
+            
+        self.closure_mode = self.router.grid_search.to_index(position) not in self.router.closed
+        self.apply_closure(position)
+    
+    def on_canvas_drag(self, event):
+        """Extend the current closure stroke"""
+        if self.closure_mode is None:
+            return
+        position = self.canvas_to_map(event.x, event.y)
+        if position is not None:
+            self.apply_closure(position)
+    
+    def on_canvas_release(self, event):
+        """Finish the current closure stroke, relabelling the map once for all of it"""
+        if self.closure_mode is None:
+            return
+        self.closure_mode = None
+        self.router.refresh()
+    
+    def apply_closure(self, position):
+        """Close or reopen the brush square around position and queue it for replanning"""
+        grid_search = self.router.grid_search
+        y, x = position
+        radius = self.CLOSURE_BRUSH
+        ys, xs = np.mgrid[
+            max(0, y - radius):min(grid_search.rows, y + radius + 1),
+            max(0, x - radius):min(grid_search.cols, x + radius + 1)
+        ]
+        changed = self.router.set_closed((ys * grid_search.cols + xs).ravel(), self.closure_mode, refresh=False)
+        if not len(changed):
+            return
+            
+        if self.delivery_in_progress:
+            self.pending_closures.extend(changed.tolist())
+        self.draw_closures()
+    
+    def draw_closures(self):
+        """Redraw all closed pixels as one translucent overlay image"""
+        self.canvas.delete("closure")
+        if not self.router.closed:
+            self.closure_tk = None
+            return
+            
+        grid_search = self.router.grid_search
+        closed = np.zeros(grid_search.size, dtype=bool)
+        closed[list(self.router.closed)] = True
+        overlay = np.zeros((grid_search.rows, grid_search.cols, 4), dtype=np.uint8)
+        overlay[closed.reshape(grid_search.rows, grid_search.cols)] = self.CLOSURE_COLOR
+        image = Image.fromarray(overlay, "RGBA").resize(self.image.size, Image.NEAREST)
+        self.closure_tk = ImageTk.PhotoImage(image)
+        self.canvas.create_image(0, 0, anchor=tk.NW, image=self.closure_tk, tags="closure")
+        for tag in ("path", "source", "destination", "courier"):
+            self.canvas.tag_raise(tag)
+    
+    def run_fleet(self, fleet_size):
+        """Simulate a fleet of couriers on a fixed-rate tick loop in the background"""
+        if self.delivery_in_progress:
+            return
+            
+        if self.router is None or not self.router.grid_search.road_count:
+            messagebox.showerror("Error", "Please load a map first")
+            return
+            
+        if self.router.tiled:
+            messagebox.showerror("Error", "Fleets need a map that fits in memory")
+            return
+            
+        try:
+            count = int(fleet_size)
+        except ValueError:
+            messagebox.showerror("Error", "Fleet size must be a whole number")
+            return
+            
+        grid_search = self.router.grid_search
+        positions = [grid_search.random_road_pixel() for _ in range(count)]
+        fleet = Fleet(
+            self.router, positions, self.search_mode.get(), self.use_landmarks.get(),
+            dispatch_method=self.DISPATCH_METHOD
+        )
+        for _ in range(count * self.FLEET_JOBS_PER_COURIER):
+            component = grid_search.random_component(min_size=2)
+            fleet.add_job(grid_search.random_road_pixel(component), grid_search.random_road_pixel(component))
+            
+        self.fleet = fleet
+        self.fleet_frame = None
+        self.delivery_in_progress = True
+        self.clear_fleet()
+        
+        # The ticker sleeps between ticks for the whole run, so it gets its own
+        # thread instead of holding one of the planning workers
+        self.fleet_cancel = CancelToken()
+        threading.Thread(
+            target=self.tick_fleet, args=(fleet, self.fleet_cancel), name="fleet", daemon=True
+        ).start()
+    
+    def tick_fleet(self, fleet, cancel):
+        """Fleet thread: tick until the fleet finishes or cancel is set, posting frames to the GUI"""
+        period = 1.0 / self.FLEET_TICK_RATE
+        try:
+            while not cancel.cancelled and not fleet.finished():
+                tick_start = time.time()
+                fleet.tick(1 + self.speed // 5)
+                frame = (fleet.positions(), fleet.state.copy())
+                self.gui_queue.put(lambda frame=frame: self.show_fleet_frame(fleet, frame))
+                time.sleep(max(0, period - (time.time() - tick_start)))
+        except Exception as e:
+            traceback.print_exc()
+            self.gui_queue.put(lambda error=e: self.fail_fleet(fleet, error))
+            return
+        if not cancel.cancelled:
+            self.gui_queue.put(lambda: self.finish_fleet(fleet))
+    
+    def show_fleet_frame(self, fleet, frame):
+        """Keep the newest frame of the running fleet; the render loop draws it once"""
+        if fleet is self.fleet:
+            self.fleet_frame = frame
+    
+    def fail_fleet(self, fleet, error):
+        """Stop a fleet run whose tick raised"""
+        if fleet is not self.fleet:
+            return
+        self.delivery_in_progress = False
+        self.fleet = None
+        self.fleet_cancel = None
+        messagebox.showerror("Error", f"Fleet simulation failed: {str(error)}")
+    
+    def finish_fleet(self, fleet):
+        """Report a fleet run that ran to completion"""
+        if fleet is not self.fleet:
+            return
+        self.delivery_in_progress = False
+        self.fleet = None
+        self.fleet_cancel = None
+        self.update_status(
+            f"Fleet done: {fleet.delivered} delivered, {fleet.failed} unreachable, "
+            f"pickup distance {fleet.pickup_length}px, dispatch {fleet.dispatch_time:.2f}s"
+        )
+    
+    def clear_fleet(self):
+        """Remove single-courier and fleet markers before a fleet run"""
+        self.canvas.delete("courier", "path", "source", "destination", "fleet")
+        self.courier_items = None
+        self.fleet_items = []
+    
+    def draw_fleet(self):
+        """Move fleet markers to the latest simulated positions"""
+        frame = self.fleet_frame
+        self.fleet_frame = None
+        if frame is None or self.image is None or self.fleet is None:
+            return
+            
+        positions, states = frame
+        scale_x = self.image.width / self.original_size[0]
+        scale_y = self.image.height / self.original_size[1]
+        xs = (positions[:, 1] * scale_x).tolist()
+        ys = (positions[:, 0] * scale_y).tolist()
+        colors = [self.CARRYING_COLOR if state == TO_DROPOFF else self.COURIER_COLOR for state in states.tolist()]
+        size = self.FLEET_COURIER_SIZE
+        
+        # Markers are created once and then only moved and recoloured
+        if not self.fleet_items:
+            self.fleet_items = [
+                self.canvas.create_oval(0, 0, 0, 0, outline="white", tags="fleet")
+                for _ in range(len(positions))
+            ]
+            self.fleet_colors = [None] * len(positions)
+            
+        for number, item in enumerate(self.fleet_items):
+            x = xs[number]
+            y = ys[number]
+            self.canvas.coords(item, x - size, y - size, x + size, y + size)
+            if colors[number] != self.fleet_colors[number]:
+                self.canvas.itemconfig(item, fill=colors[number])
+                self.fleet_colors[number] = colors[number]
+                
+        fleet = self.fleet
+        dispatch = fleet.last_dispatch
+        dispatch_text = f" | dispatch {dispatch['latency'] * 1000:.0f}ms" if dispatch else ""
+        self.update_status(
+            f"Fleet: {fleet.delivered} delivered | {len(fleet.pending)} waiting | "
+            f"{fleet.failed} unreachable{dispatch_text}"
+        )
     
     def update_status(self, message):
         """Update status label"""
@@ -664,3 +1223,6 @@ if __name__ == "__main__":
     root = tk.Tk()
     app = SmartCourierSimulator(root)
     root.mainloop()
+    app.executor.shutdown()
+    if app.router is not None:
+        app.router.close()
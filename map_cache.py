@@ -0,0 +1,96 @@
+import hashlib
+import json
+import os
+import numpy as np
+
+# Bump when the on-disk layout changes so stale caches are rebuilt
+CACHE_VERSION = 2
+
+# Arrays a compiled map may hold, in the layout CourierRouter.to_arrays uses
+ARRAY_NAMES = ("road_mask", "labels", "component_sizes", "landmarks", "distances", "costs")
+
+
+class CompiledMap:
+    """Preprocessed road model stored next to a map image as raw .bin arrays
+
+    The directory is keyed by the image's content hash, the road colour
+    range and the terrain cost bands. Arrays are opened with np.memmap,
+    so a cache hit costs a few page faults instead of a decode and a
+    rebuild, and every process that opens the same map shares the pages
+    through the OS file cache.
+    """
+
+    @staticmethod
+    def cache_path(image_path):
+        """Compiled map directory stored next to the map image"""
+        return f"{image_path}.map"
+
+    @staticmethod
+    def digest(image_path, color_range, terrain_costs=()):
+        """Key for the image contents plus the colour settings that classified it"""
+        hasher = hashlib.sha1()
+        with open(image_path, "rb") as image_file:
+            for block in iter(lambda: image_file.read(1 << 20), b""):
+                hasher.update(block)
+        settings = [
+            CACHE_VERSION,
+            [list(bound) for bound in color_range],
+            [[[list(bound) for bound in band], cost] for band, cost in terrain_costs],
+        ]
+        hasher.update(json.dumps(settings).encode())
+        return hasher.hexdigest()
+
+    @classmethod
+    def load(cls, image_path, color_range, terrain_costs=(), landmark_count=0):
+        """Memory-map the compiled arrays, or return None if missing or stale
+
+        A non-zero landmark_count must match the count the cache was built
+        with; zero accepts any, and the caller may ignore the landmarks.
+        """
+        directory = cls.cache_path(image_path)
+        try:
+            with open(os.path.join(directory, "meta.json")) as meta_file:
+                meta = json.load(meta_file)
+            key = cls.digest(image_path, color_range, terrain_costs)
+            if meta.get("version") != CACHE_VERSION or meta.get("key") != key:
+                return None
+            if landmark_count and meta.get("landmark_count") != landmark_count:
+                return None
+
+            arrays = {}
+            for name, (shape, dtype) in meta["arrays"].items():
+                arrays[name] = np.memmap(
+                    os.path.join(directory, f"{name}.bin"), dtype=np.dtype(dtype),
+                    mode="r", shape=tuple(shape)
+                )
+            return arrays
+        except (OSError, KeyError, TypeError, ValueError):
+            return None
+
+    @classmethod
+    def save(cls, image_path, color_range, arrays, terrain_costs=(), landmark_count=0):
+        """Write arrays under the image's key; a read-only location just skips caching"""
+        directory = cls.cache_path(image_path)
+        meta_path = os.path.join(directory, "meta.json")
+        try:
+            os.makedirs(directory, exist_ok=True)
+
+            # Drop the old key first so a half-written cache is never trusted
+            if os.path.exists(meta_path):
+                os.remove(meta_path)
+
+            layout = {}
+            for name in ARRAY_NAMES:
+                if name not in arrays:
+                    continue
+                array = np.ascontiguousarray(arrays[name])
+                array.tofile(os.path.join(directory, f"{name}.bin"))
+                layout[name] = (list(array.shape), array.dtype.str)
+
+            key = cls.digest(image_path, color_range, terrain_costs)
+            meta = {"version": CACHE_VERSION, "key": key, "landmark_count": landmark_count, "arrays": layout}
+            with open(meta_path + ".tmp", "w") as meta_file:
+                json.dump(meta, meta_file)
+            os.replace(meta_path + ".tmp", meta_path)
+        except OSError:
+            pass
@@ -0,0 +1,189 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from batch_route import attach_arrays, share_arrays
+from courier_router import CourierRouter
+
+# Router and cancel generation owned by each search process
+_worker_router = None
+_worker_segments = []
+_worker_generation = None
+
+
+class CancelToken:
+    """Flag a job's owner sets and its search polls"""
+
+    def __init__(self):
+        self.event = threading.Event()
+
+    def cancel(self):
+        self.event.set()
+
+    @property
+    def cancelled(self):
+        return self.event.is_set()
+
+
+class GenerationToken:
+    """Cancel token for process searches: set once the shared generation counter moves on
+
+    Cancelling one process job therefore cancels every process search
+    submitted in the same generation.
+    """
+
+    def __init__(self, counter, generation):
+        self.counter = counter
+        self.generation = generation
+
+    def cancel(self):
+        with self.counter.get_lock():
+            if self.counter.value == self.generation:
+                self.counter.value += 1
+
+    @property
+    def cancelled(self):
+        return self.counter.value != self.generation
+
+
+def init_search_worker(spec, generation):
+    """Pool initializer: attach the shared road model once per process"""
+    global _worker_router, _worker_segments, _worker_generation
+    _worker_segments, arrays = attach_arrays(spec)
+    _worker_router = CourierRouter.from_arrays(arrays)
+    _worker_generation = generation
+
+
+def search_job(query, generation):
+    """Run one find_path query in a search process"""
+    start, goal, mode, use_landmarks, smooth = query
+    cancel = GenerationToken(_worker_generation, generation)
+    return _worker_router.find_path(start, goal, mode, use_landmarks, smooth, cancel=cancel)
+
+
+class PlanningJob:
+    """A submitted job: its future plus the token its search polls"""
+
+    def __init__(self, future, cancel):
+        self.future = future
+        self.cancel_token = cancel
+
+    def cancel(self):
+        """Stop the job: never start it if queued, else make its search raise SearchCancelled"""
+        self.cancel_token.cancel()
+        self.future.cancel()
+
+    def cancelled(self):
+        return self.cancel_token.cancelled or self.future.cancelled()
+
+    def done(self):
+        return self.future.done()
+
+    def result(self, timeout=None):
+        return self.future.result(timeout)
+
+    def add_done_callback(self, callback):
+        """Call callback(job) from the worker once the job finishes, fails or is cancelled"""
+        self.future.add_done_callback(lambda future: callback(self))
+
+
+class PlanningExecutor:
+    """Background executor for planning work with cooperative cancellation
+
+    Jobs run on a small thread pool and receive a CancelToken as cancel=,
+    which the searches poll. With processes > 0, plain path searches run
+    in a process pool instead, each process holding the router's arrays
+    through shared memory; the pool is rebuilt when the road mask changes.
+    Timed traffic queries, tiled maps and routes the parent's cache
+    already holds stay on threads, and process results are copied into
+    that cache, so prefetching warms the cache the GUI reads.
+    """
+
+    def __init__(self, workers=2, processes=0):
+        self.threads = ThreadPoolExecutor(workers, thread_name_prefix="planner")
+        self.processes = processes
+        self.jobs = set()
+        self.lock = threading.Lock()
+
+        self.pool = None
+        self.pool_key = None  # (router, mask fingerprint) the pool's arrays came from
+        self.segments = []
+        self.generation = multiprocessing.Value("i", 0) if processes else None
+
+    def track(self, job):
+        """Keep a job cancellable until it finishes"""
+        with self.lock:
+            self.jobs.add(job)
+        job.add_done_callback(self.untrack)
+        return job
+
+    def untrack(self, job):
+        with self.lock:
+            self.jobs.discard(job)
+
+    def submit(self, work, *args, **kwargs):
+        """Run work(*args, cancel=token, **kwargs) on a planning thread; returns a PlanningJob"""
+        token = CancelToken()
+        future = self.threads.submit(work, *args, cancel=token, **kwargs)
+        return self.track(PlanningJob(future, token))
+
+    def submit_search(self, router, start, goal, mode="A*", use_landmarks=True, smooth=False, departure=None):
+        """Run router.find_path in the background; returns a PlanningJob for the path"""
+        timed = departure is not None and router.traffic is not None
+        if not self.processes or router.tiled or timed:
+            return self.submit(router.find_path, start, goal, mode, use_landmarks, smooth, departure)
+        key = router.route_key(start, goal, mode, use_landmarks, smooth)
+        if key in router.route_cache:
+            return self.submit(router.find_path, start, goal, mode, use_landmarks, smooth, departure)
+
+        self.attach(router)
+        token = GenerationToken(self.generation, self.generation.value)
+        query = (tuple(start), tuple(goal), mode, use_landmarks, smooth)
+        future = self.pool.submit(search_job, query, token.generation)
+        future.add_done_callback(lambda future: self.keep_route(router, key, future))
+        return self.track(PlanningJob(future, token))
+
+    def keep_route(self, router, key, future):
+        """Copy a finished process search into the parent's route cache"""
+        if future.cancelled() or future.exception() is not None:
+            return
+        path = future.result()
+        if path:
+            router.route_cache.put(key, path)
+
+    def attach(self, router):
+        """Share router's arrays with a fresh process pool unless the pool already has them"""
+        key = (router, router.grid_search.fingerprint)
+        if self.pool is not None and self.pool_key == key:
+            return
+        self.release_pool()
+        self.segments, spec = share_arrays(router.to_arrays())
+        self.pool = ProcessPoolExecutor(
+            self.processes, initializer=init_search_worker, initargs=(spec, self.generation)
+        )
+        self.pool_key = key
+
+    def cancel_all(self):
+        """Cancel every queued or running job"""
+        with self.lock:
+            jobs = list(self.jobs)
+        for job in jobs:
+            job.cancel()
+
+    def release_pool(self):
+        """Shut the process pool down, cancelling its searches, and free its shared memory"""
+        if self.pool is not None:
+            GenerationToken(self.generation, self.generation.value).cancel()
+            self.pool.shutdown(wait=True, cancel_futures=True)
+            self.pool = None
+            self.pool_key = None
+        for segment in self.segments:
+            segment.close()
+            segment.unlink()
+        self.segments = []
+
+    def shutdown(self):
+        """Cancel everything and stop the workers"""
+        self.cancel_all()
+        self.threads.shutdown(wait=False, cancel_futures=True)
+        self.release_pool()
@@ -0,0 +1,422 @@
+import heapq
+from collections import deque
+import numpy as np
+
+from instrumentation import stats
+from line_of_sight import line_is_clear, line_path
+
+# 8-neighbourhood as (dy, dx), orthogonal directions first
+NEIGHBOR_STEPS = ((0, 1), (1, 0), (0, -1), (-1, 0), (1, 1), (1, -1), (-1, -1), (-1, 1))
+
+SNAP_LIMIT = 4096    # Pixels a snap may visit before the query falls back to grid A*
+ROUTE_STRETCH = 1.25  # Graph routes longer than this times the distance lower bound fall back too
+
+
+def thin_mask(mask):
+    """Zhang-Suen thinning of a boolean mask to a one pixel wide skeleton"""
+    image = np.zeros((mask.shape[0] + 2, mask.shape[1] + 2), dtype=np.uint8)
+    image[1:-1, 1:-1] = mask
+
+    while True:
+        changed = False
+        for first_pass in (True, False):
+            # Neighbours clockwise from north: P2 .. P9
+            p2 = image[:-2, 1:-1]
+            p3 = image[:-2, 2:]
+            p4 = image[1:-1, 2:]
+            p5 = image[2:, 2:]
+            p6 = image[2:, 1:-1]
+            p7 = image[2:, :-2]
+            p8 = image[1:-1, :-2]
+            p9 = image[:-2, :-2]
+            ring = (p2, p3, p4, p5, p6, p7, p8, p9, p2)
+
+            count = p2 + p3 + p4 + p5 + p6 + p7 + p8 + p9
+            transitions = sum((ring[i] == 0) & (ring[i + 1] == 1) for i in range(8))
+            if first_pass:
+                side = ((p2 & p4 & p6) == 0) & ((p4 & p6 & p8) == 0)
+            else:
+                side = ((p2 & p4 & p8) == 0) & ((p2 & p6 & p8) == 0)
+
+            removable = (image[1:-1, 1:-1] == 1) & (count >= 2) & (count <= 6) & (transitions == 1) & side
+            if removable.any():
+                image[1:-1, 1:-1][removable] = 0
+                changed = True
+        if not changed:
+            break
+
+    return image[1:-1, 1:-1].astype(bool)
+
+
+class RoadGraph:
+    """Road skeleton contracted to junction/dead-end nodes joined by weighted corridors"""
+
+    def __init__(self, grid_search):
+        self.grid_search = grid_search
+        self.expanded = 0   # Intersections, or pixels on fallback, expanded by the latest search
+        self.open_peak = 0  # Largest open list of that search
+        self.rows = grid_search.rows
+        self.cols = grid_search.cols
+        self.skeleton = thin_mask(grid_search.road_mask)
+
+        self.neighbor_bits = self.link_skeleton()
+        self.node_of = np.full(grid_search.size, -1, dtype=np.int32)
+        self.edge_of = np.full(grid_search.size, -1, dtype=np.int32)
+        self.edge_offset = np.zeros(grid_search.size, dtype=np.int32)
+        self.edge_position = np.zeros(grid_search.size, dtype=np.int32)
+
+        self.nodes = []        # flat pixel index per node
+        self.edges = []        # (node_a, node_b, cost) per edge
+        self.edge_chains = []  # flat pixel indices from node_a to node_b
+        self.adjacency = []    # per node: list of (neighbor_node, cost, edge_id)
+        self.extract_graph()
+
+        # Node coordinates for the search heuristic
+        self.node_y, self.node_x = (
+            coordinate.tolist() for coordinate in np.divmod(np.array(self.nodes, dtype=np.int64), self.cols)
+        )
+
+    def link_skeleton(self):
+        """Return per-pixel bit sets of usable skeleton links, one bit per NEIGHBOR_STEPS entry
+
+        Links never join different road components, and diagonal links need
+        a road pixel at one of the two corners so they expand to 4-connected
+        steps that stay on the road.
+        """
+        rows, cols = self.rows, self.cols
+        skeleton = self.skeleton
+        labels = self.grid_search.labels
+        road = self.grid_search.road_mask
+        bits = np.zeros((rows, cols), dtype=np.uint8)
+
+        for bit, (dy, dx) in enumerate(NEIGHBOR_STEPS):
+            here = (slice(max(0, -dy), rows - max(0, dy)), slice(max(0, -dx), cols - max(0, dx)))
+            there = (slice(max(0, dy), rows - max(0, -dy)), slice(max(0, dx), cols - max(0, -dx)))
+            linked = skeleton[here] & skeleton[there] & (labels[here] == labels[there])
+            if dy and dx:
+                corner_y = (there[0], here[1])
+                corner_x = (here[0], there[1])
+                linked &= road[corner_y] | road[corner_x]
+            bits[here] |= linked.astype(np.uint8) << bit
+
+        return bits.tobytes()
+
+    def step_offsets(self):
+        """Flat index offsets and 4-connected costs for each NEIGHBOR_STEPS entry"""
+        return [(dy * self.cols + dx, 2 if dy and dx else 1) for dy, dx in NEIGHBOR_STEPS]
+
+    def extract_graph(self):
+        """Turn skeleton pixels of degree != 2 into nodes and trace the corridors between them"""
+        bits = self.neighbor_bits
+        degree = [bin(value).count("1") for value in range(256)]
+        skeleton_pixels = np.flatnonzero(self.skeleton.ravel())
+
+        for index in skeleton_pixels.tolist():
+            if degree[bits[index]] != 2:
+                self.add_node(index)
+
+        for node in range(len(self.nodes)):
+            self.trace_from(node)
+
+        # Closed loops have no junctions; promote one pixel of each to a node
+        for index in skeleton_pixels.tolist():
+            if self.node_of[index] < 0 and self.edge_of[index] < 0:
+                self.trace_from(self.add_node(index))
+
+    def add_node(self, index):
+        """Register a skeleton pixel as a graph node"""
+        node = len(self.nodes)
+        self.nodes.append(index)
+        self.adjacency.append([])
+        self.node_of[index] = node
+        return node
+
+    def trace_from(self, node):
+        """Follow every untraced corridor leaving a node until the next node"""
+        bits = self.neighbor_bits
+        steps = self.step_offsets()
+        start = self.nodes[node]
+
+        for bit, (offset, cost) in enumerate(steps):
+            if not bits[start] >> bit & 1:
+                continue
+            current = start + offset
+            if self.edge_of[current] >= 0:
+                continue  # Corridor already traced from its other end
+            if self.node_of[current] >= 0 and self.node_of[current] < node:
+                continue  # Node-to-node link already added from the other node
+
+            chain = [start, current]
+            costs = [0, cost]
+            previous = start
+            while self.node_of[current] < 0:
+                # Degree-2 pixel: continue through the link we did not come from
+                for next_bit, (next_offset, next_cost) in enumerate(steps):
+                    candidate = current + next_offset
+                    if bits[current] >> next_bit & 1 and candidate != previous:
+                        break
+                else:
+                    break
+                previous, current = current, candidate
+                chain.append(current)
+                costs.append(costs[-1] + next_cost)
+
+            end = self.node_of[current]
+            if end < 0:
+                continue
+            self.add_edge(node, int(end), chain, costs)
+
+    def add_edge(self, node_a, node_b, chain, costs):
+        """Store a corridor and index its interior pixels"""
+        edge = len(self.edges)
+        total = costs[-1]
+        self.edges.append((node_a, node_b, total))
+        self.edge_chains.append(np.array(chain, dtype=np.int64))
+        interior = chain[1:-1]
+        self.edge_of[interior] = edge
+        self.edge_offset[interior] = costs[1:-1]
+        self.edge_position[interior] = np.arange(1, len(chain) - 1)
+        self.adjacency[node_a].append((node_b, total, edge))
+        if node_b != node_a:
+            self.adjacency[node_b].append((node_a, total, edge))
+
+    def snap(self, index, limit=SNAP_LIMIT):
+        """BFS over the road from a pixel to the nearest skeleton pixel
+
+        Returns (skeleton_index, approach) where approach runs from the
+        pixel to the skeleton pixel inclusive, or (None, None) when none is
+        found within limit visited pixels.
+        """
+        skeleton = self.skeleton.ravel()
+        passable = self.grid_search.passable
+        cols = self.cols
+        size = self.grid_search.size
+        came_from = {index: None}
+        queue = deque([index])
+
+        while queue:
+            current = queue.popleft()
+            if skeleton[current]:
+                approach = []
+                while current is not None:
+                    approach.append(current)
+                    current = came_from[current]
+                approach.reverse()
+                return approach[-1], approach
+
+            x = current % cols
+            for neighbor, valid in (
+                (current + 1, x < cols - 1),
+                (current + cols, current < size - cols),
+                (current - 1, x > 0),
+                (current - cols, current >= cols),
+            ):
+                if valid and passable[neighbor] and neighbor not in came_from:
+                    came_from[neighbor] = current
+                    queue.append(neighbor)
+            if len(came_from) > limit:
+                break
+
+        return None, None
+
+    def anchors(self, index):
+        """Return [(node, cost, edge, toward_end)] reaching the graph from a skeleton pixel
+
+        toward_end says whether the node is the far end (node_b) of the edge.
+        """
+        node = self.node_of[index]
+        if node >= 0:
+            return [(int(node), 0, -1, False)]
+        edge = int(self.edge_of[index])
+        node_a, node_b, total = self.edges[edge]
+        offset = int(self.edge_offset[index])
+        return [(node_a, offset, edge, False), (node_b, total - offset, edge, True)]
+
+    def search(self, start, goal, landmarks=None, cancel=None):
+        """Return a (y, x) path from start (exclusive) to goal (inclusive), or []
+
+        Routes along the skeleton graph and then pulls the route taut with
+        straight lines, so paths are near but not always exactly shortest.
+        Falls back to the pixel search, passing landmarks and cancel on, when
+        a point cannot be snapped onto the graph or the route is longer than
+        ROUTE_STRETCH times a lower bound on the distance (Manhattan, or ALT
+        when landmarks are given).
+        """
+        self.expanded = 0
+        self.open_peak = 0
+        grid_search = self.grid_search
+        if not grid_search.connected(start, goal) or tuple(start) == tuple(goal):
+            return []
+
+        source = grid_search.to_index(start)
+        target = grid_search.to_index(goal)
+        source_skeleton, source_approach = self.snap(source)
+        target_skeleton, target_approach = self.snap(target)
+        route = None
+        if source_skeleton is not None and target_skeleton is not None:
+            route = self.route_between(source_skeleton, target_skeleton)
+
+        if route is not None:
+            pixels = source_approach + route + target_approach[::-1]
+            path = self.expand_diagonals(pixels)[1:]
+            bound = abs(int(start[0]) - int(goal[0])) + abs(int(start[1]) - int(goal[1]))
+            if landmarks is not None:
+                bound = max(bound, landmarks.lower_bound(source, target))
+            if len(path) > ROUTE_STRETCH * bound:
+                path = self.pull_taut(tuple(start), path)
+            if len(path) <= ROUTE_STRETCH * bound:
+                return path
+
+        path = grid_search.search(start, goal, landmarks, cancel)
+        self.expanded = grid_search.expanded
+        self.open_peak = grid_search.open_peak
+        return path
+
+    def pull_taut(self, start, path):
+        """Replace stretches of a path with clear straight lines, which are never longer
+
+        From each anchor the farthest point with a clear line is found by
+        galloping and then bisecting over the path.
+        """
+        points = [start] + path
+        last = len(points) - 1
+        grid_search = self.grid_search
+        result = []
+        anchor = 0
+        while anchor < last:
+            clear = anchor + 1
+            step = 2
+            while clear < last:
+                probe = min(anchor + step, last)
+                if not line_is_clear(grid_search, points[anchor], points[probe]):
+                    break
+                clear = probe
+                step *= 2
+            low, high = clear, min(anchor + step, last)
+            while low < high:
+                middle = (low + high + 1) // 2
+                if line_is_clear(grid_search, points[anchor], points[middle]):
+                    low = middle
+                else:
+                    high = middle - 1
+            if low == anchor + 1:
+                result.append(points[low])
+            else:
+                result += line_path(points[anchor], points[low])
+            anchor = low
+        return result
+
+    def route_between(self, source, target):
+        """Flat skeleton pixels from source to target through the graph, or None"""
+        if source == target:
+            return [source]
+
+        best_cost = None
+        best_route = None
+
+        # Both points on the same corridor: walking along it is a candidate
+        source_edge = int(self.edge_of[source])
+        if source_edge >= 0 and source_edge == self.edge_of[target]:
+            best_cost = abs(int(self.edge_offset[source]) - int(self.edge_offset[target]))
+            first = int(self.edge_position[source])
+            last = int(self.edge_position[target])
+            chain = self.edge_chains[source_edge]
+            if first <= last:
+                best_route = chain[first:last + 1].tolist()
+            else:
+                best_route = chain[last:first + 1][::-1].tolist()
+
+        target_anchors = {}
+        for node, cost, edge, toward_end in self.anchors(target):
+            if node not in target_anchors or cost < target_anchors[node][0]:
+                target_anchors[node] = (cost, edge, toward_end)
+
+        # Multi-source A* over intersections only; corridor costs count
+        # 4-connected steps, so Manhattan distance to the target is admissible
+        target_y, target_x = divmod(target, self.cols)
+        node_y = self.node_y
+        node_x = self.node_x
+        distance = {}
+        parent = {}
+        open_set = []
+        for node, cost, edge, toward_end in self.anchors(source):
+            if node not in distance or cost < distance[node]:
+                distance[node] = cost
+                parent[node] = (None, edge, toward_end)
+                estimate = abs(node_y[node] - target_y) + abs(node_x[node] - target_x)
+                heapq.heappush(open_set, (cost + estimate, cost, node))
+
+        best_node = None
+        track_peak = stats.enabled
+        while open_set:
+            if track_peak and len(open_set) > self.open_peak:
+                self.open_peak = len(open_set)
+            estimate, cost, node = heapq.heappop(open_set)
+            if cost > distance[node]:
+                continue
+            if best_cost is not None and estimate >= best_cost:
+                break
+            self.expanded += 1
+            if node in target_anchors:
+                total = cost + target_anchors[node][0]
+                if best_cost is None or total < best_cost:
+                    best_cost = total
+                    best_node = node
+            for neighbor, edge_cost, edge in self.adjacency[node]:
+                new_cost = cost + edge_cost
+                if neighbor not in distance or new_cost < distance[neighbor]:
+                    distance[neighbor] = new_cost
+                    parent[neighbor] = (node, edge, None)
+                    estimate = abs(node_y[neighbor] - target_y) + abs(node_x[neighbor] - target_x)
+                    heapq.heappush(open_set, (new_cost + estimate, new_cost, neighbor))
+
+        if best_node is None:
+            return best_route
+
+        # Walk node parents back to the source, then splice corridor chains
+        node_route = [best_node]
+        while parent[node_route[-1]][0] is not None:
+            node_route.append(parent[node_route[-1]][0])
+        node_route.reverse()
+
+        _, edge, toward_end = parent[node_route[0]]
+        if edge < 0:
+            route = [source]
+        else:
+            chain = self.edge_chains[edge]
+            position = int(self.edge_position[source])
+            route = chain[position:].tolist() if toward_end else chain[:position + 1][::-1].tolist()
+
+        for previous, node in zip(node_route, node_route[1:]):
+            edge = parent[node][1]
+            chain = self.edge_chains[edge]
+            forward = self.edges[edge][0] == previous
+            route += (chain if forward else chain[::-1])[1:].tolist()
+
+        _, edge, toward_end = target_anchors[best_node]
+        if edge >= 0:
+            chain = self.edge_chains[edge]
+            position = int(self.edge_position[target])
+            route += (chain[position:][::-1] if toward_end else chain[:position + 1])[1:].tolist()
+        return route
+
+    def expand_diagonals(self, pixels):
+        """Turn flat indices into a 4-connected (y, x) list, inserting road corners for diagonal steps"""
+        cols = self.cols
+        passable = self.grid_search.passable
+        path = []
+        previous = None
+        for index in pixels:
+            if index == previous:
+                continue
+            y, x = divmod(index, cols)
+            if previous is not None:
+                previous_y, previous_x = divmod(previous, cols)
+                if previous_y != y and previous_x != x:
+                    corner = previous_y * cols + x
+                    if not passable[corner]:
+                        corner = y * cols + previous_x
+                    path.append(divmod(corner, cols))
+            path.append((y, x))
+            previous = index
+        return path
@@ -0,0 +1,75 @@
+import threading
+from collections import OrderedDict
+
+
+class RouteCache:
+    """Bounded LRU cache of paths, evicting by total stored path length
+
+    Safe to share between the GUI thread and planning workers.
+    """
+
+    def __init__(self, max_total_length=500_000):
+        self.max_total_length = max_total_length
+        self.routes = OrderedDict()
+        self.total_length = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.routes)
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.routes
+
+    def get(self, key):
+        """Return the cached path for key, or None; counts a hit or a miss"""
+        with self.lock:
+            path = self.routes.get(key)
+            if path is None:
+                self.misses += 1
+                return None
+            self.routes.move_to_end(key)
+            self.hits += 1
+            return path
+
+    def put(self, key, path):
+        """Store a path and evict least recently used routes until within budget"""
+        if len(path) > self.max_total_length:
+            return
+        with self.lock:
+            previous = self.routes.pop(key, None)
+            if previous is not None:
+                self.total_length -= len(previous)
+            self.routes[key] = path
+            self.total_length += len(path)
+
+            while self.total_length > self.max_total_length:
+                _, evicted = self.routes.popitem(last=False)
+                self.total_length -= len(evicted)
+
+    def discard(self, key):
+        """Drop one route if it is cached"""
+        with self.lock:
+            path = self.routes.pop(key, None)
+            if path is not None:
+                self.total_length -= len(path)
+
+    def clear(self):
+        """Drop every cached route; counters are kept"""
+        with self.lock:
+            self.routes.clear()
+            self.total_length = 0
+
+    def stats(self):
+        """Return hit/miss counters and current occupancy"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "routes": len(self.routes),
+                "total_length": self.total_length,
+            }
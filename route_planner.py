@@ -0,0 +1,241 @@
+import time
+import numpy as np
+
+from grid_search import SearchCancelled
+
+
+class RoutePlanner:
+    """Order pickups and drop-offs for one courier carrying several parcels
+
+    Stop 0 is the courier's start; parcel p has its pickup at stop 2p+1
+    and its drop-off at stop 2p+2. Routes are open (no return to start)
+    and every pickup must come before its drop-off.
+    """
+
+    def __init__(self, router, mode="A*", use_landmarks=True):
+        self.router = router
+        self.grid_search = router.grid_search
+        self.mode = mode
+        self.use_landmarks = use_landmarks
+
+    def distance_matrix(self, stops, cancel=None):
+        """Road distances between all stops, one early-terminating BFS wave per stop
+
+        Unreachable pairs get the map size as their distance.
+        """
+        indices = np.array([self.grid_search.to_index(stop) for stop in stops], dtype=np.int64)
+        unreachable = self.grid_search.size
+        matrix = np.full((len(stops), len(stops)), unreachable, dtype=np.int64)
+        for row, index in enumerate(indices.tolist()):
+            if cancel is not None and cancel.cancelled:
+                raise SearchCancelled()
+            # Distances are symmetric, so only stops not yet known are targets
+            distance = self.grid_search.distance_field([index], indices[row:])
+            reach = distance[indices[row:]]
+            known = reach >= 0
+            matrix[row, row:][known] = reach[known]
+            matrix[row:, row][known] = reach[known]
+        return matrix
+
+    def plan(self, start, parcels, time_limit=1.0, cancel=None):
+        """Plan a route from start through every (pickup, drop_off) in parcels
+
+        Returns a dict with "order" (stop numbers), "stops" ((y, x) per stop
+        number), "length" of the path actually driven, and "path", the
+        concatenated (y, x) path for the animator, plus matrix and solve
+        timings. Modes that are not exact can make length exceed the BFS
+        distances the order was solved on. A set cancel token stops
+        planning with SearchCancelled.
+        """
+        stops = [tuple(start)]
+        for pickup, drop_off in parcels:
+            stops += [tuple(pickup), tuple(drop_off)]
+
+        started = time.perf_counter()
+        matrix = self.distance_matrix(stops, cancel)
+        matrix_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        order = self.solve(matrix, time_limit, cancel)
+        solve_time = time.perf_counter() - started
+
+        path = []
+        for previous, stop in zip(order, order[1:]):
+            path += self.router.find_path(
+                stops[previous], stops[stop], self.mode, self.use_landmarks, cancel=cancel
+            )
+
+        return {
+            "order": order,
+            "stops": stops,
+            "length": len(path),
+            "path": path,
+            "matrix_time": matrix_time,
+            "solve_time": solve_time,
+        }
+
+    def solve(self, matrix, time_limit=1.0, cancel=None):
+        """Nearest insertion followed by 2-opt and Or-opt, all respecting precedence"""
+        order = self.nearest_insertion(matrix)
+        deadline = time.perf_counter() + time_limit
+        distance = matrix.tolist()
+
+        improved = True
+        while improved and time.perf_counter() < deadline:
+            if cancel is not None and cancel.cancelled:
+                raise SearchCancelled()
+            improved = self.two_opt(distance, order, deadline)
+            improved = self.or_opt(distance, order, deadline) or improved
+        return order
+
+    @staticmethod
+    def partner(stop):
+        """The other stop of the same parcel"""
+        return stop + 1 if stop % 2 else stop - 1
+
+    @staticmethod
+    def route_length(distance, order):
+        """Total distance along an ordered list of stops"""
+        return sum(distance[a][b] for a, b in zip(order, order[1:]))
+
+    def nearest_insertion(self, matrix):
+        """Insert parcels one at a time, nearest pickup first, at the cheapest feasible positions"""
+        parcel_count = (len(matrix) - 1) // 2
+        order = [0]
+        pickups = np.arange(parcel_count) * 2 + 1
+        closest = matrix[0, pickups].astype(np.float64)
+        remaining = np.ones(parcel_count, dtype=bool)
+
+        for _ in range(parcel_count):
+            parcel = int(np.argmin(np.where(remaining, closest, np.inf)))
+            remaining[parcel] = False
+            pickup = 2 * parcel + 1
+            drop_off = pickup + 1
+            order = self.insert_parcel(matrix, order, pickup, drop_off)
+            closest = np.minimum(closest, matrix[pickup, pickups])
+            closest = np.minimum(closest, matrix[drop_off, pickups])
+        return order
+
+    def insert_parcel(self, matrix, order, pickup, drop_off):
+        """Insert pickup then drop_off into order where the added distance is smallest"""
+        route = np.array(order)
+        following = np.append(route[1:], -1)
+        has_next = following >= 0
+        following_safe = np.where(has_next, following, 0)
+        removed = np.where(has_next, matrix[route, following_safe], 0)
+
+        def added(stop):
+            # Cost of placing stop right after each route position
+            return matrix[route, stop] + np.where(has_next, matrix[stop, following_safe], 0) - removed
+
+        pickup_cost = added(pickup)
+        drop_off_cost = added(drop_off)
+
+        # Both in the same gap: route[i] -> pickup -> drop_off -> route[i+1]
+        together = (
+            matrix[route, pickup] + matrix[pickup, drop_off]
+            + np.where(has_next, matrix[drop_off, following_safe], 0) - removed
+        )
+
+        # Separate gaps i < j: cheapest pickup gap strictly before each drop-off gap
+        best_gap = np.zeros(len(route), dtype=np.int64)
+        for gap in range(2, len(route)):
+            previous_best = best_gap[gap - 1]
+            best_gap[gap] = gap - 1 if pickup_cost[gap - 1] < pickup_cost[previous_best] else previous_best
+        split = np.full(len(route), np.iinfo(np.int64).max, dtype=np.int64)
+        split[1:] = pickup_cost[best_gap[1:]] + drop_off_cost[1:]
+
+        best_together = int(np.argmin(together))
+        best_split = int(np.argmin(split))
+        if together[best_together] <= split[best_split]:
+            return order[:best_together + 1] + [pickup, drop_off] + order[best_together + 1:]
+        pickup_gap = int(best_gap[best_split])
+        return (
+            order[:pickup_gap + 1] + [pickup] + order[pickup_gap + 1:best_split + 1]
+            + [drop_off] + order[best_split + 1:]
+        )
+
+    def two_opt(self, distance, order, deadline):
+        """Reverse segments while it shortens the route; returns True if anything changed"""
+        length = len(order)
+        improved = False
+        for i in range(1, length - 1):
+            if time.perf_counter() > deadline:
+                break
+            before = order[i - 1]
+            first = order[i]
+            for j in range(i + 1, length):
+                last = order[j]
+                after = order[j + 1] if j + 1 < length else None
+                delta = distance[before][last] - distance[before][first]
+                if after is not None:
+                    delta += distance[first][after] - distance[last][after]
+                if delta >= 0:
+                    continue
+
+                # Reversal is only legal if no parcel has both stops inside it
+                segment = order[i:j + 1]
+                inside = set(segment)
+                if any(stop % 2 and self.partner(stop) in inside for stop in segment):
+                    continue
+                order[i:j + 1] = segment[::-1]
+                first = order[i]
+                improved = True
+        return improved
+
+    def or_opt(self, distance, order, deadline):
+        """Move runs of 1-3 stops elsewhere while it shortens the route"""
+        improved = False
+        for run in (1, 2, 3):
+            i = 1
+            while i + run <= len(order):
+                if time.perf_counter() > deadline:
+                    return improved
+                moved = self.move_run(distance, order, i, run)
+                improved = improved or moved
+                i += 1
+        return improved
+
+    def move_run(self, distance, order, i, run):
+        """Try relocating order[i:i+run] to its best feasible gap; returns True if moved"""
+        segment = order[i:i + run]
+        before = order[i - 1]
+        after = order[i + run] if i + run < len(order) else None
+        head, tail = segment[0], segment[-1]
+
+        saving = distance[before][head]
+        if after is not None:
+            saving += distance[tail][after] - distance[before][after]
+
+        rest = order[:i] + order[i + run:]
+        position = {stop: index for index, stop in enumerate(rest)}
+
+        # Gap g means inserting after rest[g]; precedence bounds the legal gaps
+        lowest = 0
+        highest = len(rest) - 1
+        for stop in segment:
+            other = self.partner(stop)
+            if other not in position:
+                continue
+            if stop % 2:
+                highest = min(highest, position[other] - 1)
+            else:
+                lowest = max(lowest, position[other])
+
+        best_delta = 0
+        best_gap = None
+        for gap in range(lowest, highest + 1):
+            left = rest[gap]
+            right = rest[gap + 1] if gap + 1 < len(rest) else None
+            cost = distance[left][head]
+            if right is not None:
+                cost += distance[tail][right] - distance[left][right]
+            delta = cost - saving
+            if delta < best_delta:
+                best_delta = delta
+                best_gap = gap
+
+        if best_gap is None:
+            return False
+        order[:] = rest[:best_gap + 1] + segment + rest[best_gap + 1:]
+        return True
@@ -0,0 +1,57 @@
+import os
+import random
+import sys
+
+import numpy as np
+
+# The simulator modules live flat in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def random_grid(seed, rows=40, cols=60, density=0.35):
+    """Seeded boolean road mask with roughly density of its pixels blocked"""
+    rng = np.random.default_rng(seed)
+    return rng.random((rows, cols)) >= density
+
+
+def road_pairs(road_mask, seed, count=25):
+    """Seeded (start, goal) pairs of road pixels"""
+    roads = list(zip(*np.nonzero(road_mask)))
+    rng = random.Random(seed)
+    return [(tuple(map(int, rng.choice(roads))), tuple(map(int, rng.choice(roads)))) for _ in range(count)]
+
+
+def benchmark_mask(topology, width=320, height=240, seed=1):
+    """Road mask of one of benchmark.py's seeded synthetic maps"""
+    from benchmark import synthetic_map
+    from courier_router import road_mask_from_array
+    return road_mask_from_array(synthetic_map(topology, width, height, seed))
+
+
+def bfs_lengths(road_mask, start):
+    """Plain breadth-first step counts from start over a road mask; -1 where unreachable"""
+    rows, cols = road_mask.shape
+    distance = np.full((rows, cols), -1, dtype=np.int64)
+    if not road_mask[start]:
+        return distance
+    distance[start] = 0
+    frontier = [start]
+    while frontier:
+        next_frontier = []
+        for y, x in frontier:
+            for ny, nx in ((y, x + 1), (y + 1, x), (y, x - 1), (y - 1, x)):
+                if 0 <= ny < rows and 0 <= nx < cols and road_mask[ny, nx] and distance[ny, nx] < 0:
+                    distance[ny, nx] = distance[y, x] + 1
+                    next_frontier.append((ny, nx))
+        frontier = next_frontier
+    return distance
+
+
+def assert_valid_path(road_mask, start, goal, path):
+    """path leaves start (exclusive), reaches goal (inclusive) in unit road steps"""
+    assert path[-1] == tuple(goal)
+    previous = tuple(start)
+    for y, x in path:
+        assert road_mask[y, x], f"path crosses blocked pixel {(y, x)}"
+        assert abs(y - previous[0]) + abs(x - previous[1]) == 1, f"path jumps from {previous} to {(y, x)}"
+        previous = (y, x)
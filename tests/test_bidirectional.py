@@ -0,0 +1,39 @@
+import pytest
+
+from benchmark import TOPOLOGIES
+from bidirectional import BidirectionalSearch
+from conftest import assert_valid_path, benchmark_mask, bfs_lengths, random_grid, road_pairs
+from grid_search import GridSearch
+from landmarks import LandmarkTable
+
+
+@pytest.mark.parametrize("seed", range(6))
+@pytest.mark.parametrize("density", [0.1, 0.35, 0.45])
+def test_random_grids_are_optimal(seed, density):
+    road_mask = random_grid(seed, density=density)
+    bidirectional = BidirectionalSearch(GridSearch(road_mask))
+    for start, goal in road_pairs(road_mask, seed):
+        expected = bfs_lengths(road_mask, start)[goal]
+        path = bidirectional.search(start, goal)
+        if expected <= 0:
+            assert path == []
+            continue
+        assert len(path) == expected
+        assert_valid_path(road_mask, start, goal, path)
+
+
+@pytest.mark.parametrize("use_landmarks", [False, True])
+@pytest.mark.parametrize("topology", TOPOLOGIES)
+def test_benchmark_maps_are_optimal(topology, use_landmarks):
+    road_mask = benchmark_mask(topology)
+    grid_search = GridSearch(road_mask)
+    landmarks = LandmarkTable.build(grid_search, 8) if use_landmarks else None
+    bidirectional = BidirectionalSearch(grid_search)
+    for start, goal in road_pairs(road_mask, seed=5):
+        expected = bfs_lengths(road_mask, start)[goal]
+        path = bidirectional.search(start, goal, landmarks)
+        if expected <= 0:
+            assert path == []
+            continue
+        assert len(path) == expected
+        assert_valid_path(road_mask, start, goal, path)
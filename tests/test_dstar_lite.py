@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+
+from benchmark import TOPOLOGIES
+from conftest import assert_valid_path, benchmark_mask, bfs_lengths, random_grid, road_pairs
+from dstar_lite import DStarLite
+from grid_search import UNVISITED, GridSearch
+
+
+def close_square(grid_search, centre, radius=2):
+    """Close the road pixels of a square around centre; returns their flat indices"""
+    y, x = centre
+    ys, xs = np.mgrid[
+        max(0, y - radius):min(grid_search.rows, y + radius + 1),
+        max(0, x - radius):min(grid_search.cols, x + radius + 1)
+    ]
+    indices = (ys * grid_search.cols + xs).ravel()
+    indices = indices[grid_search.road_mask.ravel()[indices]]
+    grid_search.set_passable(indices, False)
+    return indices
+
+
+def check_repair(grid_search, replanner, position, goal):
+    """The repaired path from position is valid and as short as a fresh BFS, or [] if cut off"""
+    expected = bfs_lengths(grid_search.road_mask, position)[goal]
+    path = replanner.path(position)
+    if expected < 0:
+        assert path == []
+    else:
+        assert len(path) == expected
+        if path:
+            assert_valid_path(grid_search.road_mask, position, goal, path)
+
+
+@pytest.mark.parametrize("topology", TOPOLOGIES)
+def test_repairs_match_bfs_after_closures(topology):
+    road_mask = benchmark_mask(topology)
+    for start, goal in road_pairs(road_mask, seed=6, count=6):
+        grid_search = GridSearch(road_mask)
+        if bfs_lengths(road_mask, start)[goal] <= 0:
+            continue
+        replanner = DStarLite(grid_search, start, goal)
+        position = start
+        for _ in range(3):
+            path = replanner.path(position)
+            if len(path) < 4:
+                break
+            # Move part of the way, then close the road further ahead
+            position = path[len(path) // 4]
+            blocked = path[len(path) // 2]
+            if blocked == tuple(goal):
+                break
+            changed = close_square(grid_search, blocked)
+            replanner.update(changed, position)
+            check_repair(grid_search, replanner, position, goal)
+
+
+def test_reopening_restores_the_shortest_path():
+    road_mask = random_grid(3, density=0.2)
+    grid_search = GridSearch(road_mask)
+    start, goal = max(
+        road_pairs(road_mask, seed=3, count=40),
+        key=lambda pair: bfs_lengths(road_mask, pair[0])[pair[1]],
+    )
+    replanner = DStarLite(grid_search, start, goal)
+    path = replanner.path(start)
+    changed = close_square(grid_search, path[len(path) // 2], radius=1)
+    replanner.update(changed, start)
+    check_repair(grid_search, replanner, start, goal)
+
+    grid_search.set_passable(changed, True)
+    replanner.update(changed, start)
+    assert len(replanner.path(start)) == len(path)
+
+
+def test_cut_off_start_has_no_path():
+    road_mask = np.zeros((5, 9), dtype=bool)
+    road_mask[2, :] = True
+    grid_search = GridSearch(road_mask)
+    replanner = DStarLite(grid_search, (2, 0), (2, 8))
+    assert len(replanner.path((2, 0))) == 8
+    grid_search.set_passable([2 * 9 + 4], False)
+    replanner.update([2 * 9 + 4], (2, 0))
+    assert replanner.path((2, 0)) == []
+
+
+def test_descent_that_never_reaches_the_goal_returns_no_path():
+    grid_search = GridSearch(np.ones((1, 4), dtype=bool))
+    replanner = DStarLite(grid_search, (0, 0), (0, 3))
+    # A stale field whose descent cycles between two pixels short of the goal
+    replanner.g_array[:] = [1, 1, 1, UNVISITED]
+    assert replanner.path((0, 0)) == []
@@ -0,0 +1,56 @@
+import pytest
+
+from benchmark import TOPOLOGIES
+from conftest import assert_valid_path, benchmark_mask, bfs_lengths, road_pairs
+from flow_field import FlowFields
+from grid_search import GridSearch
+
+
+@pytest.mark.parametrize("topology", TOPOLOGIES)
+def test_descent_reaches_goal_in_bfs_steps(topology):
+    road_mask = benchmark_mask(topology)
+    flow_fields = FlowFields(GridSearch(road_mask))
+    for start, goal in road_pairs(road_mask, seed=2):
+        expected = bfs_lengths(road_mask, start)[goal]
+        path = flow_fields.search(start, goal)
+        if expected <= 0:
+            assert path == []
+            continue
+        assert len(path) == expected
+        assert_valid_path(road_mask, start, goal, path)
+
+
+def test_fields_are_cached_per_goal():
+    road_mask = benchmark_mask("grid")
+    flow_fields = FlowFields(GridSearch(road_mask), max_fields=2)
+    pairs = road_pairs(road_mask, seed=3, count=6)
+    goal = pairs[0][1]
+    for start, _ in pairs:
+        flow_fields.search(start, goal)
+    assert len(flow_fields) == 1
+    for _, other_goal in pairs[1:]:
+        flow_fields.search(pairs[0][0], other_goal)
+    assert len(flow_fields) <= 2
+
+
+def test_closure_builds_a_new_field():
+    road_mask = benchmark_mask("grid")
+    grid_search = GridSearch(road_mask.copy())
+    flow_fields = FlowFields(grid_search)
+    start, goal = max(
+        road_pairs(road_mask, seed=4, count=40),
+        key=lambda pair: bfs_lengths(road_mask, pair[0])[pair[1]],
+    )
+    path = flow_fields.search(start, goal)
+    assert path
+
+    blocked = path[len(path) // 2]
+    grid_search.set_passable([grid_search.to_index(blocked)], False)
+    repaired = flow_fields.search(start, goal)
+    expected = bfs_lengths(grid_search.road_mask, start)[goal]
+    if expected <= 0:
+        assert repaired == []
+    else:
+        assert blocked not in repaired
+        assert len(repaired) == expected
+        assert_valid_path(grid_search.road_mask, start, goal, repaired)
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+from conftest import assert_valid_path, bfs_lengths, random_grid, road_pairs
+from grid_search import GridSearch, SearchCancelled, label_components
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_paths_are_contiguous_and_shortest(seed):
+    road_mask = random_grid(seed)
+    grid_search = GridSearch(road_mask)
+    for start, goal in road_pairs(road_mask, seed):
+        path = grid_search.search(start, goal)
+        expected = bfs_lengths(road_mask, start)[goal]
+        if start == goal or expected < 0:
+            assert path == []
+            continue
+        assert_valid_path(road_mask, start, goal, path)
+        assert len(path) == expected
+
+
+def test_blocked_endpoints_return_no_path():
+    road_mask = random_grid(3)
+    road_mask[0, 0] = False
+    road_mask[5, 5] = True
+    grid_search = GridSearch(road_mask)
+    assert grid_search.search((0, 0), (5, 5)) == []
+    assert grid_search.search((5, 5), (0, 0)) == []
+    assert grid_search.search((5, 5), (-1, 5)) == []
+
+
+def test_unreachable_goal_returns_no_path():
+    road_mask = np.ones((20, 30), dtype=bool)
+    road_mask[:, 15] = False
+    grid_search = GridSearch(road_mask)
+    assert not grid_search.connected((4, 2), (4, 25))
+    assert grid_search.search((4, 2), (4, 25)) == []
+    assert len(grid_search.search((4, 2), (18, 0))) == 14 + 2
+
+
+def test_components_match_breadth_first_reachability():
+    road_mask = random_grid(11, density=0.45)
+    labels, sizes = label_components(road_mask)
+    start = tuple(map(int, np.argwhere(road_mask)[0]))
+    reachable = bfs_lengths(road_mask, start) >= 0
+    assert np.array_equal(labels == labels[start], reachable)
+    assert sizes[labels[start]] == reachable.sum()
+
+
+def test_distance_field_matches_breadth_first():
+    road_mask = random_grid(5)
+    grid_search = GridSearch(road_mask)
+    start = tuple(map(int, np.argwhere(road_mask)[len(np.argwhere(road_mask)) // 2]))
+    field = grid_search.distance_field([grid_search.to_index(start)])
+    assert np.array_equal(field.reshape(road_mask.shape), bfs_lengths(road_mask, start))
+
+
+def test_cancelled_search_raises():
+    class Cancelled:
+        cancelled = True
+
+    grid_search = GridSearch(np.ones((100, 100), dtype=bool))
+    with pytest.raises(SearchCancelled):
+        grid_search.search((0, 0), (99, 99), cancel=Cancelled())
+
+
+def test_edits_swap_the_mask_and_change_the_fingerprint():
+    grid_search = GridSearch(random_grid(5))
+    roads = np.flatnonzero(grid_search.road_mask)
+    before = grid_search.passable
+    fingerprints = {grid_search.fingerprint}
+    for index in roads[:3]:
+        grid_search.set_passable([index], False, refresh=False)
+        fingerprints.add(grid_search.fingerprint)
+    assert len(fingerprints) == 4
+    # A search holding the old mask keeps reading it unchanged
+    assert all(before[index] for index in roads[:3])
+    assert not any(grid_search.passable[index] for index in roads[:3])
+
+    grid_search.refresh()
+    assert grid_search.fingerprint == grid_search.mask_fingerprint()
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from benchmark import TOPOLOGIES
+from conftest import assert_valid_path, benchmark_mask, bfs_lengths, road_pairs
+from grid_search import GridSearch
+from hpa import ClusterGraph
+
+# Entrances sit at the ends of wide border openings, so routes may bend
+# towards them; these bounds hold with margin on the seeded maps
+MAX_STRETCH = 1.5
+MEAN_STRETCH = 1.05
+
+
+def check_routes(road_mask, cluster_graph, pairs):
+    """Assert every route is valid and within the stretch bounds; returns the stretches"""
+    stretches = []
+    for start, goal in pairs:
+        expected = bfs_lengths(road_mask, start)[goal]
+        path = cluster_graph.search(start, goal)
+        if expected <= 0:
+            assert path == []
+            continue
+        assert_valid_path(road_mask, start, goal, path)
+        assert len(path) <= MAX_STRETCH * expected
+        stretches.append(len(path) / expected)
+    return stretches
+
+
+@pytest.mark.parametrize("seed", [1, 3])
+@pytest.mark.parametrize("topology", TOPOLOGIES)
+def test_routes_have_bounded_stretch(topology, seed):
+    road_mask = benchmark_mask(topology, seed=seed)
+    cluster_graph = ClusterGraph(GridSearch(road_mask))
+    stretches = check_routes(road_mask, cluster_graph, road_pairs(road_mask, seed, count=60))
+    assert np.mean(stretches) <= MEAN_STRETCH
+
+
+def test_start_on_an_entrance_crosses_its_border():
+    road_mask = benchmark_mask("organic", seed=3)
+    grid_search = GridSearch(road_mask)
+    cluster_graph = ClusterGraph(grid_search)
+    entrances = sorted(cluster_graph.crossings)[::10]
+    goals = [goal for _, goal in road_pairs(road_mask, seed=3, count=len(entrances))]
+    pairs = [(divmod(entrance, grid_search.cols), goal) for entrance, goal in zip(entrances, goals)]
+    check_routes(road_mask, cluster_graph, pairs)
+
+
+def test_routes_follow_closures_after_invalidate():
+    road_mask = benchmark_mask("grid")
+    grid_search = GridSearch(road_mask.copy())
+    cluster_graph = ClusterGraph(grid_search)
+    pairs = road_pairs(road_mask, seed=8, count=30)
+    start, goal = max(pairs, key=lambda pair: bfs_lengths(road_mask, pair[0])[pair[1]])
+    path = cluster_graph.search(start, goal)
+    assert path
+
+    # Cut the route with a short wall across the road at its midpoint
+    y, x = path[len(path) // 2]
+    wall = [(y + dy, x + dx) for dy in range(-3, 4) for dx in range(-3, 4)]
+    wall = [(wy, wx) for wy, wx in wall if 0 <= wy < grid_search.rows and 0 <= wx < grid_search.cols]
+    grid_search.set_passable([grid_search.to_index(pixel) for pixel in wall], False)
+    cluster_graph.invalidate(y - 3, x - 3, y + 4, x + 4)
+
+    repaired = check_routes(grid_search.road_mask, cluster_graph, [(start, goal)] + pairs)
+    assert repaired
+    assert not set(wall) & set(cluster_graph.search(start, goal))
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from conftest import assert_valid_path, bfs_lengths, random_grid, road_pairs
+from grid_search import GridSearch
+from jps import JumpPointSearch
+
+
+@pytest.mark.parametrize("seed", range(8))
+@pytest.mark.parametrize("density", [0.1, 0.35, 0.45])
+def test_path_lengths_match_a_star(seed, density):
+    road_mask = random_grid(seed, density=density)
+    grid_search = GridSearch(road_mask)
+    jump_point_search = JumpPointSearch(grid_search)
+    for start, goal in road_pairs(road_mask, seed):
+        path = jump_point_search.search(start, goal)
+        assert len(path) == len(grid_search.search(start, goal))
+        if path:
+            assert_valid_path(road_mask, start, goal, path)
+
+
+@pytest.mark.parametrize("shape", [(1, 50), (50, 1), (3, 3), (64, 7)])
+def test_thin_maps_match_breadth_first(shape):
+    road_mask = random_grid(2, *shape, density=0.1)
+    jump_point_search = JumpPointSearch(GridSearch(road_mask))
+    roads = [tuple(map(int, pixel)) for pixel in np.argwhere(road_mask)]
+    for start in roads[::3]:
+        lengths = bfs_lengths(road_mask, start)
+        for goal in roads[::2]:
+            expected = lengths[goal]
+            path = jump_point_search.search(start, goal)
+            assert len(path) == (expected if expected > 0 else 0)
+            if path:
+                assert_valid_path(road_mask, start, goal, path)
+
+
+def test_blocked_and_unreachable_return_no_path():
+    road_mask = np.ones((20, 30), dtype=bool)
+    road_mask[:, 15] = False
+    jump_point_search = JumpPointSearch(GridSearch(road_mask))
+    assert jump_point_search.search((4, 2), (4, 25)) == []
+    assert jump_point_search.search((4, 2), (4, 15)) == []
+    assert jump_point_search.search((4, 15), (4, 2)) == []
+    assert jump_point_search.search((4, 2), (4, 2)) == []
+    assert len(jump_point_search.search((4, 2), (18, 0))) == 16
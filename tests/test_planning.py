@@ -0,0 +1,26 @@
+import time
+
+from conftest import benchmark_mask, road_pairs
+from courier_router import CourierRouter
+from grid_search import GridSearch
+from planning import PlanningExecutor
+from route_cache import RouteCache
+
+
+def test_process_searches_warm_the_parent_cache():
+    road_mask = benchmark_mask("grid")
+    router = CourierRouter(GridSearch(road_mask), route_cache=RouteCache())
+    executor = PlanningExecutor(workers=1, processes=1)
+    try:
+        start, goal = road_pairs(road_mask, seed=1, count=1)[0]
+        key = router.route_key(start, goal, "A*", True, False)
+        path = executor.submit_search(router, start, goal).result()
+
+        # The copy runs in the future's callback, which may trail result()
+        deadline = time.time() + 5
+        while key not in router.route_cache and time.time() < deadline:
+            time.sleep(0.01)
+        assert router.route_cache.get(key) == path
+        assert executor.submit_search(router, start, goal).result() == path
+    finally:
+        executor.shutdown()
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from benchmark import TOPOLOGIES, make_queries
+from conftest import assert_valid_path, benchmark_mask, bfs_lengths
+from grid_search import GridSearch
+from landmarks import LandmarkTable
+from road_graph import ROUTE_STRETCH, RoadGraph
+
+
+@pytest.mark.parametrize("use_landmarks", [False, True])
+@pytest.mark.parametrize("topology", TOPOLOGIES)
+def test_routes_stay_within_the_stretch_bound(topology, use_landmarks):
+    road_mask = benchmark_mask(topology)
+    grid_search = GridSearch(road_mask)
+    landmarks = LandmarkTable.build(grid_search, 4) if use_landmarks else None
+    road_graph = RoadGraph(grid_search)
+    for start, goal in make_queries(grid_search, 30, seed=7):
+        path = road_graph.search(start, goal, landmarks)
+        shortest = bfs_lengths(road_mask, start)[goal]
+        assert_valid_path(road_mask, start, goal, path)
+        assert shortest <= len(path) <= ROUTE_STRETCH * shortest
+
+
+def test_failed_snap_falls_back_to_the_shortest_path():
+    road_mask = benchmark_mask("plazas")
+    grid_search = GridSearch(road_mask)
+    road_graph = RoadGraph(grid_search)
+    road_graph.snap = lambda index: (None, None)
+    for start, goal in make_queries(grid_search, 10, seed=3):
+        assert len(road_graph.search(start, goal)) == bfs_lengths(road_mask, start)[goal]
+
+
+def test_snap_gives_up_after_its_limit():
+    road_mask = np.ones((100, 100), dtype=bool)
+    road_mask[50, :] = False
+    road_graph = RoadGraph(GridSearch(road_mask))
+    index, approach = road_graph.snap(0, limit=1)
+    assert index is None and approach is None
+
+
+def test_unreachable_and_same_pixel_return_no_path():
+    road_mask = np.ones((40, 40), dtype=bool)
+    road_mask[:, 20] = False
+    road_graph = RoadGraph(GridSearch(road_mask))
+    assert road_graph.search((5, 5), (5, 30)) == []
+    assert road_graph.search((5, 5), (5, 5)) == []
@@ -0,0 +1,47 @@
+import pytest
+from PIL import Image
+
+from conftest import assert_valid_path, bfs_lengths, road_pairs
+from tiled_map import SEARCH_TILES, SearchLimitExceeded, TiledMap
+
+
+@pytest.fixture(scope="module")
+def compiled(tmp_path_factory):
+    """A synthetic map compiled to 64-pixel tiles, with its in-memory road mask"""
+    from benchmark import synthetic_map
+    from courier_router import ROAD_COLOR_RANGE, road_mask_from_array
+
+    map_array = synthetic_map("grid", 320, 240, 1)
+    image_path = str(tmp_path_factory.mktemp("tiled") / "map.png")
+    Image.fromarray(map_array).save(image_path)
+    TiledMap.compile(image_path, ROAD_COLOR_RANGE, tile_size=64)
+    tiled_map = TiledMap.load(image_path, ROAD_COLOR_RANGE)
+    yield tiled_map, road_mask_from_array(map_array)
+    tiled_map.close()
+
+
+def test_search_matches_bfs(compiled):
+    tiled_map, road_mask = compiled
+    for start, goal in road_pairs(road_mask, seed=3):
+        expected = bfs_lengths(road_mask, start)[goal]
+        path = tiled_map.search(start, goal)
+        if expected <= 0:
+            assert path == []
+            continue
+        assert len(path) == expected
+        assert_valid_path(road_mask, start, goal, path)
+
+
+def test_search_state_is_bounded_by_tile_budget(compiled):
+    tiled_map, road_mask = compiled
+    start, goal = max(
+        road_pairs(road_mask, seed=5, count=100),
+        key=lambda pair: bfs_lengths(road_mask, pair[0])[pair[1]],
+    )
+    tiled_map.search_tiles = 1
+    try:
+        with pytest.raises(SearchLimitExceeded):
+            tiled_map.search(start, goal)
+    finally:
+        tiled_map.search_tiles = SEARCH_TILES
+    assert len(tiled_map.search(start, goal)) == bfs_lengths(road_mask, start)[goal]
@@ -0,0 +1,52 @@
+import numpy as np
+
+from conftest import benchmark_mask, road_pairs
+from courier_router import CourierRouter
+from grid_search import GridSearch
+from weighted_search import WeightedSearch
+
+MORNING = 8 * 3600
+
+
+def costed_router(seed=1):
+    """Router over the grid benchmark map with seeded step costs of 1 to 4"""
+    road_mask = benchmark_mask("grid", seed=seed)
+    costs = np.random.default_rng(seed).integers(1, 5, size=road_mask.shape).astype(np.uint8)
+    costs[~road_mask] = 0
+    return CourierRouter(GridSearch(road_mask), costs=costs), road_mask, costs
+
+
+def test_traffic_is_none_until_congested():
+    router = CourierRouter(GridSearch(benchmark_mask("grid")))
+    assert router.traffic is None
+    router.set_congestion(0, 0, 10, 10, MORNING, MORNING + 3600, 100)
+    assert router.traffic is None
+    router.set_congestion(0, 0, 10, 10, MORNING, MORNING + 3600, 40)
+    assert router.traffic is not None
+
+
+def test_speeds_are_capped_at_free_flow():
+    router = CourierRouter(GridSearch(benchmark_mask("grid")))
+    router.set_congestion(0, 0, 240, 320, MORNING, MORNING + 3600, 250)
+    router.set_congestion(0, 0, 10, 10, MORNING, MORNING + 3600, 0)
+    traffic = router.traffic
+    assert traffic.speeds.max() == 100
+    assert traffic.speeds.min() == 1
+    assert traffic.min_seconds == traffic.free_flow_seconds
+
+
+def test_timed_routes_use_terrain_costs():
+    router, road_mask, costs = costed_router()
+    weighted_search = WeightedSearch(GridSearch(road_mask), costs)
+    router.set_congestion(0, 0, 64, 64, 0, 24 * 3600, 50)
+    traffic = router.traffic
+    for start, goal in road_pairs(road_mask, seed=2):
+        path = router.find_path(start, goal, "A*", departure=MORNING)
+        cheapest = weighted_search.search(start, goal)
+        if not cheapest:
+            assert path == []
+            continue
+        # The route is never slower than the cheapest one, and equals it in cost when undelayed
+        assert traffic.travel_times(path, MORNING)[-1] <= traffic.travel_times(cheapest, MORNING)[-1] + 1e-9
+        if not traffic.delays(path, MORNING):
+            assert sum(int(costs[pixel]) for pixel in path) == sum(int(costs[pixel]) for pixel in cheapest)
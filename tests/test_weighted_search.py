@@ -0,0 +1,60 @@
+import heapq
+
+import numpy as np
+import pytest
+
+from benchmark import TOPOLOGIES
+from conftest import assert_valid_path, benchmark_mask, road_pairs
+from grid_search import GridSearch
+from weighted_search import WeightedSearch
+
+
+def costed_map(topology, seed=1):
+    """Benchmark road mask with seeded step costs of 1 to 9 on its road pixels"""
+    road_mask = benchmark_mask(topology, seed=seed)
+    rng = np.random.default_rng(seed)
+    costs = rng.integers(1, 10, size=road_mask.shape).astype(np.uint8)
+    costs[~road_mask] = 0
+    return road_mask, costs
+
+
+def dijkstra_cost(costs, start, goal):
+    """Cheapest cost of entering pixels from start to goal, or None if unreachable"""
+    rows, cols = costs.shape
+    best = {start: 0}
+    queue = [(0, start)]
+    while queue:
+        cost, (y, x) = heapq.heappop(queue)
+        if (y, x) == goal:
+            return cost
+        if cost > best[(y, x)]:
+            continue
+        for ny, nx in ((y, x + 1), (y + 1, x), (y, x - 1), (y - 1, x)):
+            if 0 <= ny < rows and 0 <= nx < cols and costs[ny, nx]:
+                next_cost = cost + int(costs[ny, nx])
+                if next_cost < best.get((ny, nx), next_cost + 1):
+                    best[(ny, nx)] = next_cost
+                    heapq.heappush(queue, (next_cost, (ny, nx)))
+    return None
+
+
+@pytest.mark.parametrize("topology", TOPOLOGIES)
+def test_path_costs_match_dijkstra(topology):
+    road_mask, costs = costed_map(topology)
+    weighted_search = WeightedSearch(GridSearch(road_mask), costs)
+    for start, goal in road_pairs(road_mask, seed=4, count=15):
+        expected = dijkstra_cost(costs, start, goal)
+        path = weighted_search.search(start, goal)
+        if not expected:
+            assert path == []
+            continue
+        assert_valid_path(road_mask, start, goal, path)
+        assert sum(int(costs[pixel]) for pixel in path) == expected
+
+
+def test_without_costs_every_step_costs_one():
+    road_mask = benchmark_mask("grid")
+    grid_search = GridSearch(road_mask)
+    weighted_search = WeightedSearch(grid_search)
+    for start, goal in road_pairs(road_mask, seed=6):
+        assert len(weighted_search.search(start, goal)) == len(grid_search.search(start, goal))
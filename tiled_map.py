@@ -0,0 +1,420 @@
+import heapq
+import json
+import os
+import random
+import threading
+from collections import OrderedDict
+import numpy as np
+from PIL import Image
+
+from grid_search import CANCEL_INTERVAL, UNVISITED, SearchCancelled, label_components, merge_labels
+from instrumentation import stats
+from map_cache import CompiledMap
+
+# Bump when the on-disk layout changes so stale caches are rebuilt
+CACHE_VERSION = 1
+TILE_SIZE = 256
+SEARCH_TILES = 512  # Tiles one search may keep state for, about 6 bytes per tile pixel
+OVERVIEW_SIZE = (900, 700)  # Bounding box of the downsampled canvas image
+
+
+class SearchLimitExceeded(Exception):
+    """Raised when a tiled search would need state for more than its tile budget"""
+
+
+def open_map_image(image_path):
+    """Open an image lazily, without PIL's decompression-bomb limit (city maps exceed it)"""
+    limit = Image.MAX_IMAGE_PIXELS
+    Image.MAX_IMAGE_PIXELS = None
+    try:
+        return Image.open(image_path)
+    finally:
+        Image.MAX_IMAGE_PIXELS = limit
+
+
+class TiledMap:
+    """Out-of-core road mask for maps too large to hold as full-size arrays
+
+    The mask is compiled once into <image>.tiles/ as square tiles stored
+    one after another, so each tile is a single contiguous read. Tiles are
+    read on demand into a small LRU cache, and a search keeps compact
+    per-tile state for at most search_tiles tiles, so peak memory follows
+    those two budgets, not the map area. Components are
+    labelled inside each tile and merged across tile borders, so
+    connectivity checks never touch the pixels.
+    """
+
+    def __init__(self, directory, meta, cache_tiles=1024, search_tiles=SEARCH_TILES):
+        self.directory = directory
+        self.rows = meta["height"]
+        self.cols = meta["width"]
+        self.size = self.rows * self.cols
+        self.tile_size = meta["tile_size"]
+        self.tile_rows = meta["tile_rows"]
+        self.tile_cols = meta["tile_cols"]
+        self.road_count = meta["road_count"]
+        self.expanded = 0   # Pixels closed by the latest search
+        self.open_peak = 0  # Largest open list the latest search held
+        self.fingerprint = meta["key"]
+
+        # Tile-local component k of tile t is local id tile_offset[t] + k - 1
+        self.tile_offset = np.load(os.path.join(directory, "tile_offset.npy"))
+        self.local_component = np.load(os.path.join(directory, "local_component.npy"))
+        self.local_sizes = np.load(os.path.join(directory, "local_sizes.npy"))
+        self.component_sizes = np.load(os.path.join(directory, "component_sizes.npy"))
+
+        self.cache_tiles = cache_tiles
+        self.search_tiles = search_tiles
+        self.tiles = OrderedDict()
+        self.lock = threading.Lock()
+        self.tile_file = open(os.path.join(directory, "tiles.bin"), "rb")
+        self._overview = None
+
+    @staticmethod
+    def cache_path(image_path):
+        """Tile directory stored next to the map image"""
+        return f"{image_path}.tiles"
+
+    @classmethod
+    def load(cls, image_path, color_range, cache_tiles=1024):
+        """Open compiled tiles, or return None if missing or stale"""
+        directory = cls.cache_path(image_path)
+        try:
+            with open(os.path.join(directory, "meta.json")) as meta_file:
+                meta = json.load(meta_file)
+            if meta.get("version") != CACHE_VERSION or meta.get("key") != CompiledMap.digest(image_path, color_range):
+                return None
+            return cls(directory, meta, cache_tiles)
+        except (OSError, KeyError, TypeError, ValueError):
+            return None
+
+    @classmethod
+    def load_or_compile(cls, image_path, color_range, cache_tiles=1024):
+        """Reuse the tiles next to image_path when valid, otherwise compile them"""
+        tiled_map = cls.load(image_path, color_range, cache_tiles)
+        if tiled_map is None:
+            cls.compile(image_path, color_range)
+            tiled_map = cls.load(image_path, color_range, cache_tiles)
+        return tiled_map
+
+    @classmethod
+    def compile(cls, image_path, color_range, tile_size=TILE_SIZE):
+        """Classify road pixels one band of tiles at a time into tiles.bin
+
+        Only one band of RGB pixels exists as a NumPy array at a time, but
+        PIL decodes JPEG and PNG whole on the first crop, so compiling holds
+        the decoded image once. That bounds compilation by the image rather
+        than by a tile band; loading and searching the compiled tiles later
+        never decodes it again.
+        """
+        # Imported here because courier_router imports this module
+        from courier_router import road_mask_from_array
+
+        directory = cls.cache_path(image_path)
+        os.makedirs(directory, exist_ok=True)
+        meta_path = os.path.join(directory, "meta.json")
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+
+        with open_map_image(image_path) as img:
+            width, height = img.size
+            tile_rows = -(-height // tile_size)
+            tile_cols = -(-width // tile_size)
+            padded_width = tile_cols * tile_size
+            tiles = np.memmap(
+                os.path.join(directory, "tiles.bin"), dtype=bool, mode="w+",
+                shape=(tile_rows, tile_cols, tile_size, tile_size)
+            )
+
+            scale = min(OVERVIEW_SIZE[0] / width, OVERVIEW_SIZE[1] / height, 1.0)
+            overview = Image.new("RGB", (max(1, round(width * scale)), max(1, round(height * scale))))
+
+            tile_offset = np.zeros(tile_rows * tile_cols + 1, dtype=np.int64)
+            local_sizes = []
+            first = []
+            second = []
+            local_count = 0
+            road_count = 0
+            previous_bottom = None
+
+            for tile_y in range(tile_rows):
+                top = tile_y * tile_size
+                bottom = min(top + tile_size, height)
+                band_image = img.crop((0, top, width, bottom)).convert("RGB")
+                band = np.zeros((tile_size, padded_width), dtype=bool)
+                band[:bottom - top, :width] = road_mask_from_array(np.asarray(band_image), color_range)
+                road_count += int(np.count_nonzero(band))
+
+                overview_top = round(top * scale)
+                overview_bottom = round(bottom * scale)
+                if overview_bottom > overview_top:
+                    overview.paste(
+                        band_image.resize((overview.width, overview_bottom - overview_top), Image.BILINEAR),
+                        (0, overview_top)
+                    )
+
+                # Local ids of every pixel in the band, -1 off road
+                band_ids = np.full((tile_size, padded_width), -1, dtype=np.int64)
+                for tile_x in range(tile_cols):
+                    left = tile_x * tile_size
+                    tile_mask = band[:, left:left + tile_size]
+                    tiles[tile_y, tile_x] = tile_mask
+                    labels, sizes = label_components(tile_mask)
+                    tile_offset[tile_y * tile_cols + tile_x] = local_count
+                    band_ids[:, left:left + tile_size] = np.where(labels > 0, labels.astype(np.int64) - 1 + local_count, -1)
+                    local_sizes.append(sizes[1:])
+                    local_count += len(sizes) - 1
+
+                # Road pixels touching across a tile border join their components
+                borders = np.arange(1, tile_cols) * tile_size
+                pairs = [(band_ids[:, borders - 1].ravel(), band_ids[:, borders].ravel())]
+                if previous_bottom is not None:
+                    pairs.append((previous_bottom, band_ids[0]))
+                for upper, lower in pairs:
+                    touching = (upper >= 0) & (lower >= 0)
+                    unique = np.unique(np.stack([upper[touching], lower[touching]]), axis=1)
+                    first.append(unique[0])
+                    second.append(unique[1])
+                previous_bottom = band_ids[bottom - top - 1].copy()
+
+            tiles.flush()
+            del tiles
+            tile_offset[-1] = local_count
+
+        local_sizes = np.concatenate(local_sizes) if local_sizes else np.zeros(0, dtype=np.int64)
+        parent = merge_labels(
+            np.arange(local_count, dtype=np.int64),
+            np.concatenate(first) if first else np.zeros(0, dtype=np.int64),
+            np.concatenate(second) if second else np.zeros(0, dtype=np.int64),
+        )
+        roots, local_component = np.unique(parent, return_inverse=True)
+        local_component = local_component.astype(np.int32) + 1
+        component_sizes = np.bincount(local_component, weights=local_sizes, minlength=len(roots) + 1).astype(np.int64)
+        component_sizes[0] = 0
+
+        np.save(os.path.join(directory, "tile_offset.npy"), tile_offset)
+        np.save(os.path.join(directory, "local_component.npy"), local_component)
+        np.save(os.path.join(directory, "local_sizes.npy"), local_sizes.astype(np.int64))
+        np.save(os.path.join(directory, "component_sizes.npy"), component_sizes)
+        overview.save(os.path.join(directory, "overview.png"))
+
+        meta = {
+            "version": CACHE_VERSION,
+            "key": CompiledMap.digest(image_path, color_range),
+            "width": width,
+            "height": height,
+            "tile_size": tile_size,
+            "tile_rows": tile_rows,
+            "tile_cols": tile_cols,
+            "road_count": road_count,
+        }
+        with open(meta_path + ".tmp", "w") as meta_file:
+            json.dump(meta, meta_file)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    @property
+    def overview(self):
+        """Downsampled RGB image of the whole map for the canvas"""
+        if self._overview is None:
+            with Image.open(os.path.join(self.directory, "overview.png")) as img:
+                self._overview = img.convert("RGB")
+        return self._overview
+
+    def close(self):
+        """Release the tile file"""
+        self.tile_file.close()
+
+    def tile(self, tile_y, tile_x):
+        """Return one tile's mask as bytes (row-major), reading it on a cache miss"""
+        key = tile_y * self.tile_cols + tile_x
+        with self.lock:
+            tile = self.tiles.get(key)
+            if tile is not None:
+                self.tiles.move_to_end(key)
+                return tile
+
+            area = self.tile_size * self.tile_size
+            tile = os.pread(self.tile_file.fileno(), area, key * area)
+            self.tiles[key] = tile
+            if len(self.tiles) > self.cache_tiles:
+                self.tiles.popitem(last=False)
+            return tile
+
+    def tile_labels(self, tile_y, tile_x):
+        """Tile-local component labels, recomputed exactly as when compiling"""
+        mask = np.frombuffer(self.tile(tile_y, tile_x), dtype=bool).reshape(self.tile_size, self.tile_size)
+        return label_components(mask)[0]
+
+    def to_index(self, position):
+        """Convert (y, x) to a flat index"""
+        return int(position[0]) * self.cols + int(position[1])
+
+    def to_position(self, index):
+        """Convert a flat index back to (y, x)"""
+        return divmod(index, self.cols)
+
+    def is_road(self, position):
+        """Check whether (y, x) lies on a passable pixel"""
+        y, x = int(position[0]), int(position[1])
+        if not (0 <= y < self.rows and 0 <= x < self.cols):
+            return False
+        size = self.tile_size
+        return bool(self.tile(y // size, x // size)[(y % size) * size + x % size])
+
+    def roads_at(self, ys, xs):
+        """Vectorised is_road for arrays of in-bounds coordinates, read tile by tile"""
+        size = self.tile_size
+        tiles = (ys // size) * self.tile_cols + xs // size
+        offsets = (ys % size) * size + xs % size
+        result = np.empty(len(ys), dtype=bool)
+        for tile in np.unique(tiles).tolist():
+            here = tiles == tile
+            data = np.frombuffer(self.tile(*divmod(tile, self.tile_cols)), dtype=bool)
+            result[here] = data[offsets[here]]
+        return result
+
+    def component_of(self, position):
+        """Return the component label of (y, x), 0 when it is not road"""
+        if not self.is_road(position):
+            return 0
+        y, x = int(position[0]), int(position[1])
+        size = self.tile_size
+        tile_y, tile_x = y // size, x // size
+        local = self.tile_labels(tile_y, tile_x)[y % size, x % size]
+        return int(self.local_component[self.tile_offset[tile_y * self.tile_cols + tile_x] + local - 1])
+
+    def connected(self, start, goal):
+        """Check whether a path exists between two pixels without searching"""
+        component = self.component_of(start)
+        return component != 0 and component == self.component_of(goal)
+
+    def random_road_pixel(self, component=None):
+        """Return a uniformly random road pixel as (y, x), or None if there is none
+
+        A tile-local component is drawn by size first, then a pixel inside it,
+        so only one tile is read.
+        """
+        if component is None:
+            weights = self.local_sizes
+        else:
+            weights = np.where(self.local_component == component, self.local_sizes, 0)
+        total = int(weights.sum())
+        if not total:
+            return None
+
+        local = int(np.searchsorted(np.cumsum(weights), random.randrange(total), side="right"))
+        tile = int(np.searchsorted(self.tile_offset, local, side="right")) - 1
+        tile_y, tile_x = divmod(tile, self.tile_cols)
+        labels = self.tile_labels(tile_y, tile_x)
+        pixels = np.flatnonzero(labels.ravel() == local - self.tile_offset[tile] + 1)
+        y, x = divmod(int(pixels[random.randrange(len(pixels))]), self.tile_size)
+        return (tile_y * self.tile_size + y, tile_x * self.tile_size + x)
+
+    def random_component(self, min_size=1):
+        """Return a random component label weighted by size, or None if none is big enough"""
+        sizes = self.component_sizes.astype(np.float64)
+        sizes[sizes < min_size] = 0
+        total = sizes.sum()
+        if total == 0:
+            return None
+        return int(np.searchsorted(np.cumsum(sizes), random.random() * total, side="right"))
+
+    def search(self, start, goal, landmarks=None, cancel=None):
+        """Return the (y, x) path from start (exclusive) to goal (inclusive), or []
+
+        A* with a Manhattan heuristic. Costs, closed flags and the move into
+        each pixel live in arrays per touched tile, made on first touch; a
+        search that needs more than search_tiles of them raises
+        SearchLimitExceeded. landmarks is accepted for interface
+        compatibility and ignored; ALT tables would need full-size arrays.
+        """
+        self.expanded = 0
+        self.open_peak = 0
+        if not self.connected(start, goal):
+            return []
+
+        cols = self.cols
+        rows = self.rows
+        size = self.size
+        tile_size = self.tile_size
+        tile_cols = self.tile_cols
+        tile = self.tile
+        source = self.to_index(start)
+        target = self.to_index(goal)
+        if source == target:
+            return []
+        goal_y, goal_x = divmod(target, cols)
+
+        pages = {}  # tile number -> (g, closed, move) over the tile's pixels
+        page_of = self.search_page
+        source_y, source_x = divmod(source, cols)
+        page_of(pages, (source_y // tile_size) * tile_cols + source_x // tile_size)[0][
+            (source_y % tile_size) * tile_size + source_x % tile_size
+        ] = 0
+        open_set = [(abs(source_y - goal_y) + abs(source_x - goal_x)) * size + source]
+        expanded = 0
+        open_peak = 0
+        track_peak = stats.enabled
+
+        while open_set:
+            if track_peak and len(open_set) > open_peak:
+                open_peak = len(open_set)
+            current = heapq.heappop(open_set) % size
+            y, x = divmod(current, cols)
+            g_score, closed, _ = pages[(y // tile_size) * tile_cols + x // tile_size]
+            local = (y % tile_size) * tile_size + x % tile_size
+            if closed[local]:
+                continue
+            if current == target:
+                self.expanded = expanded
+                self.open_peak = open_peak
+                return self.reconstruct_path(pages, source, target)
+            closed[local] = 1
+            expanded += 1
+            if cancel is not None and not expanded % CANCEL_INTERVAL and cancel.cancelled:
+                raise SearchCancelled()
+
+            tentative_g = g_score[local] + 1
+            for move, (ny, nx) in enumerate(((y, x + 1), (y + 1, x), (y, x - 1), (y - 1, x))):
+                if not (0 <= ny < rows and 0 <= nx < cols):
+                    continue
+                tile_y, tile_x = ny // tile_size, nx // tile_size
+                neighbor_local = (ny % tile_size) * tile_size + nx % tile_size
+                if not tile(tile_y, tile_x)[neighbor_local]:
+                    continue
+                key = tile_y * tile_cols + tile_x
+                page = pages.get(key) or page_of(pages, key)
+                if tentative_g < page[0][neighbor_local]:
+                    page[0][neighbor_local] = tentative_g
+                    page[2][neighbor_local] = move
+                    f_score = tentative_g + abs(ny - goal_y) + abs(nx - goal_x)
+                    heapq.heappush(open_set, f_score * size + ny * cols + nx)
+
+        self.expanded = expanded
+        self.open_peak = open_peak
+        return []
+
+    def search_page(self, pages, key):
+        """Add fresh search state for tile key to pages, within the search_tiles budget"""
+        if len(pages) >= self.search_tiles:
+            raise SearchLimitExceeded(f"Search needs more than {self.search_tiles} tiles of state")
+        area = self.tile_size * self.tile_size
+        page = (memoryview(np.full(area, UNVISITED, dtype=np.int32)), bytearray(area), bytearray(area))
+        pages[key] = page
+        return page
+
+    def reconstruct_path(self, pages, source, target):
+        """Undo the stored moves from target back to source and return the (y, x) path"""
+        cols = self.cols
+        tile_size = self.tile_size
+        steps = ((0, 1), (1, 0), (0, -1), (-1, 0))
+        path = []
+        y, x = divmod(target, cols)
+        source = divmod(source, cols)
+        while (y, x) != source:
+            path.append((y, x))
+            move = pages[(y // tile_size) * self.tile_cols + x // tile_size][2][(y % tile_size) * tile_size + x % tile_size]
+            dy, dx = steps[move]
+            y, x = y - dy, x - dx
+        path.reverse()
+        return path
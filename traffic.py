@@ -0,0 +1,262 @@
+import heapq
+import numpy as np
+
+from grid_search import CANCEL_INTERVAL, SearchCancelled
+from hpa import CLUSTER_SIZE
+from instrumentation import stats
+
+SLOT_SECONDS = 900        # Simulated seconds covered by one speed profile slot
+DAY_SLOTS = 96            # Slots per profile; the profile repeats daily
+FREE_FLOW_SPEED = 10.0    # Map pixels per simulated second on an empty road
+
+
+class TrafficModel:
+    """Time-dependent speeds over the road grid, one daily profile per cluster
+
+    speeds[slot, cluster] is the percentage of free-flow speed in that
+    slot, kept as uint8 next to a flat float table of seconds per pixel
+    that the search reads. Crossing a pixel integrates the speed over
+    slot boundaries, so leaving later never means arriving earlier and a
+    label-setting search stays exact.
+    """
+
+    def __init__(self, grid_search, costs=None, cluster_size=CLUSTER_SIZE,
+                 slot_seconds=SLOT_SECONDS, slots=DAY_SLOTS, free_flow_speed=FREE_FLOW_SPEED):
+        self.grid_search = grid_search
+        self.cluster_size = cluster_size
+        self.cluster_rows = -(-grid_search.rows // cluster_size)
+        self.cluster_cols = -(-grid_search.cols // cluster_size)
+        self.cluster_count = self.cluster_rows * self.cluster_cols
+        self.slot_seconds = slot_seconds
+        self.slots = slots
+        self.free_flow_seconds = 1.0 / free_flow_speed
+
+        # Cluster of every pixel, so a step costs one lookup
+        ys = np.arange(grid_search.rows, dtype=np.int32) // cluster_size
+        xs = np.arange(grid_search.cols, dtype=np.int32) // cluster_size
+        self.cluster_array = (ys[:, None] * self.cluster_cols + xs[None, :]).ravel()
+        self.pixel_cluster = memoryview(self.cluster_array)
+
+        # Terrain costs scale the crossing time; without them every pixel counts once
+        if costs is None:
+            self.costs = None
+            self.min_cost = 1
+        else:
+            self.costs = np.ascontiguousarray(costs, dtype=np.uint8).ravel().tobytes()
+            steps = np.frombuffer(self.costs, dtype=np.uint8)
+            self.min_cost = int(steps[steps > 0].min()) if steps.any() else 1
+
+        self.speeds = np.full((slots, self.cluster_count), 100, dtype=np.uint8)
+        self.seconds_array = np.full(slots * self.cluster_count, self.free_flow_seconds)
+        self.seconds = memoryview(self.seconds_array)
+        self.min_seconds = self.free_flow_seconds
+        self.congested = False
+
+        self.expanded = 0     # Pixels closed by the latest search
+        self.open_peak = 0    # Largest open list the latest search held
+        self.footprints = {}  # route key -> (profile slots spanned, slot * cluster_count + cluster cells)
+
+    def slot_at(self, time):
+        """Profile slot in effect at a simulated time"""
+        return int(time // self.slot_seconds) % self.slots
+
+    def clusters_in(self, top, left, bottom, right):
+        """Cluster numbers overlapping a pixel rectangle, bottom/right exclusive"""
+        size = self.cluster_size
+        rows = range(max(0, top // size), min(self.cluster_rows, (bottom - 1) // size + 1))
+        cols = range(max(0, left // size), min(self.cluster_cols, (right - 1) // size + 1))
+        return [cluster_y * self.cluster_cols + cluster_x for cluster_y in rows for cluster_x in cols]
+
+    def slots_in(self, start, end):
+        """Profile slots overlapping the simulated interval [start, end), wrapping at midnight"""
+        first = int(start // self.slot_seconds)
+        last = int(-(-end // self.slot_seconds))
+        return sorted({slot % self.slots for slot in range(first, max(last, first + 1))})
+
+    def set_congestion(self, top, left, bottom, right, start, end, speed):
+        """Set the speed (percent of free flow, 1 to 100) of a pixel rectangle during [start, end)
+
+        Only the touched profile cells are recomputed. Returns the keys of
+        tracked routes the change may have made stale: routes crossing a
+        slowed cell, or, when anything got faster, every route travelling
+        during the changed slots. Speeds are capped at free flow, which the
+        heuristic and the delays() shortcut take as the fastest possible.
+        """
+        speed = int(min(max(speed, 1), 100))
+        clusters = np.array(self.clusters_in(top, left, bottom, right), dtype=np.int64)
+        slots = np.array(self.slots_in(start, end), dtype=np.int64)
+        if not len(clusters) or not len(slots):
+            return []
+
+        previous = self.speeds[np.ix_(slots, clusters)]
+        self.speeds[np.ix_(slots, clusters)] = speed
+        cells = (slots[:, None] * self.cluster_count + clusters[None, :]).ravel()
+        self.seconds_array[cells] = self.free_flow_seconds * 100.0 / speed
+        self.min_seconds = float(self.seconds_array.min())
+        self.congested = bool((self.speeds != 100).any())
+
+        faster = bool((previous < speed).any())
+        changed_slots = set(slots.tolist())
+        changed_cells = set(cells.tolist())
+        stale = [
+            key for key, (route_slots, route_cells) in self.footprints.items()
+            if (faster and not route_slots.isdisjoint(changed_slots)) or not route_cells.isdisjoint(changed_cells)
+        ]
+        for key in stale:
+            del self.footprints[key]
+        return stale
+
+    def delays(self, path, departure):
+        """Whether any congested cell slows a path leaving at departure
+
+        Walks the path at free flow, checking the slots each pixel is
+        entered and left in. When nothing on the way is congested the path
+        keeps its free-flow time and stands, as on a map without traffic.
+        """
+        if not self.congested or not path:
+            return False
+        cols = self.grid_search.cols
+        indices = np.array([y * cols + x for y, x in path], dtype=np.int64)
+        step_seconds = np.full(len(indices), self.free_flow_seconds)
+        if self.costs is not None:
+            step_seconds *= np.frombuffer(self.costs, dtype=np.uint8)[indices]
+        times = departure + np.concatenate([[0.0], np.cumsum(step_seconds)])
+        clusters = self.cluster_array[indices]
+        entered = (times[:-1] // self.slot_seconds).astype(np.int64) % self.slots
+        left = (times[1:] // self.slot_seconds).astype(np.int64) % self.slots
+        return bool((self.speeds[entered, clusters] != 100).any() or (self.speeds[left, clusters] != 100).any())
+
+    def cross(self, index, time):
+        """Simulated time after crossing pixel index when entered at time"""
+        cluster = self.pixel_cluster[index]
+        cost = self.costs[index] if self.costs is not None else 1
+        slot_seconds = self.slot_seconds
+        slot = int(time // slot_seconds)
+        left = 1.0
+        while True:
+            seconds = self.seconds[(slot % self.slots) * self.cluster_count + cluster] * cost
+            end = (slot + 1) * slot_seconds
+            if time + left * seconds <= end:
+                return time + left * seconds
+            left -= (end - time) / seconds
+            time = end
+            slot += 1
+
+    def travel_times(self, path, departure):
+        """Arrival time at every (y, x) of a path leaving at departure"""
+        cols = self.grid_search.cols
+        times = []
+        time = departure
+        for y, x in path:
+            time = self.cross(y * cols + x, time)
+            times.append(time)
+        return times
+
+    def follow(self, path, step, time, until):
+        """Advance along path from path[step], reached at time, as far as the clock until allows
+
+        Returns the new (step, time) of the last pixel reached.
+        """
+        cols = self.grid_search.cols
+        last = len(path) - 1
+        while step < last:
+            y, x = path[step + 1]
+            arrival = self.cross(y * cols + x, time)
+            if arrival > until:
+                break
+            step += 1
+            time = arrival
+        return step, time
+
+    def track(self, key, start, path, departure):
+        """Remember which profile cells a cached route used, for set_congestion"""
+        cols = self.grid_search.cols
+        slots = set()
+        cells = set()
+        time = departure
+        for y, x in [start] + list(path):
+            index = y * cols + x
+            slot = self.slot_at(time)
+            slots.add(slot)
+            cells.add(slot * self.cluster_count + self.pixel_cluster[index])
+            time = self.cross(index, time)
+        self.footprints[key] = (slots, cells)
+
+    def forget(self, keep):
+        """Drop footprints of routes for which keep(key) is false"""
+        self.footprints = {key: footprint for key, footprint in self.footprints.items() if keep(key)}
+
+    def heuristic_field(self, target):
+        """Manhattan distance to target at the fastest speed anywhere, in seconds"""
+        grid_search = self.grid_search
+        goal_y, goal_x = divmod(target, grid_search.cols)
+        dy = np.abs(np.arange(grid_search.rows) - goal_y)
+        dx = np.abs(np.arange(grid_search.cols) - goal_x)
+        return ((dy[:, None] + dx[None, :]) * (self.min_seconds * self.min_cost)).ravel()
+
+    def search(self, start, goal, departure, cancel=None):
+        """Return the earliest-arrival (y, x) path from start (exclusive) to goal (inclusive), or []"""
+        self.expanded = 0
+        self.open_peak = 0
+        grid_search = self.grid_search
+        if not grid_search.connected(start, goal):
+            return []
+        source = grid_search.to_index(start)
+        target = grid_search.to_index(goal)
+        if source == target:
+            return []
+
+        cols = grid_search.cols
+        size = grid_search.size
+        last_col = cols - 1
+        last_row_start = size - cols
+        passable = grid_search.passable
+        cross = self.cross
+        h = memoryview(self.heuristic_field(target))
+
+        arrival_array = np.full(size, np.inf)
+        parent_array = np.full(size, -1, dtype=np.int32)
+        arrival = memoryview(arrival_array)
+        came_from = memoryview(parent_array)
+        closed = bytearray(size)
+
+        arrival[source] = departure
+        open_set = [(departure + h[source], source)]
+        expanded = 0
+        open_peak = 0
+        track_peak = stats.enabled
+
+        while open_set:
+            if track_peak and len(open_set) > open_peak:
+                open_peak = len(open_set)
+            _, current = heapq.heappop(open_set)
+            if closed[current]:
+                continue
+            closed[current] = 1
+
+            if current == target:
+                self.expanded = expanded
+                self.open_peak = open_peak
+                return grid_search.reconstruct_path(came_from, source, target)
+
+            expanded += 1
+            if cancel is not None and not expanded % CANCEL_INTERVAL and cancel.cancelled:
+                raise SearchCancelled()
+
+            cx = current % cols
+            time = arrival[current]
+            for neighbor, valid in (
+                (current + 1, cx < last_col), (current + cols, current < last_row_start),
+                (current - 1, cx > 0), (current - cols, current >= cols),
+            ):
+                if not valid or not passable[neighbor] or closed[neighbor]:
+                    continue
+                reached = cross(neighbor, time)
+                if reached < arrival[neighbor]:
+                    arrival[neighbor] = reached
+                    came_from[neighbor] = current
+                    heapq.heappush(open_set, (reached + h[neighbor], neighbor))
+
+        self.expanded = expanded
+        self.open_peak = open_peak
+        return []
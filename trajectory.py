@@ -0,0 +1,77 @@
+import math
+import numpy as np
+
+LOOK_AHEAD = 5  # Path steps ahead the courier faces, so it does not jitter at corners
+
+
+def simplify(points, tolerance):
+    """Ramer-Douglas-Peucker: sorted indices of the points to keep
+
+    No dropped point lies further than tolerance from the line through
+    the kept points on either side of it. Iterative, with one vectorised
+    distance computation per split.
+    """
+    count = len(points)
+    if count < 3:
+        return np.arange(count)
+    keep = np.zeros(count, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, count - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        chord = points[last] - points[first]
+        inner = points[first + 1:last] - points[first]
+        length = math.hypot(chord[0], chord[1])
+        if length:
+            distance = np.abs(chord[0] * inner[:, 1] - chord[1] * inner[:, 0]) / length
+        else:
+            distance = np.hypot(inner[:, 0], inner[:, 1])
+        split = int(np.argmax(distance))
+        if distance[split] > tolerance:
+            split += first + 1
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return np.flatnonzero(keep)
+
+
+def courier_outlines(size, steps=360):
+    """Courier triangle vertex offsets (front, rear left, rear right) for each whole-degree heading"""
+    angles = np.radians(np.arange(steps) * (360 / steps))[:, None] + np.array([0.0, math.pi * 0.8, -math.pi * 0.8])
+    radius = size * np.array([1.0, 0.7, 0.7])
+    offsets = np.stack([radius * np.cos(angles), -radius * np.sin(angles)], axis=2)
+    return offsets.reshape(steps, 6).tolist()
+
+
+class Trajectory:
+    """Everything the animation needs about a path, computed once per route
+
+    screen[i] is the canvas (x, y) of path[i] and headings[i] the facing
+    in degrees (0 = east, counter-clockwise) from path[i] towards
+    LOOK_AHEAD steps on; the last step has no heading and keeps the
+    previous one. polyline is the flattened RDP-simplified canvas line
+    for create_line.
+    """
+
+    def __init__(self, path, scale, tolerance=1.0, look_ahead=LOOK_AHEAD):
+        self.path = path
+        cells = np.asarray(path, dtype=np.float64).reshape(-1, 2)
+        scale_x, scale_y = scale
+        self.screen = np.column_stack((cells[:, 1] * scale_x, cells[:, 0] * scale_y))
+
+        count = len(cells)
+        ahead = np.minimum(np.arange(count - 1) + look_ahead, count - 1)
+        delta = cells[ahead] - cells[:len(ahead)]
+        headings = np.degrees(np.arctan2(-delta[:, 0], delta[:, 1])) % 360
+
+        # A route that doubles back can look ahead onto its own pixel; keep the previous heading there
+        moving = delta.any(axis=1)
+        source = np.maximum.accumulate(np.where(moving, np.arange(len(ahead)), 0))
+        self.headings = headings[source]
+
+        self.polyline = self.screen[simplify(self.screen, tolerance)].ravel().tolist()
+
+    def __len__(self):
+        return len(self.path)
@@ -0,0 +1,116 @@
+import numpy as np
+
+from grid_search import CANCEL_INTERVAL, UNVISITED, SearchCancelled
+from instrumentation import stats
+
+
+class WeightedSearch:
+    """A* over a uint8 step-cost raster using a bucket queue instead of a heap
+
+    Entering a pixel costs its raster value and 0 means impassable. With
+    a Manhattan heuristic scaled by the cheapest step, f never drops and
+    grows by at most max_cost + min_cost per expansion, so a ring of that
+    many buckets orders the open set with plain list appends and pops.
+    """
+
+    def __init__(self, grid_search, costs=None):
+        self.grid_search = grid_search
+        self.expanded = 0   # Pixels closed by the latest search
+        self.open_peak = 0  # Most pixels the latest search had queued at once
+
+        # Without a raster every road pixel costs 1, read from the mask at search time
+        if costs is None:
+            self.costs = None
+            self.min_cost = self.max_cost = 1
+        else:
+            costs = np.ascontiguousarray(costs, dtype=np.uint8).ravel()
+            self.costs = costs.tobytes()
+            steps = costs[costs > 0]
+            self.min_cost = int(steps.min()) if len(steps) else 1
+            self.max_cost = int(steps.max()) if len(steps) else 1
+
+    def heuristic_field(self, target):
+        """Manhattan distance to target times the cheapest step, as int32"""
+        grid_search = self.grid_search
+        goal_y, goal_x = divmod(target, grid_search.cols)
+        dy = np.abs(np.arange(grid_search.rows, dtype=np.int32) - goal_y)
+        dx = np.abs(np.arange(grid_search.cols, dtype=np.int32) - goal_x)
+        return ((dy[:, None] + dx[None, :]) * self.min_cost).ravel()
+
+    def search(self, start, goal, cancel=None):
+        """Return the cheapest (y, x) path from start (exclusive) to goal (inclusive), or []"""
+        self.expanded = 0
+        self.open_peak = 0
+        grid_search = self.grid_search
+        if not grid_search.connected(start, goal):
+            return []
+        source = grid_search.to_index(start)
+        target = grid_search.to_index(goal)
+        if source == target:
+            return []
+
+        cols = grid_search.cols
+        size = grid_search.size
+        last_col = cols - 1
+        last_row_start = size - cols
+        passable = grid_search.passable
+        costs = passable if self.costs is None else self.costs
+        h = memoryview(self.heuristic_field(target))
+
+        g_array = np.full(size, UNVISITED, dtype=np.int32)
+        parent_array = np.full(size, -1, dtype=np.int32)
+        g_score = memoryview(g_array)
+        came_from = memoryview(parent_array)
+        closed = bytearray(size)
+
+        ring = self.max_cost + self.min_cost + 1
+        buckets = [[] for _ in range(ring)]
+        f_score = h[source]
+        buckets[f_score % ring].append(source)
+        g_score[source] = 0
+        pending = 1
+        expanded = 0
+        open_peak = 0
+        track_peak = stats.enabled
+
+        while pending:
+            bucket = buckets[f_score % ring]
+            if not bucket:
+                f_score += 1
+                continue
+            if track_peak and pending > open_peak:
+                open_peak = pending
+            current = bucket.pop()
+            pending -= 1
+            if closed[current]:
+                continue
+            closed[current] = 1
+
+            if current == target:
+                self.expanded = expanded
+                self.open_peak = open_peak
+                return grid_search.reconstruct_path(came_from, source, target)
+
+            expanded += 1
+            if cancel is not None and not expanded % CANCEL_INTERVAL and cancel.cancelled:
+                raise SearchCancelled()
+
+            cx = current % cols
+            g = g_score[current]
+            for neighbor, valid in (
+                (current + 1, cx < last_col), (current + cols, current < last_row_start),
+                (current - 1, cx > 0), (current - cols, current >= cols),
+            ):
+                if not valid or not passable[neighbor]:
+                    continue
+                cost = costs[neighbor]
+                if cost and g + cost < g_score[neighbor]:
+                    tentative_g = g + cost
+                    g_score[neighbor] = tentative_g
+                    came_from[neighbor] = current
+                    buckets[(tentative_g + h[neighbor]) % ring].append(neighbor)
+                    pending += 1
+
+        self.expanded = expanded
+        self.open_peak = open_peak
+        return []